@@ -9,13 +9,13 @@ from pathlib import Path
 from typing import Optional, Union
 from .main import main
 from .processor import process
-from .common import program_version
+from .common import program_version, supported_files
 
 __version__ = program_version
 __Author__ = "Nianze A. TAO"
 __all__ = ["main", "mol2chemfig", "__version__"]
 
-_SUPPORTED_FILE = ".gz .sdf .rdf .mol .rxn .txt .cml .mrv .xml .smi"
+_SUPPORTED_FILE = supported_files
 
 
 def mol2chemfig(
@@ -6,6 +6,11 @@ import string
 from typing import Optional, Union, Dict, List, Tuple, Any
 from . import chemfig_mappings as cfm
 
+try:
+    import numpy as np
+except ImportError:  # optional; without it, atoms are scored one by one
+    np = None
+
 # some atoms should carry their hydrogen to the left, rather than
 # to the right. This is applied to solitary atoms, but not to bonded
 # functional groups that contain those elements.
@@ -67,6 +72,7 @@ class Atom:
         self.charge_angle = None
         # angles of all attached bonds - to be populated later
         self.bond_angles = []
+        self._angle_table, self._angle_count = [], 0
         self.explicit = False  # flag for explicitly printed atoms - set later
         marker = self.options.get("markers", None)
         if marker is not None:
@@ -111,23 +117,28 @@ class Atom:
         named = [a[-1] for a in aux]
         return named
 
-    def score_angles(self) -> None:
+    def angle_table(self) -> List[int]:
         """
-        determine which positions
+        bond angles rounded to integers and sorted, as used for
+        decorating double, triple and cross bonds. The table is
+        rebuilt only when bond angles have been added since.
 
-        We use one score for the placement of hydrogen w/ or w/o charge,
-        and a separate one for the placement of charges only.
-
-        Atoms: precedence east, west, south, north;
-               tolerated impingement 10 degrees
+        :return: [angle_1, angle_2,...]
+        """
+        if self._angle_count != len(self.bond_angles):
+            self._angle_table = sorted(int(round(a)) % 360 for a in self.bond_angles)
+            self._angle_count = len(self.bond_angles)
+        return self._angle_table
 
-        Charges: precedence top right, top left, top straight,
-                 bottom straight, others
+    def _set_positions(self, quadrants: List[str], charge_positions: List[str]) -> None:
+        """
+        pick positions from ranked quadrants and charge positions
 
+        :param quadrants: [quadrant_1, quadrant_2,...], best first
+        :param charge_positions: [position_1, position_2,...], best first
         :return: None
         """
         if len(self.bond_angles) > 0:  # this atom is bonded
-            quadrants = self._score_angles(self.quadrants, self.quadrant_turf)
             self.first_quadrant = quadrants[0]
             self.second_quadrant = quadrants[
                 1
@@ -141,9 +152,95 @@ class Atom:
                 self.first_quadrant = "east"
                 self.second_quadrant = "west"
 
-        self.charge_angle = self._score_angles(self.charge_positions, self.charge_turf)[
-            0
-        ]
+        self.charge_angle = charge_positions[0]
+
+    def score_angles(self) -> None:
+        """
+        determine which positions
+
+        We use one score for the placement of hydrogen w/ or w/o charge,
+        and a separate one for the placement of charges only.
+
+        Atoms: precedence east, west, south, north;
+               tolerated impingement 10 degrees
+
+        Charges: precedence top right, top left, top straight,
+                 bottom straight, others
+
+        :return: None
+        """
+        self._set_positions(
+            self._score_angles(self.quadrants, self.quadrant_turf),
+            self._score_angles(self.charge_positions, self.charge_turf),
+        )
+
+    @staticmethod
+    def _rank_angles(
+        bond_angles: "np.ndarray",
+        bonded: "np.ndarray",
+        choices: List[List[Union[int, str]]],
+        turf: int,
+    ) -> List[List[str]]:
+        """
+        backend for score_all_angles: rank the choices for all atoms
+        at once, using the same arithmetic as _score_angle
+
+        :param bond_angles: (atoms x bond angles) array, padded
+        :param bonded: mask of the valid entries in bond_angles
+        :param choices: choices list
+        :param turf: turf value
+        :return: [[position_1, position_2,...], ...] for each atom
+        """
+        choices = sorted(choices, key=lambda choice: choice[0])  # by priority
+        names = [name for _, _, name in choices]
+        choice_angles = np.array([angle for _, angle, _ in choices], dtype=float)
+
+        diff = (choice_angles[None, :, None] - bond_angles[:, None, :]) % 360
+        angle = np.minimum(diff, 360 - diff)
+        scores = np.maximum(0, turf - angle) ** 2
+        scores = np.where(bonded[:, None, :], scores, 0.0)
+
+        # add up bond by bond, in the same order as _score_angles does
+        total = np.zeros(scores.shape[:2])
+        for i in range(scores.shape[2]):
+            total += scores[:, :, i]
+
+        # a stable sort breaks ties by priority
+        order = np.argsort(total, axis=1, kind="stable")
+        return [[names[i] for i in row] for row in order.tolist()]
+
+    @classmethod
+    def score_all_angles(cls, atoms: List["Atom"]) -> None:
+        """
+        same as calling score_angles on each atom, but the
+        scores for all atoms are computed in one go.
+
+        :param atoms: [Atom_1, Atom_2,...]
+        :return: None
+        """
+        if np is None or not atoms:
+            for atom in atoms:
+                atom.score_angles()
+            return
+
+        width = max(1, max(len(atom.bond_angles) for atom in atoms))
+        bond_angles = np.zeros((len(atoms), width))
+        bonded = np.zeros((len(atoms), width), dtype=bool)
+
+        for i, atom in enumerate(atoms):
+            count = len(atom.bond_angles)
+            bond_angles[i, :count] = atom.bond_angles
+            bonded[i, :count] = True
+
+        quadrants = cls._rank_angles(
+            bond_angles, bonded, cls.quadrants, cls.quadrant_turf
+        )
+        charge_positions = cls._rank_angles(
+            bond_angles, bonded, cls.charge_positions, cls.charge_turf
+        )
+
+        for atom, ranked, charge_ranked in zip(atoms, quadrants, charge_positions):
+            atom._set_positions(ranked, charge_ranked)
 
     def render_phantom(self) -> Tuple[Optional[str], str]:
         """
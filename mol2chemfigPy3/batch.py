@@ -0,0 +1,957 @@
+# -*- coding: utf-8 -*-
+"""
+batch mode: convert all molecules in one or more files in a single
+run, e.g., the records of an SDF file or a file with one SMILES per line.
+"""
+
+import hashlib
+import heapq
+import os.path
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import (
+    Union,
+    Optional,
+    Tuple,
+    List,
+    Dict,
+    Any,
+    Iterable,
+    Iterator,
+    TextIO,
+    BinaryIO,
+)
+from indigo import IndigoException
+from . import common, options
+from .processor import HelpError, try_convert
+from .worker import Worker, WorkerError
+from .pipeline import run_pipeline
+from .schedule import CostModel, Chunk, schedule, SCHEDULE_LOOKAHEAD
+from .checkpoint import Checkpoint
+from .index import RecordIndex, runs
+
+DEDUP_CACHE_SIZE = 100000  # number of converted structures remembered for reuse
+
+# options that refer to atoms by their number in the input. With
+# these, molecules can't be told apart by canonical SMILES.
+_numbering_keys = ("markers", "atom_numbers", "entry_atom", "exit_atom", "cross_bond")
+
+# options that need records to be converted in worker processes
+_worker_keys = ("timeout", "max_tasks", "max_rss", "memory_limit")
+
+# first line of the result of a record, see format_result
+_result_header = re.compile(r"% (\d+)(:|$)")
+
+# Worker.counts, as reported in the summary
+_count_labels = (
+    ("restarts", "worker restarts"),
+    ("recycles", "worker recycles"),
+    ("requeued", "records requeued"),
+)
+
+
+class Record:
+    """
+    one molecule of the batch input
+    """
+
+    def __init__(self, index: int, data: str, title: str = "") -> None:
+        self.index = index  # counted from 1, across all input files
+        self.data = data
+        self.title = title
+
+
+def record_format(file_name: str) -> str:
+    """
+    guess the layout of an input file from its extension, which may be
+    followed by that of a compression format, as in library.sdf.gz
+
+    :param file_name: file name
+    :return: 'sdf' (many molfiles), 'smi' (one molecule per line) or 'mol'
+    """
+    if common.compression(file_name, detect=False) is not None:
+        file_name = os.path.splitext(file_name)[0]
+    ext = os.path.splitext(file_name)[1].lower()
+    if ext in (".sdf", ".sd"):
+        return "sdf"
+    if ext in (".smi", ".smiles", ".txt"):
+        return "smi"
+    return "mol"
+
+
+def read_records(fh: Iterable[str], fmt: str, start: int = 1) -> Iterator[Record]:
+    """
+    split an input stream into records, one per molecule
+
+    :param fh: text stream, or other lines
+    :param fmt: 'sdf', 'smi' or 'mol', see record_format
+    :param start: number of the first record
+    :return: iterator over records
+    """
+    index = start
+
+    if fmt == "sdf":
+        lines = []
+        for line in fh:
+            if line.startswith("$$$$"):
+                yield Record(index, "".join(lines), lines[0].strip() if lines else "")
+                index += 1
+                lines = []
+            else:
+                lines.append(line)
+        if "".join(lines).strip():  # last record without terminator
+            yield Record(index, "".join(lines), lines[0].strip())
+
+    elif fmt == "smi":
+        for line in fh:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            fields = line.split(None, 1)
+            yield Record(index, line, fields[1] if len(fields) > 1 else "")
+            index += 1
+
+    else:
+        data = fh.read()
+        yield Record(index, data, data.split("\n", 1)[0].strip())
+
+
+def structure_key(data: str, opts: Dict[str, Any]) -> str:
+    """
+    a key under which duplicates of a molecule can share their
+    converted code. Canonical SMILES are used where neither the input
+    coordinates nor the input atom order affect the result; otherwise,
+    and for invalid input, the key is the input itself. A molecule with
+    canonical SMILES as key is converted from these, so that its code
+    doesn't depend on which of its duplicates came first.
+
+    :param data: molecule data
+    :param opts: option dict
+    :return: key
+    """
+    data = data.strip()
+
+    if opts["dedup"] != "structure":
+        return data
+
+    try:
+        int(data)
+        return data  # PubChem index
+    except ValueError:
+        pass
+
+    if any(opts.get(key) for key in _numbering_keys):
+        return data
+
+    try:
+        tkmol = common.indigo().loadMolecule(data)
+        if tkmol.hasCoord() and not opts["recalculate_coordinates"]:
+            return data
+        tkmol.aromatize()
+        return tkmol.canonicalSmiles()
+    except IndigoException:
+        return data
+
+
+def convert_code(data: str, opts: Dict[str, Any]) -> Tuple[
+    bool,
+    Union[str, common.ErrorResult],
+    List[str],
+    Optional[Dict[str, int]],
+]:
+    """
+    convert a single record to code. Errors are returned, not raised.
+
+    :param data: molecule data
+    :param opts: option dict
+    :return: (success, code or error, parts skipped to limit quality,
+              toolkit calls if counted)
+    """
+    success, result = try_convert(data, opts, opts["traceback"])
+    if not success:
+        return False, result, [], None
+    return True, result.render_user(), result.degraded, result.toolkit_calls
+
+
+def convert_codes(datas: List[str], opts: Dict[str, Any]) -> List[Tuple]:
+    """
+    convert_code for several records, as one task for a worker
+
+    :param datas: [data_1, data_2,...]
+    :param opts: option dict
+    :return: [result of convert_code,...]
+    """
+    return [convert_code(data, opts) for data in datas]
+
+
+def convert_record(
+    data: str,
+    opts: Dict[str, Any],
+    calls: Optional[Dict[str, int]] = None,
+    worker: Optional[Worker] = None,
+) -> Tuple[bool, Union[str, common.ErrorResult], List[str]]:
+    """
+    convert a single record. Errors are reported, not raised, so
+    that one faulty record does not stop the batch.
+
+    :param data: molecule data
+    :param opts: option dict
+    :param calls: if given, toolkit calls are added up here
+    :param worker: if given, convert in this worker process
+    :return: (success, code or error, parts skipped to limit quality)
+    """
+    if worker is None:
+        success, result, degraded, record_calls = convert_code(data, opts)
+    else:
+        try:
+            success, result, degraded, record_calls = worker.run(
+                convert_code, data, opts
+            )
+        except WorkerError as error:
+            result = common.ErrorResult.from_exception(error, "convert")
+            return False, result, []
+
+    if calls is not None and record_calls is not None:
+        for name, count in record_calls.items():
+            calls[name] = calls.get(name, 0) + count
+    return success, result, degraded
+
+
+class DedupCache:
+    """
+    converted records by structure key, for reuse by duplicates. The
+    least recently used are forgotten first. Safe to share between
+    threads; two threads may still convert the same molecule at once.
+    """
+
+    def __init__(self, opts: Dict[str, Any], size: int = DEDUP_CACHE_SIZE) -> None:
+        self.opts = opts
+        self.size = size
+        self.settings_key = common.options_key(opts)
+        self._seen = OrderedDict()  # least recently used first
+        self._lock = threading.Lock()
+
+    def key(self, data: str) -> Tuple[str, Tuple[Tuple[str, str], ...]]:
+        """
+        :param data: molecule data
+        :return: key
+        """
+        return structure_key(data, self.opts), self.settings_key
+
+    @staticmethod
+    def source(key: Tuple, data: str) -> str:
+        """
+        :param key: key from DedupCache.key
+        :param data: molecule data
+        :return: what to convert: the canonical SMILES of the key, in
+                 Kekulé form, if there are any, else the data
+        """
+        if key[0] == data.strip():
+            return data
+        try:
+            tkmol = common.indigo().loadMolecule(key[0])
+            tkmol.dearomatize()
+            return tkmol.smiles()
+        except IndigoException:
+            return key[0]
+
+    def get(self, key: Tuple) -> Optional[Tuple]:
+        """
+        :param key: key from DedupCache.key
+        :return: result of convert_record, or None
+        """
+        with self._lock:
+            result = self._seen.get(key)
+            if result is not None:
+                self._seen.move_to_end(key)
+            return result
+
+    def put(self, key: Tuple, result: Tuple) -> None:
+        """
+        :param key: key from DedupCache.key
+        :param result: result of convert_record
+        :return: None
+        """
+        with self._lock:
+            if len(self._seen) >= self.size:
+                self._seen.popitem(last=False)
+            self._seen[key] = result
+
+
+def convert_unique(
+    data: str,
+    opts: Dict[str, Any],
+    calls: Optional[Dict[str, int]],
+    worker: Optional[Worker],
+    dedup: Optional[DedupCache],
+) -> Tuple[bool, Union[str, common.ErrorResult], List[str]]:
+    """
+    convert_record, unless a duplicate has been converted before
+
+    :param data: molecule data
+    :param opts: option dict
+    :param calls: if given, toolkit calls are added up here
+    :param worker: if given, convert in this worker process
+    :param dedup: if given, results of earlier records
+    :return: (success, code or error, parts skipped to limit quality)
+    """
+    if dedup is None:
+        return convert_record(data, opts, calls, worker)
+
+    key = dedup.key(data)
+    result = dedup.get(key)
+    if result is None:
+        result = convert_record(dedup.source(key, data), opts, calls, worker)
+        dedup.put(key, result)
+    return result
+
+
+def convert_records(
+    records: Iterable[Record],
+    opts: Dict[str, Any],
+    calls: Optional[Dict[str, int]] = None,
+    worker: Optional[Worker] = None,
+) -> Iterator[Tuple[Record, bool, Union[str, common.ErrorResult], List[str]]]:
+    """
+    convert records in input order. Duplicates are converted only once.
+
+    :param records: records
+    :param opts: option dict
+    :param calls: if given, toolkit calls are added up here
+    :param worker: if given, convert in this worker process
+    :return: iterator over (record, success, code or error, skipped parts)
+    """
+    dedup = None if opts.get("dedup", "none") == "none" else DedupCache(opts)
+
+    for record in records:
+        yield (record,) + convert_unique(record.data, opts, calls, worker, dedup)
+
+
+def new_worker(opts: Dict[str, Any]) -> Worker:
+    """
+    a worker process set up according to user options
+
+    :param opts: option dict
+    :return: Worker
+    """
+    max_rss, memory_limit = (
+        opts[key] * 2**20 if opts[key] else None for key in ("max_rss", "memory_limit")
+    )
+    return Worker(opts["timeout"], opts["max_tasks"], max_rss, memory_limit)
+
+
+def convert_parallel(
+    records: Iterable[Record],
+    opts: Dict[str, Any],
+    calls: Optional[Dict[str, int]] = None,
+    counts: Optional[Dict[str, int]] = None,
+) -> Iterator[Tuple[Record, bool, Union[str, common.ErrorResult], List[str]]]:
+    """
+    convert records in opts['jobs'] worker processes or, if
+    opts['pool'] is 'thread', threads; see pipeline.run_pipeline.
+    Results come in input order unless opts['unordered'] is set.
+    Duplicates are converted only once, unless they are converted
+    at the same time.
+
+    :param records: records
+    :param opts: option dict
+    :param calls: if given, toolkit calls are added up here
+    :param counts: if given, Worker.counts are added up here
+    :return: iterator over (record, success, code or error, skipped parts)
+    """
+    dedup = None if opts.get("dedup", "none") == "none" else DedupCache(opts)
+    calls_lock = threading.Lock()
+
+    def convert(record: Record, worker: Optional[Worker]) -> Tuple:
+        record_calls = None if calls is None else {}
+        result = convert_unique(record.data, opts, record_calls, worker, dedup)
+
+        if record_calls:
+            with calls_lock:
+                for name, count in record_calls.items():
+                    calls[name] = calls.get(name, 0) + count
+        return result
+
+    for record, result in run_pipeline(
+        records,
+        convert,
+        opts["jobs"],
+        (lambda: new_worker(opts)) if opts["pool"] == "process" else None,
+        ordered=not opts["unordered"],
+        counts=counts,
+    ):
+        yield (record,) + result
+
+
+def convert_scheduled(
+    records: Iterable[Record],
+    opts: Dict[str, Any],
+    calls: Optional[Dict[str, int]] = None,
+    counts: Optional[Dict[str, int]] = None,
+) -> Iterator[Tuple[Record, bool, Union[str, common.ErrorResult], List[str]]]:
+    """
+    like convert_parallel, but records are handed out largest first and
+    in chunks, see schedule.schedule. In worker processes, a chunk may
+    take as long as the CostModel allows, or opts['timeout'] seconds
+    per record; if it times out or the worker dies, its records are
+    tried again one by one.
+
+    :param records: records
+    :param opts: option dict
+    :param calls: if given, toolkit calls are added up here
+    :param counts: if given, Worker.counts are added up here
+    :return: iterator over (record, success, code or error, skipped parts)
+    """
+    dedup = None if opts.get("dedup", "none") == "none" else DedupCache(opts)
+    model = CostModel()
+    calls_lock = threading.Lock()
+
+    def run(datas: List[str], costs: List[float], worker: Optional[Worker]) -> List:
+        if worker is None:
+            return convert_codes(datas, opts)
+
+        if opts["timeout"]:
+            timeout = opts["timeout"] * len(datas)
+        else:
+            timeout = model.timeout(sum(costs))
+
+        start = time.perf_counter()
+        try:
+            results = worker.run(convert_codes, datas, opts, timeout=timeout)
+        except WorkerError as error:
+            if len(datas) > 1:  # find the culprit
+                return [run([d], [c], worker)[0] for d, c in zip(datas, costs)]
+            return [
+                (False, common.ErrorResult.from_exception(error, "convert"), [], None)
+            ]
+
+        model.update(sum(costs), time.perf_counter() - start)
+        return results
+
+    def convert(chunk: Chunk, worker: Optional[Worker]) -> List[Tuple]:
+        keys = [dedup and dedup.key(record.data) for record in chunk.records]
+        results = [dedup and dedup.get(key) for key in keys]
+        todo = [i for i, result in enumerate(results) if result is None]
+
+        converted = (
+            run(
+                (
+                    [dedup.source(keys[i], chunk.records[i].data) for i in todo]
+                    if dedup is not None
+                    else [chunk.records[i].data for i in todo]
+                ),
+                [chunk.costs[i] for i in todo],
+                worker,
+            )
+            if todo
+            else []
+        )
+
+        for i, (success, result, degraded, record_calls) in zip(todo, converted):
+            results[i] = success, result, degraded
+            if dedup is not None:
+                dedup.put(keys[i], results[i])
+            if calls is not None and record_calls:
+                with calls_lock:
+                    for name, count in record_calls.items():
+                        calls[name] = calls.get(name, 0) + count
+        return results
+
+    order = deque()  # indices of the records read, in input order
+    pending = {}  # index -> result, waiting for predecessors
+    jobs = opts["jobs"]
+
+    def read() -> Iterator[Record]:
+        for record in records:
+            order.append(record.index)
+            yield record
+
+    for chunk, results in run_pipeline(
+        schedule(read(), jobs * SCHEDULE_LOOKAHEAD),
+        convert,
+        jobs,
+        (lambda: new_worker(opts)) if opts["pool"] == "process" else None,
+        ordered=False,
+        counts=counts,
+    ):
+        for record, result in zip(chunk.records, results):
+            if opts["unordered"]:
+                yield (record,) + result
+                continue
+            pending[record.index] = (record,) + result
+            while order and order[0] in pending:
+                yield pending.pop(order.popleft())
+
+
+def format_result(
+    record: Record,
+    success: bool,
+    result: Union[str, common.ErrorResult],
+    degraded: Iterable[str] = (),
+) -> str:
+    """
+    format the result for one record. A comment line identifies the
+    record, so the output stays in step with the input even if some
+    records fail.
+
+    :param record: record
+    :param success: whether the conversion succeeded
+    :param result: code or error
+    :param degraded: parts of rendering skipped to limit quality
+    :return: formatted result
+    """
+    header = f"% {record.index}"
+    if record.title:
+        header += f": {record.title}"
+    if degraded:
+        header += f"\n% reduced quality: skipped {', '.join(degraded)}"
+
+    if success:
+        return f"{header}\n{result}\n\n"
+
+    lines = str(result).strip().splitlines() or [""]
+    error = "\n".join(f"% {line}" for line in lines)
+    return f"{header}\n% failed: {result.kind} in {result.stage}\n{error}\n\n"
+
+
+def selected(
+    record: Record,
+    ranges: Optional[List[Tuple[int, int]]],
+    ids: Optional[Iterable[str]],
+) -> bool:
+    """
+    :param record: record
+    :param ranges: [(first, last),...] of record numbers
+    :param ids: record titles
+    :return: whether the record is in one of the ranges or has one of the ids
+    """
+    if ranges and any(first <= record.index <= last for first, last in ranges):
+        return True
+    return bool(ids) and record.title in ids
+
+
+def read_indexed(
+    record_index: RecordIndex,
+    start: int,
+    ranges: Optional[List[Tuple[int, int]]],
+    ids: Optional[Iterable[str]],
+) -> Iterator[Record]:
+    """
+    read the selected records of an indexed file, see selected, straight
+    from where they are, without scanning the rest
+
+    :param record_index: RecordIndex of the file
+    :param start: number of its first record
+    :param ranges: [(first, last),...] of record numbers
+    :param ids: record titles
+    :return: iterator over records
+    """
+    positions = set()
+    for first, last in ranges or ():
+        positions.update(
+            range(max(first - start, 0), min(last - start + 1, len(record_index)))
+        )
+    for record_id in ids or ():
+        positions.update(record_index.find(record_id))
+
+    for first, last in runs(sorted(positions)):
+        part = record_index.starts[first], record_index.end(last), first
+        yield from read_part(record_index.file_name, record_index.fmt, part, start)
+
+
+def read_part(
+    file_name: str, fmt: str, part: Tuple[int, int, int], start: int = 1
+) -> Iterator[Record]:
+    """
+    read the records in a byte range of a file, such as one of those
+    from RecordIndex.split, which a worker can do by itself
+
+    :param file_name: file name
+    :param fmt: 'sdf' or 'smi', see record_format
+    :param part: (start offset, end offset, position of first record)
+    :param start: number of the first record of the file
+    :return: iterator over records
+    """
+    offset, end, position = part
+
+    def lines(fh: BinaryIO) -> Iterator[str]:
+        nonlocal offset
+        fh.seek(offset)
+        while offset < end:
+            line = fh.readline()
+            if not line:
+                break
+            offset += len(line)
+            yield line.decode("utf-8").replace("\r\n", "\n").replace("\r", "\n")
+
+    try:
+        fh = open(file_name, mode="rb")
+    except IOError:
+        raise common.MCFError(f"Can't read file {file_name}")
+
+    with fh:
+        try:
+            yield from read_records(lines(fh), fmt, start + position)
+        except common.read_errors:
+            raise common.MCFError(f"Can't read file {file_name}")
+
+
+def iter_input(
+    file_names: List[str],
+    ranges: Optional[List[Tuple[int, int]]] = None,
+    ids: Optional[Iterable[str]] = None,
+) -> Iterator[Record]:
+    """
+    read records from all input files; numbering continues across files.
+    With ranges or ids, only the records selected by them are read, see
+    selected; files with an up-to-date index are not scanned for them.
+
+    :param file_names: [file_1, file_2,...]
+    :param ranges: [(first, last),...] of record numbers
+    :param ids: record titles
+    :return: iterator over records
+    """
+    select = bool(ranges or ids)
+    index = 1
+    for file_name in file_names:
+        record_index = RecordIndex.load(file_name) if select else None
+        if record_index is not None:
+            yield from read_indexed(record_index, index, ranges, ids)
+            index += len(record_index)
+            continue
+
+        try:
+            fh = common.open_text(file_name)
+        except IOError:
+            raise common.MCFError(f"Can't read file {file_name}")
+
+        with fh:
+            try:
+                for record in read_records(fh, record_format(file_name), index):
+                    index = record.index + 1
+                    if not select or selected(record, ranges, ids):
+                        yield record
+            except common.read_errors:
+                raise common.MCFError(f"Can't read file {file_name}")
+
+
+def parse_shard(value: str) -> Tuple[int, int]:
+    """
+    :param value: 'I/N'
+    :return: (I, N)
+    """
+    try:
+        shard, shards = (int(part) for part in value.split("/"))
+    except ValueError:
+        shard = shards = 0
+    if not 1 <= shard <= shards:
+        raise common.MCFError(f"--shard must be I/N with 1 <= I <= N, not {value}")
+    return shard, shards
+
+
+def select_shard(
+    records: Iterable[Record], shard: int, shards: int
+) -> Iterator[Record]:
+    """
+    the records of one shard: every shards-th, starting with number
+    shard. As records are numbered across all input files, shards
+    are the same on every machine and differ in size by one at most.
+
+    :param records: records
+    :param shard: number of the shard, from 1
+    :param shards: number of shards
+    :return: iterator over records
+    """
+    for record in records:
+        if (record.index - shard) % shards == 0:
+            yield record
+
+
+def job_key(opts: Dict[str, Any], file_names: List[str]) -> str:
+    """
+    a key of what a batch run writes, which its checkpoint must match
+    to be resumed: the input files, their sizes, and the options that
+    affect the output
+
+    :param opts: option dict
+    :param file_names: [file_1, file_2,...]
+    :return: hex digest
+    """
+    files = []
+    for file_name in file_names:
+        try:
+            size = os.path.getsize(file_name)
+        except OSError:
+            size = None
+        files.append((os.path.abspath(file_name), size))
+
+    key = (
+        common.options_key(opts),
+        opts["dedup"],
+        opts["traceback"],
+        opts["shard"],
+        opts["records"],
+        opts["id"],
+        files,
+    )
+    return hashlib.sha256(repr(key).encode("utf-8")).hexdigest()
+
+
+def parse_args(
+    raw_args: Union[List[str], str, None], program_name: str
+) -> Tuple[Dict[str, Any], List[str]]:
+    """
+    parse batch-mode arguments
+
+    :param raw_args: arguments
+    :param program_name: program name
+    :return: (option dict, input files)
+    """
+    program_name = os.path.split(program_name)[-1]
+
+    if not raw_args:
+        raise HelpError(common.batch_help_text(program_name=program_name))
+
+    try:
+        parsed_options, file_names = options.getBatchParser().process_cli(raw_args)
+    except Exception as msg:
+        if str(msg).endswith("not recognized"):  # get opt error
+            msg = (
+                f"{str(msg)}. Try {program_name} batch "
+                "--help to see a list of available options."
+            )
+        raise HelpError(msg)
+
+    opts = dict(common.settings)
+    opts.update(parsed_options)
+
+    if opts["help"]:
+        raise HelpError(common.batch_help_text(program_name=program_name))
+    if opts["version"]:
+        raise HelpError(common.version_text(program_name=program_name))
+    if not file_names:
+        raise common.MCFError("No input files supplied")
+    if opts["pool"] == "thread" and any(opts[key] for key in _worker_keys):
+        raise common.MCFError(
+            "Threads can't be stopped or recycled; use --pool=process with "
+            "--timeout, --max-tasks, --max-rss or --memory-limit"
+        )
+    if opts["resume"] and not opts["output"]:
+        raise common.MCFError("Only runs with --output can be resumed")
+    if opts["checkpoint"] < 1:
+        raise common.MCFError("--checkpoint must be at least 1")
+    if opts["shard"]:
+        parse_shard(opts["shard"])
+
+    return opts, file_names
+
+
+def process_batch(
+    raw_args: Union[List[str], str, None],
+    out: TextIO,
+    program_name: str = "mol2chemfigPy3",
+) -> Tuple[bool, str]:
+    """
+    batch-mode counterpart of processor.process: convert all records
+    of the input files and write the results to out in input order. With
+    opts['output'], they go to that file instead, with checkpoints.
+
+    :param raw_args: arguments
+    :param out: text sink for the results
+    :param program_name: program name
+    :return: (bool, summary or error message)
+    """
+    try:
+        opts, file_names = parse_args(raw_args, program_name)
+
+        state = dict(
+            total=0,
+            reduced=0,
+            failures={},  # 'kind in stage' -> count
+            counts={},  # restarts, recycles and requeued records of workers
+            calls={} if opts["count_calls"] else None,
+        )
+        ids = set(opts["id"].split(",")) if opts["id"] else None
+        records = iter_input(file_names, opts["records"], ids)
+        if opts["shard"]:
+            records = select_shard(records, *parse_shard(opts["shard"]))
+
+        checkpoint = None
+        if opts["output"]:
+            job = job_key(opts, file_names)
+            checkpoint = Checkpoint(opts["output"], job, opts["checkpoint"])
+            if opts["resume"] and checkpoint.load():
+                state = checkpoint.state
+            checkpoint.open()
+            records = (record for record in records if record.index not in checkpoint)
+
+        calls, counts = state["calls"], state["counts"]
+
+        # with a time limit or memory limits, records are converted in
+        # a child process that is replaced if it takes too long or grows
+        worker = None
+        if opts["schedule"] == "cost":
+            records = convert_scheduled(records, opts, calls, counts)
+        elif opts["jobs"] > 1:
+            records = convert_parallel(records, opts, calls, counts)
+        else:
+            if any(opts[key] for key in _worker_keys):
+                worker = new_worker(opts)
+            records = convert_records(records, opts, calls, worker)
+
+        failures = state["failures"]
+        finished = False
+        try:
+            for record, success, result, degraded in records:
+                text = format_result(record, success, result, degraded)
+                if checkpoint is None:
+                    out.write(text)
+                else:
+                    checkpoint.write(record.index, text)
+
+                state["total"] += 1
+                state["reduced"] += bool(degraded)
+                if not success:
+                    key = f"{result.kind} in {result.stage}"
+                    failures[key] = failures.get(key, 0) + 1
+                if checkpoint is not None:
+                    checkpoint.tick(state)
+            finished = True
+        finally:
+            if worker is not None:
+                worker.close()
+                for name, count in worker.counts().items():
+                    counts[name] = counts.get(name, 0) + count
+            if checkpoint is not None:
+                checkpoint.close(state, finished)
+
+    except HelpError as msg:
+        return False, str(msg)
+
+    except common.MCFError as msg:
+        return False, f"\033[0;31m{msg}\033[0m"
+
+    summary = f"{state['total']} records converted, {sum(failures.values())} failed"
+    if failures:
+        summary += " (" + ", ".join(f"{n} {key}" for key, n in failures.items()) + ")"
+    if state["reduced"]:
+        summary += f", {state['reduced']} with reduced quality"
+    for name, label in _count_labels:
+        if counts.get(name):
+            summary += f", {counts[name]} {label}"
+    if calls is not None:
+        summary += f", {sum(calls.values())} toolkit calls"
+    return True, summary
+
+
+def read_results(fh: TextIO) -> Iterator[Tuple[int, str]]:
+    """
+    split batch output into the results of the records, see format_result
+
+    :param fh: text stream
+    :return: iterator over (record number, formatted result)
+    """
+    index, lines = None, []
+    for line in fh:
+        match = _result_header.match(line)
+        if match is not None and (not lines or lines[-1] == "\n"):
+            if index is not None:
+                yield index, "".join(lines)
+            index, lines = int(match.group(1)), []
+        lines.append(line)
+    if index is not None:
+        yield index, "".join(lines)
+
+
+def process_merge(
+    raw_args: Union[List[str], str, None],
+    out: TextIO,
+    program_name: str = "mol2chemfigPy3",
+) -> Tuple[bool, str]:
+    """
+    merge the outputs of a batch run split with --shard, each in record
+    order, into one in record order. The files, which may be compressed,
+    are read side by side, not into memory.
+
+    :param raw_args: output files of the shards
+    :param out: text sink for the merged output
+    :param program_name: program name
+    :return: (bool, summary or error message)
+    """
+    program_name = os.path.split(program_name)[-1]
+    file_names = raw_args.split() if isinstance(raw_args, str) else raw_args
+
+    if not file_names or file_names[0] in ("-h", "--help"):
+        return False, common.merge_help_text(program_name=program_name)
+
+    def read(file_name: str, fh: TextIO) -> Iterator[Tuple[int, str]]:
+        last = 0
+        try:
+            for index, text in read_results(fh):
+                if index < last:
+                    raise common.MCFError(
+                        f"{file_name} is not in record order; merge needs batch "
+                        "output written without --unordered"
+                    )
+                last = index
+                yield index, text
+        except common.read_errors:
+            raise common.MCFError(f"Can't read file {file_name}")
+
+    handles = []
+    try:
+        for file_name in file_names:
+            try:
+                handles.append(common.open_text(file_name))
+            except common.read_errors:
+                raise common.MCFError(f"Can't read file {file_name}")
+
+        total = 0
+        streams = [read(name, fh) for name, fh in zip(file_names, handles)]
+        for index, text in heapq.merge(*streams, key=lambda result: result[0]):
+            out.write(text)
+            total += 1
+
+    except common.MCFError as msg:
+        return False, f"\033[0;31m{msg}\033[0m"
+
+    finally:
+        for fh in handles:
+            fh.close()
+
+    return True, f"{total} records merged from {len(file_names)} files"
+
+
+def process_index(
+    raw_args: Union[List[str], str, None],
+    out: TextIO,
+    program_name: str = "mol2chemfigPy3",
+) -> Tuple[bool, str]:
+    """
+    build the indices of SDF and SMILES files, see index.RecordIndex
+
+    :param raw_args: input files
+    :param out: text sink for a line about each index
+    :param program_name: program name
+    :return: (bool, summary or error message)
+    """
+    program_name = os.path.split(program_name)[-1]
+    file_names = raw_args.split() if isinstance(raw_args, str) else raw_args
+
+    if not file_names or file_names[0] in ("-h", "--help"):
+        return False, common.index_help_text(program_name=program_name)
+
+    total = 0
+    try:
+        for file_name in file_names:
+            record_index = RecordIndex.build(file_name, record_format(file_name))
+            record_index.save()
+            out.write(f"{record_index.path}: {len(record_index)} records\n")
+            total += len(record_index)
+
+    except common.MCFError as msg:
+        return False, f"\033[0;31m{msg}\033[0m"
+
+    return True, f"{total} records indexed in {len(file_names)} files"
@@ -2,9 +2,11 @@
 """
 My name is Bond. JAMES Bond.
 """
+
 from typing import Optional, Union, Tuple, Dict, Any
 from copy import deepcopy, copy
 from math import atan, tan, pi
+from bisect import bisect_left
 from indigo import Indigo
 from .atom import Atom
 from . import chemfig_mappings as cfm
@@ -72,6 +74,21 @@ def compare_positions(
     return length, angle
 
 
+def _cotan100(angle: float) -> int:
+    """
+    100 times cotan of angle, rounded
+
+    :param angle: angle
+    :return: Int(100 * cot(angle))
+    """
+    _tan = tan(angle * pi / 180)
+    return int(round(100 / _tan))
+
+
+# bonds are mostly decorated at integer angles
+_cotan100_table = {angle: _cotan100(angle) for angle in range(1, 361)}
+
+
 class Bond:
     """
     helper class for molecule.Molecule
@@ -83,18 +100,10 @@ class Bond:
     On instantiation, the bond is not part of a hierarchy yet, so
     we can assign a parent. This has to occur later. So, initially
     we just know the start and the end atom.
-    """
-
-    is_last = False  # flag for bond that is the last descendant of
-    # the exit bond - needed in rare case in
-    # cases for bond formatting.
-    to_phantom = False  # flag for bonds that should render their end atoms
-    # as phantoms: Ring closures and cross bonds
-    is_trunk = False  # by default, bonds are not part of the trunk
-    parent = None  # will be assigned when bonds are added to the tree.
-    clockwise = 0  # only significant in double bonds in rings that are
 
-    # not drawn with aromatic circles
+    All state lives in the instances, so that molecules can be
+    converted in several threads at once.
+    """
 
     def __init__(
         self,
@@ -124,9 +133,7 @@ class Bond:
             # or else keep passed-in string specifier
             self.bond_type = bond_mapping.get(bond_type, bond_type)
 
-        # bonds now are also the nodes in the molecule tree. These two
-        # attributes must be set later, when the tree is created.
-        self.descendants = []
+        self.init_node()
 
         self.length, angle = self.bond_dimensions()
         # length is adjusted and rounded later, after all is parsed
@@ -145,6 +152,26 @@ class Bond:
         else:
             self.marker = ""
 
+    def init_node(self) -> None:
+        """
+        bonds are also the nodes in the molecule tree. Their place
+        in it is set later, when the tree is created.
+
+        :return: None
+        """
+        self.parent = None
+        self.descendants = []
+        self.is_trunk = False  # by default, bonds are not part of the trunk
+        # flag for bond that is the last descendant of the exit
+        # bond - needed in rare cases for bond formatting.
+        self.is_last = False
+        # flag for bonds that should render their end atoms
+        # as phantoms: ring closures and cross bonds
+        self.to_phantom = False
+        # only significant in double bonds in rings that are
+        # not drawn with aromatic circles
+        self.clockwise = 0
+
     def bond_dimensions(self) -> Tuple[float, float]:
         """
         determine bond angle and distance between two atoms
@@ -251,20 +278,32 @@ class Bond:
         :param inversion_angle: inversion angle
         :return: (left angle, right angle) or (None, None)
         """
-        raw_angles = atom.bond_angles[:]
-        raw_angles = [int(round(a)) % 360 for a in raw_angles]
+        table = atom.angle_table()
 
         reference_angle = int(round(self.angle - inversion_angle)) % 360
 
-        raw_angles.remove(reference_angle)
+        i = bisect_left(table, reference_angle)
+        if i == len(table) or table[i] != reference_angle:
+            raise ValueError(
+                f"bond angle {reference_angle} not found at atom {atom.idx}"
+            )
 
-        if not raw_angles:  # no other bonds attach to start atom
+        if len(table) == 1:  # no other bonds attach to start atom
             return None, None
 
-        angles = [(a - reference_angle) % 360 for a in raw_angles]
-        angles.sort()
+        # relative to the reference angle, the table is sorted
+        # after rotating it to start right after the reference
+        if i + 1 < len(table):
+            first = table[i + 1] - reference_angle
+        else:
+            first = table[0] - reference_angle + 360
 
-        return int(round(angles[0])), int(round(angles[-1]))
+        if i > 0:
+            last = table[i - 1] - reference_angle + 360
+        else:
+            last = table[-1] - reference_angle
+
+        return first, last
 
     def upstream_angles(self) -> Dict[str, Optional[int]]:
         """
@@ -316,8 +355,10 @@ class Bond:
         :param angle: angle
         :return: Int(100 * cot(angle))
         """
-        _tan = tan(angle * pi / 180)
-        return int(round(100 / _tan))
+        cot = _cotan100_table.get(angle)
+        if cot is None:
+            cot = _cotan100(angle)
+        return cot
 
     def shorten_stroke(
         self, same_angle: Union[int, float, None], other_angle: Union[int, float, None]
@@ -509,31 +550,35 @@ class Bond:
 
     def indent(
         self, level: int, bond_code: str, atom_code: str = "", comment_code: str = ""
-    ) -> str:
+    ) -> Tuple[int, str]:
         """
         :param level: level value
         :param bond_code: bond code
         :param atom_code: atom code
         :param comment_code: comment code
-        :return: indent space + bond code + atom code
+        :return: (width of indent space, bond code + atom code)
         """
-        stuff: str = (
-            " " * self.options["indent"] * level
-            + bond_code.rjust(cfm.BOND_CODE_WIDTH)
-            + atom_code
-        )
+        stuff = bond_code + atom_code
+
+        if self.options["terse"]:  # no white space, no comments
+            return 0, stuff
 
         if comment_code:
             stuff += "% " + comment_code
 
-        return stuff.rstrip()
+        # bond codes are right-aligned within BOND_CODE_WIDTH
+        lead = self.options["indent"] * level + max(
+            0, cfm.BOND_CODE_WIDTH - len(bond_code)
+        )
+
+        return lead, stuff.rstrip()
 
-    def render(self, level: int) -> str:
+    def render(self, level: int) -> Tuple[int, str]:
         """
         render bond and trailing atom.
 
         :param level: level value
-        :return: rendered code
+        :return: (width of indent space, rendered code)
         """
         if not self.to_phantom:
             atom_code, comment_code = self.end_atom.render()
@@ -558,8 +603,8 @@ class DummyFirstBond(Bond):
         self.options = options
         self.end_atom = end_atom
         self.angle = None
-        self.descendants = []
         self.length = None
+        self.init_node()
 
     def bond_to_chemfig(self) -> str:
         """
@@ -576,7 +621,6 @@ class AromaticRingBond(Bond):
     as a node in the regular bond hierarchy.
     """
 
-    descendants = []
     scale = 1.5  # 1.5 corresponds to ring size of chemfig
 
     def __init__(
@@ -588,6 +632,7 @@ class AromaticRingBond(Bond):
         inner_r: Union[int, float],
     ) -> None:
         self.options = options
+        self.init_node()
         self.angle = cfm.num_round(angle, 1) % 360
         if parent is not None:
             self.parent_angle = parent.angle
@@ -596,13 +641,13 @@ class AromaticRingBond(Bond):
         self.length = cfm.num_round(length, 2)
         self.radius = cfm.num_round(self.scale * inner_r, 2)
 
-    def render(self, level: int) -> str:
+    def render(self, level: int) -> Tuple[int, str]:
         """
         there is no atom to render, so we just call chemfig_mapping
         on our own attributes.
 
         :param level: level value
-        :return: rendered code
+        :return: (width of indent space, rendered code)
         """
         ring_bond_code, ring_code, comment = cfm.format_aromatic_ring(
             self.options,
@@ -0,0 +1,325 @@
+# -*- coding: utf-8 -*-
+"""
+caches that let repeated conversions skip expensive steps
+"""
+
+import hashlib
+import math
+import sqlite3
+import threading
+import zlib
+from array import array
+from typing import Optional, Dict, Any, Iterator
+from indigo import IndigoObject
+from . import common
+
+LAYOUT_CACHE_SIZE = 100000  # number of laid-out molecules kept per cache
+ERROR_CACHE_SIZE = 1000000  # number of failed inputs kept per cache
+BLOOM_FALSE_POSITIVES = 0.01  # target rate of needless lookups in the error store
+
+# options that influence the coordinates produced by load_molecule
+_layout_keys = ("hydrogens", "recalculate_coordinates", "layout")
+
+
+class LayoutCache:
+    """
+    a store of laid-out molecules, keyed by input and layout options.
+
+    Molecules are kept as compressed molfiles written by Indigo. Unlike
+    Indigo's binary serialization, these keep the order of atoms and the
+    direction of bonds, both of which shape the output. Since molfiles
+    round coordinates, the exact coordinates are stored alongside, so a
+    cached molecule renders exactly like a freshly laid-out one.
+    The store is an sqlite database, which may be a file shared between
+    runs and processes, or ':memory:'.
+    """
+
+    def __init__(self, path: str = ":memory:", size: int = LAYOUT_CACHE_SIZE) -> None:
+        self.path = path
+        self.size = size
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS layout "
+            "(key TEXT PRIMARY KEY, mol BLOB NOT NULL, xyz BLOB NOT NULL)"
+        )
+        self._db.commit()
+
+    @staticmethod
+    def key(data: str, options: Dict[str, Any]) -> str:
+        """
+        key for a molecule; the Indigo version is part of it because
+        the layout may change between versions
+
+        :param data: molecule data
+        :param options: option dict
+        :return: hex digest
+        """
+        parts = [common.indigo().version()]
+        parts.extend(repr(options.get(key)) for key in _layout_keys)
+        parts.append(data.strip())
+        return hashlib.sha256("\n".join(parts).encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[IndigoObject]:
+        """
+        restore a cached molecule
+
+        :param key: key from LayoutCache.key
+        :return: IndigoObject, or None if not cached
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT mol, xyz FROM layout WHERE key = ?", (key,)
+            ).fetchone()
+
+        if row is None:
+            return None
+
+        tkmol = common.indigo().loadMolecule(zlib.decompress(row[0]).decode())
+        xyz = array("f", row[1])
+
+        for i, atom in enumerate(tkmol.iterateAtoms()):
+            atom.setXYZ(*xyz[3 * i : 3 * i + 3])
+
+        return tkmol
+
+    def put(self, key: str, tkmol: IndigoObject) -> None:
+        """
+        store a laid-out molecule, evicting the oldest entries if full.
+        Molecules whose atom numbering has gaps, e.g. after deleting
+        hydrogens, can't be restored faithfully and are skipped.
+
+        :param key: key from LayoutCache.key
+        :param tkmol: laid-out molecule
+        :return: None
+        """
+        xyz = array("f")
+        for i, atom in enumerate(tkmol.iterateAtoms()):
+            if atom.index() != i:  # the molfile would close gaps in numbering
+                return
+            xyz.extend(atom.xyz())
+
+        blob = zlib.compress(tkmol.molfile().encode())
+
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO layout VALUES (?, ?, ?)",
+                (key, blob, xyz.tobytes()),
+            )
+            self._db.execute(
+                "DELETE FROM layout WHERE rowid <= "
+                "(SELECT MAX(rowid) FROM layout) - ?",
+                (self.size,),
+            )
+            self._db.commit()
+
+    def clear(self) -> None:
+        """
+        forget all cached molecules
+
+        :return: None
+        """
+        with self._lock:
+            self._db.execute("DELETE FROM layout")
+            self._db.commit()
+
+    def close(self) -> None:
+        """
+        :return: None
+        """
+        with self._lock:
+            self._db.close()
+
+
+class BloomFilter:
+    """
+    a set of keys that may report false positives but never false
+    negatives. Keys are hex digests, whose bits serve as hash values.
+    """
+
+    def __init__(self, capacity: int, false_positives: float) -> None:
+        bits = -capacity * math.log(false_positives) / math.log(2) ** 2
+        self.bits = max(64, int(bits))
+        self.hashes = max(1, round(self.bits / capacity * math.log(2)))
+        self.array = bytearray((self.bits + 7) // 8)
+
+    def _positions(self, key: str) -> Iterator[int]:
+        """
+        :param key: hex digest of at least 32 digits
+        :return: bit positions for the key, by double hashing
+        """
+        h1 = int(key[:16], 16)
+        h2 = int(key[16:32], 16) | 1
+        return ((h1 + i * h2) % self.bits for i in range(self.hashes))
+
+    def add(self, key: str) -> None:
+        """
+        :param key: hex digest
+        :return: None
+        """
+        for pos in self._positions(key):
+            self.array[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, key: str) -> bool:
+        return all(
+            self.array[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key)
+        )
+
+
+class ErrorCache:
+    """
+    a store of inputs that failed with an anticipated error, keyed by
+    input and options, so that they can be rejected at once with the
+    original message when they come again.
+
+    The messages are kept in an sqlite database, which may be a file
+    shared between runs or ':memory:'. Most inputs are valid, so a
+    Bloom filter of the stored keys is consulted first; only inputs it
+    reports are looked up in the database. Evicted keys stay in the
+    filter, which is therefore rebuilt once it has taken twice as many
+    keys as the store holds.
+    """
+
+    def __init__(self, path: str = ":memory:", size: int = ERROR_CACHE_SIZE) -> None:
+        self.path = path
+        self.size = size
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS error "
+            "(key TEXT PRIMARY KEY, kind TEXT NOT NULL, "
+            "stage TEXT NOT NULL, message TEXT NOT NULL)"
+        )
+        self._db.commit()
+        self._rebuild()
+
+    def _rebuild(self) -> None:
+        """
+        fill a new Bloom filter with the stored keys; call with the lock held
+
+        :return: None
+        """
+        self._bloom = BloomFilter(self.size, BLOOM_FALSE_POSITIVES)
+        self._added = 0
+        for (key,) in self._db.execute("SELECT key FROM error"):
+            self._bloom.add(key)
+            self._added += 1
+
+    @staticmethod
+    def key(data: str, options: Dict[str, Any]) -> str:
+        """
+        key for an input. All options that influence the result are
+        part of it, and so is the Indigo version, which may accept
+        input that an earlier one rejected.
+
+        :param data: molecule data
+        :param options: option dict
+        :return: hex digest
+        """
+        parts = [common.indigo().version(), repr(common.options_key(options))]
+        parts.append(repr(options.get("reader")))
+        parts.append(data.strip())
+        return hashlib.sha256("\n".join(parts).encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[common.ErrorResult]:
+        """
+        :param key: key from ErrorCache.key
+        :return: the earlier failure, or None
+        """
+        if key not in self._bloom:
+            return None
+
+        with self._lock:
+            row = self._db.execute(
+                "SELECT kind, message, stage FROM error WHERE key = ?", (key,)
+            ).fetchone()
+
+        return None if row is None else common.ErrorResult(*row)
+
+    def put(self, key: str, result: common.ErrorResult) -> None:
+        """
+        remember a failed input, evicting the oldest entries if full
+
+        :param key: key from ErrorCache.key
+        :param result: the failure; only anticipated errors belong here
+        :return: None
+        """
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO error VALUES (?, ?, ?, ?)",
+                (key, result.kind, result.stage, result.message),
+            )
+            self._db.execute(
+                "DELETE FROM error WHERE rowid <= "
+                "(SELECT MAX(rowid) FROM error) - ?",
+                (self.size,),
+            )
+            self._db.commit()
+
+            self._bloom.add(key)
+            self._added += 1
+            if self._added > 2 * self.size:
+                self._rebuild()
+
+    def clear(self) -> None:
+        """
+        forget all failed inputs
+
+        :return: None
+        """
+        with self._lock:
+            self._db.execute("DELETE FROM error")
+            self._db.commit()
+            self._rebuild()
+
+    def close(self) -> None:
+        """
+        :return: None
+        """
+        with self._lock:
+            self._db.close()
+
+
+_layout_caches: Dict[str, LayoutCache] = {}
+_caches_lock = threading.Lock()
+
+
+def layout_cache(options: Dict[str, Any]) -> Optional[LayoutCache]:
+    """
+    the layout cache selected by the user, shared by all
+    conversions in this process
+
+    :param options: option dict
+    :return: LayoutCache, or None if caching is off
+    """
+    path = options.get("layout_cache")
+    if not path:
+        return None
+
+    with _caches_lock:
+        cache = _layout_caches.get(path)
+        if cache is None:
+            cache = _layout_caches[path] = LayoutCache(path)
+        return cache
+
+
+_error_caches: Dict[str, ErrorCache] = {}
+
+
+def error_cache(options: Dict[str, Any]) -> Optional[ErrorCache]:
+    """
+    the error cache selected by the user, shared by all
+    conversions in this process
+
+    :param options: option dict
+    :return: ErrorCache, or None if caching is off
+    """
+    path = options.get("error_cache")
+    if not path:
+        return None
+
+    with _caches_lock:
+        cache = _error_caches.get(path)
+        if cache is None:
+            cache = _error_caches[path] = ErrorCache(path)
+        return cache
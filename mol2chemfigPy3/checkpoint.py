@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+"""
+checkpoints of batch runs that write to a file, so that a run that
+was interrupted can be resumed, with no record missing or written
+twice.
+"""
+import bisect
+import json
+import os
+from typing import Optional, List, Dict, Any, BinaryIO
+from . import common
+
+CHECKPOINT_INTERVAL = 1000  # records written between checkpoints
+CHECKPOINT_VERSION = 1
+
+
+class Checkpoint:
+    """
+    progress of a batch run, kept in output + '.checkpoint': the ranges
+    of records written so far, the length of the output they take up,
+    and the counts of the summary. The output is synced before each
+    checkpoint, and the checkpoint is replaced in one step, so both
+    agree however the run ends. On resume, anything written to the
+    output after the last checkpoint is cut off again. A checkpoint
+    is saved every interval records; job, see batch.job_key, tells
+    whether a checkpoint belongs to the same input and options.
+
+    An output file name ending in .gz, .bz2 or .xz is written compressed.
+    Each checkpoint then ends a compressed stream and the next begins a
+    new one; the tools of all three formats read such files as one.
+    """
+
+    def __init__(
+        self, output: str, job: str, interval: int = CHECKPOINT_INTERVAL
+    ) -> None:
+        self.output = output
+        self.path = output + ".checkpoint"
+        self.job = job
+        self.interval = interval
+        self.done: List[List[int]] = []  # written records, as [first, last]
+        self.offset = 0  # bytes of output that belong to them
+        self.state: Dict[str, Any] = {}  # counts of the summary
+        self._compression = common.compression(output, detect=False)
+        self._raw: Optional[BinaryIO] = None  # the output file
+        self._fh: Optional[BinaryIO] = None  # the file, or a stream into it
+        self._unsaved = 0
+
+    def load(self) -> bool:
+        """
+        read the checkpoint of an earlier run of the same job, if any
+
+        :return: whether there was one
+        """
+        try:
+            with open(self.path, mode="r", encoding="utf-8") as fh:
+                saved = json.load(fh)
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError):
+            raise common.MCFError(f"Can't read checkpoint {self.path}")
+
+        if saved.get("version") != CHECKPOINT_VERSION or saved.get("job") != self.job:
+            raise common.MCFError(
+                f"Checkpoint {self.path} belongs to a run with other input "
+                "files or options"
+            )
+        try:
+            size = os.path.getsize(self.output)
+        except OSError:
+            size = -1
+        if size < saved["offset"]:
+            raise common.MCFError(
+                f"Output file {self.output} is shorter than its checkpoint says"
+            )
+
+        self.done = saved["done"]
+        self.offset = saved["offset"]
+        self.state = saved["state"]
+        return True
+
+    def open(self) -> None:
+        """
+        open the output, cut back to the last checkpoint. Without
+        one, an old checkpoint is removed with the old output.
+
+        :return: None
+        """
+        try:
+            if self.offset:
+                self._raw = open(self.output, mode="r+b")
+                self._raw.truncate(self.offset)
+                self._raw.seek(self.offset)
+            else:
+                self._raw = open(self.output, mode="wb")
+                if os.path.exists(self.path):
+                    os.remove(self.path)
+        except OSError:
+            raise common.MCFError(f"Can't write file {self.output}")
+
+        if self._compression is None:
+            self._fh = self._raw
+
+    def __contains__(self, index: int) -> bool:
+        """
+        :param index: record number
+        :return: whether the record was written before
+        """
+        i = bisect.bisect_right(self.done, [index, float("inf")]) - 1
+        return i >= 0 and self.done[i][1] >= index
+
+    def write(self, index: int, text: str) -> None:
+        """
+        write the result of a record
+
+        :param index: record number
+        :param text: formatted result
+        :return: None
+        """
+        if self._fh is None:  # start a compressed stream
+            self._fh = self._compression.open(self._raw, mode="wb")
+        self._fh.write(text.encode("utf-8"))
+        self._add(index)
+        self._unsaved += 1
+
+    def tick(self, state: Dict[str, Any]) -> None:
+        """
+        save a checkpoint if interval records were written since the last
+
+        :param state: counts of the summary so far, including these records
+        :return: None
+        """
+        if self._unsaved >= self.interval:
+            self.save(state)
+
+    def _add(self, index: int) -> None:
+        """
+        add a record to the ranges of those written
+
+        :param index: record number
+        :return: None
+        """
+        i = bisect.bisect_right(self.done, [index, float("inf")])
+        if i > 0 and self.done[i - 1][1] + 1 >= index:  # extend predecessor
+            self.done[i - 1][1] = max(self.done[i - 1][1], index)
+            i -= 1
+        else:
+            self.done.insert(i, [index, index])
+
+        if i + 1 < len(self.done) and self.done[i][1] + 1 >= self.done[i + 1][0]:
+            self.done[i][1] = self.done.pop(i + 1)[1]  # join successor
+
+    def _sync(self) -> None:
+        """
+        write everything out to disk and note the length of the output
+
+        :return: None
+        """
+        if self._fh is not self._raw:
+            if self._fh is not None:
+                self._fh.close()  # ends the compressed stream, not the file
+            self._fh = None
+        self._raw.flush()
+        os.fsync(self._raw.fileno())
+        self.offset = self._raw.tell()
+
+    def save(self, state: Dict[str, Any]) -> None:
+        """
+        sync the output and save a checkpoint
+
+        :param state: counts of the summary so far
+        :return: None
+        """
+        self._sync()
+
+        saved = dict(
+            version=CHECKPOINT_VERSION,
+            job=self.job,
+            done=self.done,
+            offset=self.offset,
+            state=state,
+        )
+        temp = self.path + ".tmp"
+        with open(temp, mode="w", encoding="utf-8") as fh:
+            json.dump(saved, fh, separators=(",", ":"))
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(temp, self.path)
+        self._unsaved = 0
+
+    def close(self, state: Dict[str, Any], finished: bool) -> None:
+        """
+        close the output. A finished run needs no checkpoint any more;
+        otherwise, one is saved for resuming.
+
+        :param state: counts of the summary
+        :param finished: whether all records were written
+        :return: None
+        """
+        if self._raw is None:
+            return
+        try:
+            if finished:
+                self._sync()
+                if os.path.exists(self.path):
+                    os.remove(self.path)
+            else:
+                self.save(state)
+        finally:
+            self._raw.close()
+            self._raw = self._fh = None
@@ -5,11 +5,14 @@ definitions and code to translate the molecule tree to chemfig
 this code will only make sense to you if you are familiar with
 the TeX syntax defined by the chemfig package.
 """
-import textwrap
-from typing import Union, Optional, List, Tuple, Dict, Any, Set
+import io
+from functools import lru_cache
+from typing import Union, Optional, List, Tuple, Dict, Any, Set, TextIO
 
-BOND_CODE_WIDTH = 50  # space for bonds - generous upfront, will be trimmed at the end
+BOND_CODE_WIDTH = 50  # space for bonds - generous upfront, excess is trimmed on output
 TERSE_LINE_WIDTH = 75  # in terse code format, force linebreaks
+ATOM_CACHE_SIZE = 4096  # number of distinct atom labels remembered
+BOND_CACHE_SIZE = 4096  # number of distinct bond codes and specifiers remembered
 
 
 def num_round(num: Union[int, float], sig: Union[int, float]) -> Union[int, float]:
@@ -144,6 +147,19 @@ atom_templates = dict(
 #  helpers for bond formatting
 
 
+@lru_cache(maxsize=BOND_CACHE_SIZE)
+def _format_angle(angle: Union[int, float], prefix: str, sig: int) -> str:
+    """
+    memoized backend for format_angle
+
+    :param angle: angle, relative or absolute
+    :param prefix: ':' for absolute or '::' for relative angles
+    :param sig: n-digits
+    :return: formatted angle
+    """
+    return prefix + str(num_round(angle, sig) % 360)
+
+
 def format_angle(
     options: Dict[str, Any],
     angle: Union[int, float],
@@ -158,14 +174,8 @@ def format_angle(
     :return: formatted angle
     """
     if options["relative_angles"] and parent_angle is not None:
-        angle -= parent_angle
-        prefix = "::"
-    else:
-        prefix = ":"
-
-    angle = num_round(angle, options["angle_round"])
-
-    return prefix + str(angle % 360)
+        return _format_angle(angle - parent_angle, "::", options["angle_round"])
+    return _format_angle(angle, ":", options["angle_round"])
 
 
 def specifier_default(val: Any, default: Any) -> str:
@@ -181,6 +191,92 @@ def specifier_default(val: Any, default: Any) -> str:
     return str(val)
 
 
+@lru_cache(maxsize=BOND_CACHE_SIZE)
+def _format_length(length: Union[int, float], sig: int) -> str:
+    """
+    memoized bond length specifier
+
+    :param length: length
+    :param sig: n-digits
+    :return: '' for the default length, else the rounded length
+    """
+    return specifier_default(num_round(length, sig), 1)
+
+
+@lru_cache(maxsize=BOND_CACHE_SIZE)
+def _format_bond(
+    angle: str,
+    length: str,
+    bond_type: str,
+    clockwise: int,
+    is_last: bool,
+    departure: Union[int, str, None],
+    arrival: Union[int, str, None],
+    tikz_key: Optional[str],
+    tikz_items: Tuple[Tuple[str, int], ...],
+) -> Tuple[str, str]:
+    """
+    memoized backend for format_bond. Only a few hundred distinct
+    bonds occur in real molecules, so this is mostly a lookup.
+
+    :param angle: formatted angle
+    :param length: formatted length
+    :param bond_type: bond type
+    :param clockwise: clockwise value
+    :param is_last: whether is the last one
+    :param departure: departure atom
+    :param arrival: arrival atom
+    :param tikz_key: sorted tikz styles joined by '_', or None
+    :param tikz_items: sorted tikz values
+    :return: (bond code with modifier, specifiers without brackets)
+    """
+    angle = specifier_default(angle, ":0")
+
+    departure = specifier_default(departure, 0)
+    arrival = specifier_default(arrival, 0)
+
+    bond_code = bond_codes.get(bond_type, "-")
+
+    # modify double bonds in non-aromatic rings
+    if bond_type == "double" and clockwise != 0:
+        if clockwise == 1:
+            modifier = "_"
+        else:
+            modifier = "^"
+    else:
+        modifier = ""
+
+    btt = bond_type_tikz.get(bond_type, None)
+
+    if tikz_key is None and btt is None:  # the common case: plain bonds
+        specifiers = ",".join((angle, length, departure, arrival)).rstrip(",")
+        return bond_code + modifier, specifiers
+
+    tikz_filled = []
+
+    if btt is not None:
+        tikz_filled.append(btt)
+
+    if tikz_key is not None:
+        tikz = bond_styles[tikz_key] % dict(tikz_items)
+        tikz_filled.append(tikz)
+
+        # departure atom is empty or a phantom, so at most 1 character.
+        # is_last guards against edge case.
+        if "cross" in tikz_key and not is_last:
+            departure = ""
+
+    tikz = ",".join(tikz_filled)
+    tikz = bond_style_shortcuts.get(
+        tikz, tikz
+    )  # replace tikz with shortcut if available
+
+    specifiers = [angle, length, departure, arrival, tikz]
+    specifiers = ",".join(specifiers).rstrip(",")
+
+    return bond_code + modifier, specifiers
+
+
 # the master bond formatter
 
 
@@ -219,57 +315,32 @@ def format_bond(
     if angle is None:  # angle is None -- first atom only. Is this ever used? Shouldn't
         return ""  # let's try to eliminate once the rest is working
 
-    angle = format_angle(options, angle, parent_angle)
-
-    angle = specifier_default(angle, ":0")
-
-    length = num_round(length, options["bond_round"])
-    length = specifier_default(length, 1)
-
-    departure = specifier_default(departure, 0)
-    arrival = specifier_default(arrival, 0)
-
-    bond_code = bond_codes.get(bond_type, "-")
-
-    tikz_filled = []
-
-    btt = bond_type_tikz.get(bond_type, None)
-    if btt is not None:
-        tikz_filled.append(btt)
-
     if tikz_styles:
-        key = "_".join(sorted(list(tikz_styles)))
-
-        tikz = bond_styles[key] % tikz_values
-        tikz_filled.append(tikz)
-
-        if "cross" in key and not is_last:  # departure atom is empty or a phantom, so
-            departure = ""  # at most 1 character. is_last guards against edge case.
-
-    tikz = ",".join(tikz_filled)
-    tikz = bond_style_shortcuts.get(
-        tikz, tikz
-    )  # replace tikz with shortcut if available
-
-    specifiers = [angle, length, departure, arrival, tikz]
-    specifiers = ",".join(specifiers).rstrip(",")
+        tikz_key = "_".join(sorted(tikz_styles))
+        tikz_items = tuple(sorted(tikz_values.items()))
+    else:
+        tikz_key, tikz_items = None, ()
+
+    code, specifiers = _format_bond(
+        format_angle(options, angle, parent_angle),
+        _format_length(length, options["bond_round"]),
+        bond_type,
+        clockwise,
+        is_last,
+        departure,
+        arrival,
+        tikz_key,
+        tikz_items,
+    )
 
+    # markers are unique to each bond, so they are added after the lookup
     if marker:
         specifiers = format_marker(marker) + specifiers
 
     if specifiers:
         specifiers = f"[{specifiers}]"
 
-    # modify double bonds in non-aromatic rings
-    if bond_type == "double" and clockwise != 0:
-        if clockwise == 1:
-            modifier = "_"
-        else:
-            modifier = "^"
-    else:
-        modifier = ""
-
-    return bond_code + modifier + specifiers
+    return code + specifiers
 
 
 def fill_atom(
@@ -312,28 +383,102 @@ def format_marker(marker: Optional[str]) -> Optional[str]:
     return marker
 
 
-def format_atom(
+def _radical_element(
+    element: str,
+    hydrogens: Optional[int],
+    radical: int,
+    first_quadrant: str,
+    second_quadrant: str,
+    legacy_lewis: bool,
+) -> str:
+    """
+    decorate the element symbol with radical electrons, if any
+
+    :param element: element symbol
+    :param hydrogens: number of hydrogen(s)
+    :param radical: number of radical
+    :param first_quadrant: first quadrant
+    :param second_quadrant: second quadrant
+    :param legacy_lewis: whether to use the legacy \\lewis macro
+    :return: element symbol, possibly decorated
+    """
+    if radical == 0:
+        return element
+
+    if radical == 1:
+        radical_symbol = "."
+    else:
+        radical_symbol = ":"
+    if hydrogens:
+        radical_quadrant = second_quadrant
+    else:
+        radical_quadrant = first_quadrant
+
+    _radical_templates = radical_templates if legacy_lewis else radical_templates2
+    return _radical_templates[radical_quadrant] % (radical_symbol, element)
+
+
+def _format_numbered_atom(
     options: Dict[str, Any],
     idx: int,
     element: str,
     hydrogens: Optional[int],
-    charge: int,
     radical: int,
     first_quadrant: str,
     second_quadrant: str,
-    charge_angle: Optional[str],
 ) -> Tuple[str, int, str, int]:
     """
-    render an atom with hydrogens and charges. Return
-    - the chemfig code of the rendered atom
-    - the string position for incoming bonds to attach to
-    - a phantom string to be used for closing rings. We do this
-      here because we don't want to duplicate all those case
-      distinctions somewhere else. In most cases, the phantom
-      string is never used though.
+    render an atom together with its molfile number. Charges
+    and hydrogens are not shown.
 
     :param options: option dict
     :param idx: index
+    :param element: element symbol
+    :param hydrogens: number of hydrogen(s)
+    :param radical: number of radical
+    :param first_quadrant: first quadrant
+    :param second_quadrant: second quadrant
+    :return: output from fill_atom() function
+    """
+    data = dict(
+        number=idx,
+        hydrogens=hydrogens,
+        element=_radical_element(
+            element,
+            hydrogens,
+            radical,
+            first_quadrant,
+            second_quadrant,
+            options["legacy_lewis"],
+        ),
+    )
+
+    if element == "C" and not options["show_carbons"]:
+        keys = ("atom_no", "empty")
+        return fill_atom(keys, data, macro_templates["phantom"] % idx)
+
+    # not an empty carbon
+    keys = ("atom_no", first_quadrant)
+    return fill_atom(keys, data, macro_templates["phantom"] % data["element"])
+
+
+@lru_cache(maxsize=ATOM_CACHE_SIZE)
+def _format_atom(
+    element: str,
+    hydrogens: Optional[int],
+    charge: int,
+    radical: int,
+    first_quadrant: str,
+    second_quadrant: str,
+    charge_angle: Optional[str],
+    legacy_lewis: bool,
+    show_carbons: bool,
+    show_methyls: bool,
+) -> Tuple[str, int, str, int]:
+    """
+    render an atom without number. The result depends only on
+    the arguments, so it is memoized.
+
     :param element: element symbol
     :param hydrogens: number of hydrogen(s)
     :param charge: charge value
@@ -341,64 +486,33 @@ def format_atom(
     :param first_quadrant: first quadrant
     :param second_quadrant: second quadrant
     :param charge_angle: the position where to label the charge
+    :param legacy_lewis: whether to use the legacy \\lewis macro
+    :param show_carbons: whether to show carbon symbols
+    :param show_methyls: whether to show methyl symbols
     :return: output from fill_atom() function
     """
-
     _mt = macro_templates  # shortcuts
-    _radical_templates = (
-        radical_templates if options["legacy_lewis"] else radical_templates2
-    )
 
     # collect elements in a dict that then is used to fill
     # the configured string templates.
-
-    # first, check whether we have a radical
-    if radical == 0:
-        radical_element = element
-    else:
-        if radical == 1:
-            radical_symbol = "."
-        else:
-            radical_symbol = ":"
-        if hydrogens:
-            radical_quadrant = second_quadrant
-        else:
-            radical_quadrant = first_quadrant
-        radical_element = _radical_templates[radical_quadrant] % (
-            radical_symbol,
-            element,
-        )
-
     data = dict(
-        number=idx,
         hydrogens=hydrogens,
-        element=radical_element,
+        element=_radical_element(
+            element, hydrogens, radical, first_quadrant, second_quadrant, legacy_lewis
+        ),
     )
 
     # we almost always need the same phantom string, so we prepare it once
     element_phantom = _mt["phantom"] % data["element"]
 
-    # deal with atom numbers first
-    if options["atom_numbers"]:
-        if element == "C" and not options["show_carbons"]:
-            phantom = _mt["phantom"] % idx
-            keys = ("atom_no", "empty")
-            return fill_atom(keys, data, phantom)
-
-        # not an empty carbon
-        keys = ("atom_no", first_quadrant)
-        return fill_atom(keys, data, element_phantom)
-
-    # full atoms, no numbers
-
     # neutrals
     if charge == 0:
 
         # empty carbons. This case is so simple we don't use a template.
         if (
             data["element"] == "C"
-            and not options["show_carbons"]
-            and (not options["show_methyls"] or hydrogens < 3)
+            and not show_carbons
+            and (not show_methyls or hydrogens < 3)
         ):
             return "", 0, "", 0
 
@@ -434,6 +548,65 @@ def format_atom(
     return fill_atom(keys, data, element_phantom)
 
 
+def format_atom(
+    options: Dict[str, Any],
+    idx: int,
+    element: str,
+    hydrogens: Optional[int],
+    charge: int,
+    radical: int,
+    first_quadrant: str,
+    second_quadrant: str,
+    charge_angle: Optional[str],
+) -> Tuple[str, int, str, int]:
+    """
+    render an atom with hydrogens and charges. Return
+    - the chemfig code of the rendered atom
+    - the string position for incoming bonds to attach to
+    - a phantom string to be used for closing rings. We do this
+      here because we don't want to duplicate all those case
+      distinctions somewhere else. In most cases, the phantom
+      string is never used though.
+
+    :param options: option dict
+    :param idx: index
+    :param element: element symbol
+    :param hydrogens: number of hydrogen(s)
+    :param charge: charge value
+    :param radical: number of radical
+    :param first_quadrant: first quadrant
+    :param second_quadrant: second quadrant
+    :param charge_angle: the position where to label the charge
+    :return: output from fill_atom() function
+    """
+    # deal with atom numbers first; these make every atom unique
+    if options["atom_numbers"]:
+        return _format_numbered_atom(
+            options,
+            idx,
+            element,
+            hydrogens,
+            radical,
+            first_quadrant,
+            second_quadrant,
+        )
+
+    # full atoms, no numbers. Only a few hundred different
+    # labels occur in practice, so they are looked up
+    return _format_atom(
+        element,
+        hydrogens,
+        charge,
+        radical,
+        first_quadrant,
+        second_quadrant,
+        charge_angle,
+        options["legacy_lewis"],
+        options["show_carbons"],
+        options["show_methyls"],
+    )
+
+
 def format_atom_comment(options: Dict[str, Any], idx: int) -> str:
     """
     render an optional end-of-line comment after a regular atom
@@ -491,70 +664,120 @@ def format_aromatic_ring(
     return ring_bond_code, ring_code, comment
 
 
-def strip_output(output_list: List[str]) -> List[str]:
+class TerseWriter:
+    """
+    write terse code, i.e., without white space and comments,
+    to a text sink. Code fragments are packed onto lines of at
+    most TERSE_LINE_WIDTH characters; a fragment is never split,
+    so single fragments may exceed the line width.
     """
-    remove white space and comments
 
-    :param output_list: [...]
-    :return: modified output_list
+    joiner = "%\n"
+
+    def __init__(self, out: TextIO, width: int = TERSE_LINE_WIDTH) -> None:
+        self.out = out
+        self.width = width
+        self._length = 0  # length of the current line
+        self._pending = False  # a finished line still awaits its line break
+
+    def _break(self) -> None:
+        """
+        write the line break owed to the previous line, if any
+
+        :return: None
+        """
+        if self._pending:
+            self.out.write(self.joiner)
+            self._pending = False
+
+    def write(self, code: str) -> None:
+        """
+        append one code fragment, starting a new line if it doesn't fit
+
+        :param code: code fragment
+        :return: None
+        """
+        if self._length + len(code) > self.width:
+            self._break()  # the finished line is part of the output
+            self._pending = True
+            self._length = 0
+
+        if code:
+            self._break()
+            self.out.write(code)
+            self._length += len(code)
+
+
+def write_output(
+    options: Dict[str, Any], output_list: List[Tuple[int, str]], out: TextIO
+) -> None:
     """
-    stripped = []
+    optionally wrap the translated output into a command,
+    to ease inclusion in LaTeX documents with \\input,
+    and write it to a text sink.
 
-    for line in output_list:
-        stripped.append(line.split("%")[0].strip())
+    Each rendered line carries the width of its leading
+    white space separately, so excessive indentation can be
+    removed here without ever building the padded lines.
 
-    stripped.reverse()
+    :param options: option dict
+    :param output_list: [(leading white space, code), ...]
+    :param out: text sink, e.g., io.StringIO or sys.stdout
+    :return: None
+    """
+    # a trailing empty line is not part of the output
+    if output_list and not output_list[-1][1]:
+        output_list = output_list[:-1]
 
-    chunked = []
+    if options["submol_name"] is not None:
+        head, tail = f'\\definesubmol{{{options["submol_name"]}}}{{', r"}"
+    elif options["chemfig_command"]:
+        head, tail = r"\chemfig{", r"}"
+    else:
+        head = tail = None
+
+    if options["terse"]:  # rendered without white space and comments
+        writer = TerseWriter(out)
+        if head is not None:
+            writer.write(head)
+        for _, code in output_list:
+            writer.write(code)
+        if tail is not None:
+            writer.write(tail)
+        return
 
-    acc = ""
+    # first, do a bit of prettification by removing excessive
+    # indentation; empty lines don't count
+    margin = min((lead for lead, code in output_list if code), default=0)
+    _indent = " " * options["indent"]
 
-    while stripped:
-        popped = stripped.pop()
-        if len(acc) + len(popped) > TERSE_LINE_WIDTH:
-            chunked.append(acc)
-            acc = popped
-        else:
-            acc += popped
-    if acc:
-        chunked.append(acc)
+    if head is not None:
+        out.write(head)
+        out.write("\n")
+
+    for i, (lead, code) in enumerate(output_list):
+        if i:
+            out.write("\n")
+        out.write(_indent + " " * (lead - margin) + code if code else _indent)
 
-    return chunked
+    if tail is not None:
+        if output_list:
+            out.write("\n")
+        out.write(tail)
 
 
-def format_output(options: Dict[str, Any], output_list: List[str]) -> str:
+def format_output(options: Dict[str, Any], output_list: List[Tuple[int, str]]) -> str:
     """
     optionally wrap the translated output into a command,
     to ease inclusion in LaTeX documents with \\input
 
     :param options: option dict
-    :param output_list: [...]
+    :param output_list: [(leading white space, code), ...]
     :return: command output
     """
-    # first, do a bit of prettification by removing excessive
-    # indentation
-    _indent = " " * options["indent"]
-
-    _out = "\n".join(output_list)
-    _out = textwrap.dedent(_out).splitlines()
-
-    output_list = [_indent + i for i in _out]
-
-    if options["submol_name"] is not None:
-        output_list.insert(0, f'\\definesubmol{{{options["submol_name"]}}}{{')
-        output_list.append(r"}")
-
-    elif options["chemfig_command"]:
-        output_list.insert(0, r"\chemfig{")
-        output_list.append(r"}")
-
-    if options["terse"]:
-        output_list = strip_output(output_list)
-        joiner = "%\n"
-    else:
-        joiner = "\n"
-
-    return joiner.join(output_list)
+    buffer = io.StringIO()
+    write_output(options, output_list, buffer)
+    return buffer.getvalue()
 
 
 if __name__ == "__main__":
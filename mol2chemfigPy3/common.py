@@ -2,11 +2,23 @@
 """
 common settings and a bit of infrastructure
 """
-from typing import Any
-from .options import getParser
+
+import bz2
+import gzip
+import lzma
+import os.path
+import threading
+import traceback
+from types import ModuleType
+from typing import Any, Optional, Dict, Tuple, TextIO
+from indigo import Indigo
+from .options import getParser, getBatchParser, getTreeParser
 
 program_version = "1.6.0"
 
+# extensions of the files that can be converted
+supported_files = ".gz .bz2 .xz .sdf .rdf .mol .rxn .txt .cml .mrv .xml .smi"
+
 # pubchem url for retrieving sdf for numerical IDs
 pubchem_url = (
     r"http://pubchem.ncbi.nlm.nih.gov/summary/summary.cgi?cid=%s&disopt=DisplaySDF"
@@ -41,6 +53,46 @@ Options:
 """
 
 
+_batch_help_blurb = """
+%(program_name)s batch converts all molecules in one or more files in one run.
+Input files may contain one SMILES (optionally followed by a name) or PubChem index
+per line, many molfiles (.sdf), or a single molecule. Usage example:
+
+%(program_name)s batch --aromatic-circles library.sdf > library.tex
+
+Options:
+"""
+
+_merge_help_blurb = """
+%(program_name)s merge combines the outputs of a batch run split with --shard
+back into one, in record order. Usage example:
+
+%(program_name)s merge shard-1.tex shard-2.tex shard-3.tex > library.tex
+"""
+
+_tree_help_blurb = """
+%(program_name)s convert-tree converts every molecule file below a directory, or
+matching a pattern, into a .tex file of the same name in a mirrored tree. Files
+that haven't changed since the last run, with the same options, are skipped.
+Usage example:
+
+%(program_name)s convert-tree -zw molecules/ tex/
+%(program_name)s convert-tree -zw 'molecules/**/*.mol' tex/
+
+Options:
+"""
+
+_index_help_blurb = """
+%(program_name)s index writes an index of the records in SDF or SMILES files next
+to each, e.g., library.sdf.idx, with where each record starts and its title.
+Batch runs with --records or --id then read the records they need straight
+from the file. Usage example:
+
+%(program_name)s index library.sdf
+%(program_name)s batch --id CHEMBL25 library.sdf
+"""
+
+
 def version_text(
     program_name: str = "mol2chemfigPy3", version: str = program_version
 ) -> str:
@@ -55,6 +107,30 @@ def help_text(
     return msg
 
 
+def batch_help_text(
+    program_name: str = "mol2chemfigPy3", version: str = program_version
+) -> str:
+    msg = _batch_help_blurb % locals()
+    msg += getBatchParser().format_help(indent=32, linewidth=75, separator="")
+    return msg
+
+
+def merge_help_text(program_name: str = "mol2chemfigPy3") -> str:
+    return _merge_help_blurb % locals()
+
+
+def index_help_text(program_name: str = "mol2chemfigPy3") -> str:
+    return _index_help_blurb % locals()
+
+
+def tree_help_text(
+    program_name: str = "mol2chemfigPy3", version: str = program_version
+) -> str:
+    msg = _tree_help_blurb % locals()
+    msg += getTreeParser().format_help(indent=32, linewidth=75, separator="")
+    return msg
+
+
 def lua_version_text(program_name: str, client_version: str) -> str:
     server_version = program_version
     return _lua_version_blurb % locals()
@@ -78,6 +154,97 @@ settings = dict(
 )
 
 
+# options that don't influence the rendered code
+_non_rendering_keys = {
+    "help",
+    "version",
+    "input",
+    "layout_cache",
+    "reader",
+    "count_calls",
+    "error_cache",
+}
+_rendering_keys = None
+
+
+def options_key(options: Dict[str, Any]) -> Tuple[Tuple[str, str], ...]:
+    """
+    a hashable summary of the options that influence the rendered code,
+    used to tell whether two conversions can share their result.
+    Batch-mode options are ignored.
+
+    :param options: option dict
+    :return: ((key, value), ...)
+    """
+    global _rendering_keys
+
+    if _rendering_keys is None:
+        keys = set(settings) | set(getParser().validKeys())
+        _rendering_keys = sorted(keys - _non_rendering_keys)
+
+    return tuple((key, repr(options.get(key))) for key in _rendering_keys)
+
+
+# compression formats, by the first bytes of a file and by file extension
+_compression_magic = ((b"\x1f\x8b", gzip), (b"BZh", bz2), (b"\xfd7zXZ\x00", lzma))
+_compression_ext = {".gz": gzip, ".bz2": bz2, ".xz": lzma}
+
+# raised while reading a file, including broken compressed data and text
+# that isn't UTF-8
+read_errors = (IOError, EOFError, lzma.LZMAError, UnicodeDecodeError)
+
+
+def compression(file_name: str, detect: bool = True) -> Optional[ModuleType]:
+    """
+    how a file is compressed, from its first bytes or, for files yet to
+    be written, its extension
+
+    :param file_name: file name
+    :param detect: whether to read the first bytes of the file
+    :return: gzip, bz2 or lzma module, or None for no compression
+    """
+    if not detect:
+        return _compression_ext.get(os.path.splitext(file_name)[1].lower())
+
+    with open(file_name, mode="rb") as fh:
+        magic = fh.read(6)
+    for signature, module in _compression_magic:
+        if magic.startswith(signature):
+            return module
+    return None
+
+
+def open_text(file_name: str) -> TextIO:
+    """
+    open a UTF-8 text file for reading. Files compressed with gzip, bz2
+    or xz are decompressed as they are read.
+
+    :param file_name: file name
+    :return: text stream
+    """
+    module = compression(file_name)
+    if module is None:
+        return open(file_name, mode="r", encoding="utf-8")
+    return module.open(file_name, mode="rt", encoding="utf-8")
+
+
+_local = threading.local()
+
+
+def indigo() -> Indigo:
+    """
+    the Indigo session of the calling thread. Starting a session takes
+    longer than reading a small molecule, and Indigo objects must stay
+    with the session, and thus the thread, that made them.
+
+    :return: Indigo
+    """
+    session = getattr(_local, "indigo", None)
+    if session is None:
+        session = _local.indigo = Indigo()
+    return session
+
+
 class MCFError(Exception):
     """
     this flags an anticipated error due to faulty user input.
@@ -90,6 +257,77 @@ class MCFError(Exception):
         return self.text
 
 
+class TransientError(MCFError):
+    """
+    an anticipated error that may not recur if tried again, such
+    as a failed download. Inputs failing with it are not cached.
+    """
+
+
+class ErrorResult:
+    """
+    a failed conversion: the class of the error, its message and the
+    stage it happened in ('options', 'input', 'load' or 'render',
+    'convert' if a worker process timed out or died, or 'output' if the
+    result couldn't be written).
+    Building a traceback is comparatively slow, so it is only kept
+    if asked for.
+    """
+
+    def __init__(
+        self,
+        kind: str,
+        message: str,
+        stage: str,
+        anticipated: bool = True,
+        trace: Optional[str] = None,
+    ) -> None:
+        self.kind = kind
+        self.message = message
+        self.stage = stage
+        self.anticipated = anticipated  # MCFError, due to faulty user input
+        self.trace = trace
+
+    @classmethod
+    def from_exception(
+        cls, error: Exception, stage: str, with_trace: bool = False
+    ) -> "ErrorResult":
+        """
+        :param error: the exception
+        :param stage: stage of the conversion
+        :param with_trace: whether to keep the traceback
+        :return: ErrorResult
+        """
+        trace = None
+        if with_trace:
+            trace = "".join(
+                traceback.format_exception(type(error), error, error.__traceback__)
+            )
+
+        return cls(
+            type(error).__name__,
+            str(error),
+            stage,
+            isinstance(error, MCFError),
+            trace,
+        )
+
+    def as_dict(self) -> Dict[str, Any]:
+        """
+        :return: the fields as a dict, e.g., for JSON output
+        """
+        return dict(
+            kind=self.kind,
+            message=self.message,
+            stage=self.stage,
+            anticipated=self.anticipated,
+            trace=self.trace,
+        )
+
+    def __str__(self) -> str:
+        return self.trace or self.message
+
+
 class Counter:
     """
     a simple Counter class, just to remove the dependency on version 2.7
@@ -115,3 +353,44 @@ class Counter:
         lst.sort(key=lambda pair: pair[1])
 
         return lst[-1][0]
+
+
+class CallCounter:
+    """
+    wraps a toolkit object and counts the calls made on it, and on
+    the objects it returns, by method name. Used to measure how much
+    traffic a conversion causes across the toolkit boundary.
+    """
+
+    _plain = (int, float, str, bool, list, tuple, type(None))
+
+    def __init__(self, obj: Any, calls: Dict[str, int]) -> None:
+        self._obj = obj
+        self._calls = calls
+
+    def _wrap(self, value: Any) -> Any:
+        """
+        :param value: value returned by the toolkit
+        :return: value, wrapped if it is a toolkit object
+        """
+        if isinstance(value, self._plain):
+            return value
+        return CallCounter(value, self._calls)
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._obj, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            self._calls[name] = self._calls.get(name, 0) + 1
+            return self._wrap(attr(*args, **kwargs))
+
+        return call
+
+    def __iter__(self) -> "CallCounter":
+        return self
+
+    def __next__(self) -> Any:
+        self._calls["next"] = self._calls.get("next", 0) + 1
+        return self._wrap(next(self._obj))
@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+"""
+side-car indices of the records in large input files: where each
+record starts and what its title is, so that single records or ranges
+of them can be read without scanning the file, and the file can be
+split among workers that read their part by themselves.
+"""
+
+import bisect
+import mmap
+import os
+from array import array
+from typing import Union, Optional, Tuple, List, Dict, Iterable
+from . import common
+
+INDEX_SUFFIX = ".idx"
+INDEX_VERSION = 1
+
+
+def _scan_sdf(mm: Union[mmap.mmap, bytes]) -> array:
+    """
+    :param mm: file contents
+    :return: offsets of the records
+    """
+    starts = array("q")
+    start = 0
+    while start < len(mm):
+        starts.append(start)
+        end = mm.find(b"$$$$", start)
+        while end > 0 and mm[end - 1] != 10:  # only at the start of a line
+            end = mm.find(b"$$$$", end + 4)
+        if end < 0:
+            break
+        start = mm.find(b"\n", end)
+        start = len(mm) if start < 0 else start + 1
+
+    if starts and not mm[starts[-1] :].strip():  # trailing blank lines
+        starts.pop()
+    return starts
+
+
+def _scan_smi(mm: Union[mmap.mmap, bytes]) -> array:
+    """
+    :param mm: file contents
+    :return: offsets of the records
+    """
+    starts = array("q")
+    start = 0
+    while start < len(mm):
+        end = mm.find(b"\n", start)
+        end = len(mm) if end < 0 else end + 1
+        line = mm[start:end].strip()
+        if line and not line.startswith(b"#"):
+            starts.append(start)
+        start = end
+    return starts
+
+
+def _title(line: bytes, fmt: str) -> str:
+    """
+    title of a record as in batch.read_records
+
+    :param line: first line of the record
+    :param fmt: 'sdf' or 'smi'
+    :return: title
+    """
+    line = line.decode("utf-8", errors="replace").strip()
+    if fmt == "smi":
+        fields = line.split(None, 1)
+        return fields[1] if len(fields) > 1 else ""
+    return line
+
+
+class RecordIndex:
+    """
+    offsets and titles of the records of an SDF or SMILES file, kept in
+    file_name + '.idx'. The index stores the size and modification time
+    of the file, and is not used once these change.
+    """
+
+    def __init__(self, file_name: str, fmt: str) -> None:
+        self.file_name = file_name
+        self.path = file_name + INDEX_SUFFIX
+        self.fmt = fmt
+        self.size = 0
+        self.mtime = 0
+        self.starts = array("q")  # offset of each record
+        self.titles: List[str] = []
+        self._ids: Optional[Dict[str, List[int]]] = None
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    @classmethod
+    def build(cls, file_name: str, fmt: str) -> "RecordIndex":
+        """
+        scan a file for its records, with the file mapped to memory
+
+        :param file_name: file name
+        :param fmt: 'sdf' or 'smi', see batch.record_format
+        :return: RecordIndex
+        """
+        if fmt not in ("sdf", "smi"):
+            raise common.MCFError("Only SDF and SMILES files can be indexed")
+        try:
+            compressed = common.compression(file_name) is not None
+        except IOError:
+            raise common.MCFError(f"Can't read file {file_name}")
+        if compressed:
+            raise common.MCFError(f"Compressed files can't be indexed: {file_name}")
+
+        index = cls(file_name, fmt)
+        try:
+            with open(file_name, mode="rb") as fh:
+                stat = os.fstat(fh.fileno())
+                index.size, index.mtime = stat.st_size, stat.st_mtime_ns
+                if stat.st_size:
+                    with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                        index._scan(mm)
+        except IOError:
+            raise common.MCFError(f"Can't read file {file_name}")
+        return index
+
+    def _scan(self, mm: mmap.mmap) -> None:
+        """
+        :param mm: file contents
+        :return: None
+        """
+        self.starts = _scan_sdf(mm) if self.fmt == "sdf" else _scan_smi(mm)
+        for start in self.starts:
+            end = mm.find(b"\n", start)
+            self.titles.append(
+                _title(mm[start : len(mm) if end < 0 else end], self.fmt)
+            )
+
+    def save(self) -> None:
+        """
+        write the index next to its file
+
+        :return: None
+        """
+        try:
+            with open(self.path, mode="w", encoding="utf-8") as fh:
+                fh.write(
+                    f"# mol2chemfig index {INDEX_VERSION} {self.fmt} "
+                    f"{self.size} {self.mtime}\n"
+                )
+                for start, title in zip(self.starts, self.titles):
+                    fh.write(f"{start}\t{title}\n")
+        except IOError:
+            raise common.MCFError(f"Can't write file {self.path}")
+
+    @classmethod
+    def load(cls, file_name: str) -> Optional["RecordIndex"]:
+        """
+        read the index of a file, if there is one and it is up to date
+
+        :param file_name: file name
+        :return: RecordIndex or None
+        """
+        try:
+            stat = os.stat(file_name)
+            fh = open(file_name + INDEX_SUFFIX, mode="r", encoding="utf-8")
+        except OSError:
+            return None
+
+        with fh:
+            header = fh.readline().split()
+            if header[:4] != ["#", "mol2chemfig", "index", str(INDEX_VERSION)]:
+                return None
+            if header[5:] != [str(stat.st_size), str(stat.st_mtime_ns)]:
+                return None  # the file has changed
+
+            index = cls(file_name, header[4])
+            index.size, index.mtime = stat.st_size, stat.st_mtime_ns
+            for line in fh:
+                start, title = line.rstrip("\n").split("\t", 1)
+                index.starts.append(int(start))
+                index.titles.append(title)
+        return index
+
+    def find(self, record_id: str) -> List[int]:
+        """
+        :param record_id: title of a record, e.g., a ChEMBL ID
+        :return: positions of the records with this title, from 0
+        """
+        if self._ids is None:
+            self._ids = {}
+            for position, title in enumerate(self.titles):
+                self._ids.setdefault(title, []).append(position)
+        return self._ids.get(record_id, [])
+
+    def end(self, position: int) -> int:
+        """
+        :param position: position of a record, from 0
+        :return: offset just after it
+        """
+        return self.starts[position + 1] if position + 1 < len(self) else self.size
+
+    def split(self, parts: int) -> List[Tuple[int, int, int]]:
+        """
+        divide the file into byte ranges of about equal size, each made
+        of whole records, so that workers can read their own part
+
+        :param parts: number of ranges
+        :return: [(start offset, end offset, position of first record),...]
+        """
+        ranges = []
+        first = 0
+        for part in range(1, parts + 1):
+            if first >= len(self):
+                break
+            limit = self.size * part // parts
+            last = max(first + 1, bisect.bisect_left(self.starts, limit))
+            if part == parts:
+                last = len(self)
+            ranges.append((self.starts[first], self.end(last - 1), first))
+            first = last
+        return ranges
+
+
+def runs(positions: Iterable[int]) -> List[Tuple[int, int]]:
+    """
+    :param positions: record positions, in ascending order
+    :return: [(first, last),...] of consecutive positions
+    """
+    result = []
+    for position in positions:
+        if result and result[-1][1] + 1 == position:
+            result[-1] = result[-1][0], position
+        else:
+            result.append((position, position))
+    return result
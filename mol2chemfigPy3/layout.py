@@ -0,0 +1,301 @@
+# -*- coding: utf-8 -*-
+"""
+a lightweight 2D layout for simple molecules: chains, branched
+chains and molecules with a single ring per fragment. Anything more
+complex is left to Indigo.
+"""
+import math
+from collections import deque
+from typing import Optional, List, Dict, Tuple
+from indigo import IndigoObject
+
+SIMPLE_LAYOUT_MAX_ATOMS = 60  # larger molecules are left to Indigo
+SIMPLE_LAYOUT_MAX_RING = 8  # so are larger rings
+FRAGMENT_SPACING = 1.5  # horizontal gap between fragments, in bond lengths
+MIN_ATOM_DISTANCE = 0.6  # closer atoms count as a clash
+
+
+class Graph:
+    """
+    connectivity of a molecule, read from the toolkit molecule in one pass
+    """
+
+    def __init__(self, tkmol: IndigoObject) -> None:
+        self.atoms = [atom.index() for atom in tkmol.iterateAtoms()]
+        self.neighbors: Dict[int, List[int]] = {idx: [] for idx in self.atoms}
+        self.orders: Dict[Tuple[int, int], int] = {}
+        self.stereo = False
+
+        for bond in tkmol.iterateBonds():
+            start = bond.source().index()
+            end = bond.destination().index()
+            self.neighbors[start].append(end)
+            self.neighbors[end].append(start)
+            self.orders[(start, end)] = self.orders[(end, start)] = bond.bondOrder()
+            self.stereo = self.stereo or bond.bondStereo() != 0
+
+    def fragments(self) -> List[List[int]]:
+        """
+        connected fragments, each with its atoms in breadth-first order
+
+        :return: [[atom index, ...], ...]
+        """
+        seen = set()
+        fragments = []
+
+        for idx in self.atoms:
+            if idx in seen:
+                continue
+            seen.add(idx)
+            fragment = [idx]
+            queue = deque(fragment)
+
+            while queue:
+                for neighbor in self.neighbors[queue.popleft()]:
+                    if neighbor not in seen:
+                        seen.add(neighbor)
+                        fragment.append(neighbor)
+                        queue.append(neighbor)
+
+            fragments.append(fragment)
+
+        return fragments
+
+    def ring(self, fragment: List[int]) -> Optional[List[int]]:
+        """
+        the atoms of the only ring in a fragment, in ring order. Trees
+        are stripped leaf by leaf until only the ring remains.
+
+        :param fragment: atoms of a fragment with exactly one ring
+        :return: ring atoms, or None for an acyclic fragment
+        """
+        degree = {idx: len(self.neighbors[idx]) for idx in fragment}
+        leaves = deque(idx for idx in fragment if degree[idx] <= 1)
+        removed = set()
+
+        while leaves:
+            idx = leaves.popleft()
+            removed.add(idx)
+            for neighbor in self.neighbors[idx]:
+                if neighbor not in removed:
+                    degree[neighbor] -= 1
+                    if degree[neighbor] == 1:
+                        leaves.append(neighbor)
+
+        members = [idx for idx in fragment if idx not in removed]
+        if not members:
+            return None
+
+        ring = [members[0]]
+        remaining = set(members[1:])
+        while remaining:
+            idx = next(n for n in self.neighbors[ring[-1]] if n in remaining)
+            remaining.discard(idx)
+            ring.append(idx)
+
+        return ring
+
+    def subtree_sizes(self, root: int, parent: Optional[int]) -> Dict[int, int]:
+        """
+        number of atoms in each branch hanging off root, away from parent
+
+        :param root: root atom
+        :param parent: atom that root is reached from, if any
+        :return: {atom index: branch size}
+        """
+        sizes = {}
+        order = []
+        stack = [(root, parent)]
+
+        while stack:
+            idx, came_from = stack.pop()
+            order.append((idx, came_from))
+            stack.extend((n, idx) for n in self.neighbors[idx] if n != came_from)
+
+        for idx, came_from in reversed(order):
+            sizes[idx] = 1 + sum(
+                sizes[n] for n in self.neighbors[idx] if n != came_from
+            )
+
+        return sizes
+
+
+def _direction(angle: float) -> Tuple[float, float]:
+    """
+    :param angle: angle in degrees
+    :return: unit vector
+    """
+    angle = math.radians(angle)
+    return math.cos(angle), math.sin(angle)
+
+
+def _is_linear(graph: Graph, idx: int, parent: int, child: int) -> bool:
+    """
+    whether the bonds parent-idx and idx-child should line up,
+    as for triple bonds and cumulated double bonds
+
+    :return: bool
+    """
+    before = graph.orders[(parent, idx)]
+    after = graph.orders[(idx, child)]
+    return before == 3 or after == 3 or before == after == 2
+
+
+def _place_branches(
+    graph: Graph,
+    xyz: Dict[int, Tuple[float, float]],
+    root: int,
+    angles: Dict[int, float],
+    blocked: set,
+) -> None:
+    """
+    lay out the tree hanging off root, zig-zagging along chains.
+
+    :param graph: molecule graph
+    :param xyz: coordinates, updated in place
+    :param root: placed atom the tree grows from
+    :param angles: {child of root: direction of the bond to it}
+    :param blocked: atoms not to walk into, e.g., the ring
+    :return: None
+    """
+    stack = [(child, root, angle, 1) for child, angle in angles.items()]
+
+    while stack:
+        idx, parent, angle, turn = stack.pop()
+        dx, dy = _direction(angle)
+        x, y = xyz[parent]
+        xyz[idx] = (x + dx, y + dy)
+
+        children = [n for n in graph.neighbors[idx] if n != parent and n not in blocked]
+        if not children:
+            continue
+
+        sizes = graph.subtree_sizes(idx, parent)
+        children.sort(key=lambda n: -sizes[n])
+
+        if len(children) == 1:
+            child = children[0]
+            if _is_linear(graph, idx, parent, child):
+                stack.append((child, idx, angle, turn))
+            else:
+                stack.append((child, idx, angle + 60 * turn, -turn))
+            continue
+
+        # spread children evenly, leaving the biggest branch where the
+        # zig-zag would have continued
+        step = 360 / (len(children) + 1)
+        spread = [angle + 180 + step * (i + 1) for i in range(len(children))]
+        spread.sort(key=lambda a: abs(((a - angle - 60 * turn) + 180) % 360 - 180))
+        for child, child_angle in zip(children, spread):
+            stack.append((child, idx, child_angle, -turn))
+
+
+def _layout_fragment(
+    graph: Graph, fragment: List[int]
+) -> Optional[Dict[int, Tuple[float, float]]]:
+    """
+    lay out one fragment, or give up if it is not simple enough
+
+    :param graph: molecule graph
+    :param fragment: atoms of the fragment
+    :return: {atom index: (x, y)}, or None
+    """
+    bonds = sum(len(graph.neighbors[idx]) for idx in fragment) // 2
+    rings = bonds - len(fragment) + 1
+
+    if rings > 1:  # fused, bridged, spiro or several rings
+        return None
+
+    xyz = {}
+
+    if rings == 0:
+        # start from the first atom if it ends a chain, else from an
+        # atom far from it, so that the longest chain runs across
+        root = fragment[0] if len(graph.neighbors[fragment[0]]) <= 1 else fragment[-1]
+        sizes = graph.subtree_sizes(root, None)
+        xyz[root] = (0.0, 0.0)
+        children = graph.neighbors[root]
+        angles = {
+            child: -30 + 360 * i / len(children)
+            for i, child in enumerate(sorted(children, key=lambda n: -sizes[n]))
+        }
+        _place_branches(graph, xyz, root, angles, set())
+        return xyz
+
+    ring = graph.ring(fragment)
+    size = len(ring)
+    if size > SIMPLE_LAYOUT_MAX_RING:
+        return None
+
+    radius = 0.5 / math.sin(math.pi / size)
+    blocked = set(ring)
+
+    for i, idx in enumerate(ring):
+        dx, dy = _direction(90 + 360 * i / size)
+        xyz[idx] = (radius * dx, radius * dy)
+
+    for i, idx in enumerate(ring):
+        outward = 90 + 360 * i / size
+        children = [n for n in graph.neighbors[idx] if n not in blocked]
+        angles = {
+            child: outward + 60 * (j - (len(children) - 1) / 2)
+            for j, child in enumerate(children)
+        }
+        _place_branches(graph, xyz, idx, angles, blocked)
+
+    return xyz
+
+
+def _clashes(xyz: Dict[int, Tuple[float, float]]) -> bool:
+    """
+    whether any two atoms are too close to each other
+
+    :param xyz: coordinates
+    :return: bool
+    """
+    points = list(xyz.values())
+    limit = MIN_ATOM_DISTANCE**2
+
+    for i, (x1, y1) in enumerate(points):
+        for x2, y2 in points[i + 1 :]:
+            if (x1 - x2) ** 2 + (y1 - y2) ** 2 < limit:
+                return True
+    return False
+
+
+def simple_layout(tkmol: IndigoObject) -> bool:
+    """
+    give coordinates to a simple molecule: fragments that are chains,
+    possibly branched, or contain a single ring of up to
+    SIMPLE_LAYOUT_MAX_RING atoms, without stereo bonds or stereocenters.
+    Chains zig-zag, rings are regular polygons, fragments go side by side.
+
+    :param tkmol: toolkit molecule
+    :return: whether the molecule was laid out; if not, it is unchanged
+    """
+    if tkmol.countAtoms() > SIMPLE_LAYOUT_MAX_ATOMS or tkmol.countStereocenters():
+        return False
+
+    graph = Graph(tkmol)
+    if graph.stereo:
+        return False
+
+    coordinates = {}
+    offset = 0.0
+
+    for fragment in graph.fragments():
+        xyz = _layout_fragment(graph, fragment)
+        if xyz is None or _clashes(xyz):
+            return False
+
+        min_x = min(x for x, _ in xyz.values())
+        max_x = max(x for x, _ in xyz.values())
+        for idx, (x, y) in xyz.items():
+            coordinates[idx] = (x - min_x + offset, y)
+        offset += max_x - min_x + FRAGMENT_SPACING
+
+    for atom in tkmol.iterateAtoms():
+        x, y = coordinates[atom.index()]
+        atom.setXYZ(x, y, 0.0)
+
+    return True
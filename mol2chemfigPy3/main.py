@@ -3,9 +3,19 @@
 """
 package main
 """
+
 import sys
 import platform
 from .processor import process
+from .batch import process_batch, process_merge, process_index
+from .tree import process_tree
+
+_commands = {
+    "batch": process_batch,
+    "merge": process_merge,
+    "index": process_index,
+    "convert-tree": process_tree,
+}
 
 _system = platform.system()
 
@@ -24,10 +34,25 @@ def main(program_name: str = sys.argv[0]) -> None:
             colorama.just_fix_windows_console()
         elif hasattr(colorama, "init"):
             colorama.init()
-    success, result = process(raw_args=sys.argv[1:], program_name=program_name)
-    if success:
-        print(result.render_user())
+    if len(sys.argv) > 1 and sys.argv[1] in _commands:
+        command = _commands[sys.argv[1]]
+        success, result = command(sys.argv[2:], sys.stdout, program_name)
+        if success:
+            print(result, file=sys.stderr)
+        else:
+            print(result)
     else:
-        print(result)
+        success, result = process(raw_args=sys.argv[1:], program_name=program_name)
+        if success:
+            result.write_user(sys.stdout)
+            print()
+            if result.toolkit_calls is not None:
+                calls = sum(result.toolkit_calls.values())
+                print(f"{calls} toolkit calls", file=sys.stderr)
+            if result.degraded:
+                skipped = ", ".join(result.degraded)
+                print(f"reduced quality: skipped {skipped}", file=sys.stderr)
+        else:
+            print(result)
     if _system == "Windows":
         colorama.deinit()
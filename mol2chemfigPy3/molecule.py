@@ -1,24 +1,64 @@
 # -*- coding: utf-8 -*-
 # parse a molfile molecule and render to chemfig code
 import math
-from typing import Optional, Union, Tuple, List, Dict, Any
+from typing import Optional, Union, Tuple, List, Dict, Any, TextIO
 from indigo import IndigoException, IndigoObject
 from . import chemfig_mappings as cfm
-from .common import MCFError, Counter
+from .common import MCFError, Counter, CallCounter
 from .atom import Atom
 from .bond import Bond, DummyFirstBond, AromaticRingBond, compare_positions
+from . import molfile
+from .molfile import MolfileMolecule
+
+
+def count_rings(bonds: List[Tuple[int, int, int, int]]) -> int:
+    """
+    number of rings, i.e., of bonds beyond those of a spanning tree.
+    Much cheaper than ring perception.
+
+    :param bonds: [(start atom index, end atom index, ...), ...]
+    :return: ring count
+    """
+    parents = {}
+
+    def root(idx: int) -> int:
+        while parents.setdefault(idx, idx) != idx:
+            parents[idx] = parents[parents[idx]]
+            idx = parents[idx]
+        return idx
+
+    rings = 0
+    for start, end, *_ in bonds:
+        start, end = root(start), root(end)
+        if start == end:
+            rings += 1
+        else:
+            parents[start] = end
 
+    return rings
 
-class Molecule:
-    bond_scale = 1.0  # can be overridden by user option
-    exit_bond = None  # the first bond in the tree that connects to the exit atom
 
-    def __init__(self, options: Dict[str, Any], tkmol: IndigoObject) -> None:
+class Molecule:
+    def __init__(
+        self, options: Dict[str, Any], tkmol: Union[IndigoObject, MolfileMolecule]
+    ) -> None:
         self.options = options
+        self.bond_scale = 1.0  # can be overridden by user option
+        self.exit_bond = (
+            None  # the first bond in the tree that connects to the exit atom
+        )
+        self.toolkit_calls = None  # {method name: count}, if counting is on
+
+        if options["count_calls"]:
+            self.toolkit_calls = {}
+            tkmol = CallCounter(tkmol, self.toolkit_calls)
         self.tkmol = tkmol
 
         self.atoms = self.parseAtoms()
 
+        # very large molecules may be rendered more cheaply
+        self.degraded = self.limitQuality()
+
         # now it's time to flip and flop the coordinates
         for atom in list(self.atoms.values()):
             if self.options["flip_horizontal"]:
@@ -72,12 +112,12 @@ class Molecule:
             self.scaleBonds()
 
             # modify bonds in rings
-            self.annotateRings()
+            if "ring analysis" not in self.degraded:
+                self.annotateRings()
 
         # let each atom work out its preferred quadrant for placing
         # hydrogen or charges
-        for atom in list(self.atoms.values()):
-            atom.score_angles()
+        Atom.score_all_angles(list(self.atoms.values()))
 
         # finally, render the thing and cache the result.
         self._rendered = self.render()
@@ -336,17 +376,43 @@ class Molecule:
 
     def parseAtoms(self) -> Dict[int, Atom]:
         """
-        Read some attributes from the toolkit atom object
+        Read some attributes from the toolkit atom object. To keep calls
+        into the toolkit few, symbols, charges, radicals and all bonds are
+        taken from one molfile export; only implicit hydrogens, which the
+        export doesn't hold, and coordinates, which it rounds, are read
+        from each atom.
 
         :return: a dict containing wrapped atoms
         """
+        tk_atoms = list(self.tkmol.iterateAtoms())
+        indices = [ra.index() for ra in tk_atoms]  # by position
+        table = self.parseExport()
+
+        if table is None:
+            self.tk_bonds = [
+                (
+                    bond.source().index(),
+                    bond.destination().index(),
+                    bond.bondOrder(),  # 1,2,3,4 for single, double, triple, aromatic
+                    bond.bondStereo(),
+                )
+                for bond in self.tkmol.iterateBonds()
+            ]
+        else:
+            self.tk_bonds = [
+                (indices[start], indices[end], order, stereo)
+                for start, end, order, stereo in table.bonds
+            ]
+
+        neighbors = {}
+        for start, end, _, _ in self.tk_bonds:
+            neighbors.setdefault(start, []).append(end)
+            neighbors.setdefault(end, []).append(start)
+
         # wrap all atoms and supply coordinates
         wrapped_atoms = {}
 
-        for ra in self.tkmol.iterateAtoms():
-            idx = ra.index()
-            element = ra.symbol()
-
+        for position, (idx, ra) in enumerate(zip(indices, tk_atoms)):
             try:
                 hydrogens = ra.countImplicitHydrogens()
             except IndigoException:
@@ -354,10 +420,11 @@ class Molecule:
                     raise
                 hydrogens = 0
 
-            charge = ra.charge()
-            radical = ra.radicalElectrons()
-
-            neighbors = [na.index() for na in ra.iterateNeighbors()]
+            if table is None:
+                element = ra.symbol()
+                charge, radical = ra.charge(), ra.radicalElectrons()
+            else:
+                element, charge, radical = table.atoms[position]
 
             x, y, _ = ra.xyz()
 
@@ -370,11 +437,54 @@ class Molecule:
                 hydrogens,
                 charge,
                 radical,
-                neighbors,
+                neighbors.get(idx, []),
             )
 
         return wrapped_atoms
 
+    def limitQuality(self) -> List[str]:
+        """
+        check the size of the molecule against the user's quality limits.
+        Beyond any of them, the costly parts of rendering are skipped:
+        ring analysis, which includes aromatic circles, fancy bonds and
+        cross bonds. To that end, the options are replaced by a copy.
+
+        :return: the skipped parts, if any
+        """
+        limits = self.options["quality_limits"]
+        if not limits:
+            return []
+
+        counts = (len(self.atoms), len(self.tk_bonds), count_rings(self.tk_bonds))
+        if not any(limit and count > limit for count, limit in zip(counts, limits)):
+            return []
+
+        degraded = []
+        if counts[2]:
+            degraded.append("ring analysis")
+            if self.options["aromatic_circles"]:
+                degraded.append("aromatic circles")
+        if self.options["fancy_bonds"]:
+            degraded.append("fancy bonds")
+        if self.options["cross_bond"] is not None:
+            degraded.append("cross bonds")
+
+        self.options = dict(self.options, fancy_bonds=False, cross_bond=None)
+        return degraded
+
+    def parseExport(self) -> Optional[molfile.ExportTable]:
+        """
+        atoms and bonds from a molfile export of the toolkit molecule
+
+        :return: ExportTable, or None if they have to be read one by one
+        """
+        try:
+            data = self.tkmol.molfile()
+        except (AttributeError, IndigoException):  # not exportable
+            return None
+
+        return molfile.ExportTable.read(data)
+
     def parseBonds(
         self,
     ) -> Tuple[
@@ -382,21 +492,14 @@ class Molecule:
         List[Tuple[int, int]],
     ]:
         """
-        read some bond attributes
+        create bonds from the attributes read in parseAtoms
 
         :return: (bonds, atom pairs)
         """
         bonds = {}  # dictionary with bond objects, both orientations
         atom_pairs = []  # atom index pairs only, unique
 
-        for bond in self.tkmol.iterateBonds():
-            # start, end, bond_type, stereo = numbers
-            start = bond.source().index()
-            end = bond.destination().index()
-
-            bond_type = bond.bondOrder()  # 1,2,3,4 for single, double, triple, aromatic
-            stereo = bond.bondStereo()
-
+        for start, end, bond_type, stereo in self.tk_bonds:
             start_atom = self.atoms[start]
             end_atom = self.atoms[end]
 
@@ -630,11 +733,11 @@ class Molecule:
         for bond in self.treebonds():
             bond.length = self.bond_scale * bond.length
 
-    def render(self) -> List[str]:
+    def render(self) -> List[Tuple[int, str]]:
         """
         render molecule to chemfig
 
-        :return: a list containing rendered bonds
+        :return: a list containing rendered bonds and their indentation
         """
         output = []
         self._render(output, bond=self.root, level=0)
@@ -649,6 +752,16 @@ class Molecule:
         """
         return cfm.format_output(self.options, self._rendered)
 
+    def write_user(self, out: TextIO) -> None:
+        """
+        write code formatted according to user options to a text sink,
+        without building the whole output string first
+
+        :param out: text sink
+        :return: None
+        """
+        cfm.write_output(self.options, self._rendered, out)
+
     def render_server(self) -> str:
         """
         returns code formatted for server-side PDF generation
@@ -664,7 +777,7 @@ class Molecule:
 
     def _renderBranches(
         self,
-        output: List[str],
+        output: List[Tuple[int, str]],
         level: int,
         bonds: List[Union[Bond, DummyFirstBond, AromaticRingBond]],
     ) -> None:
@@ -676,16 +789,17 @@ class Molecule:
         :param bonds: [Bond_1, Bond_2,...]
         :return: None
         """
-        branch_indent = self.options["indent"]
+        # brackets are right-aligned with the bond codes
+        lead = level * self.options["indent"] + cfm.BOND_CODE_WIDTH - 1
 
         for bond in bonds:
-            output.append("(".rjust(level * branch_indent + cfm.BOND_CODE_WIDTH))
+            output.append((lead, "("))
             self._render(output, bond, level)
-            output.append(")".rjust(level * branch_indent + cfm.BOND_CODE_WIDTH))
+            output.append((lead, ")"))
 
     def _render(
         self,
-        output: List[str],
+        output: List[Tuple[int, str]],
         bond: Union[Bond, DummyFirstBond, AromaticRingBond],
         level: int,
     ) -> None:
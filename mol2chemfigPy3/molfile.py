@@ -0,0 +1,660 @@
+# -*- coding: utf-8 -*-
+"""
+a reader for V2000 and V3000 molfiles that already have coordinates,
+written in Python so that such input can skip the toolkit's loader.
+It wraps the result in objects with the same methods as the toolkit
+objects used by Molecule. Anything beyond plain atoms and bonds is
+declined, and the input goes to Indigo instead.
+"""
+from array import array
+from typing import Optional, List, Dict, Tuple, Any, Iterator
+from indigo import Indigo, IndigoObject
+from .common import MCFError, indigo
+
+# valence electrons of elements that may carry implicit hydrogens
+_valence_electrons = {
+    element: electrons
+    for electrons, group in enumerate(
+        ["B", "C Si Ge Sn", "N P As Sb", "O S Se Te", "F Cl Br I"], start=3
+    )
+    for element in group.split()
+}
+_hypervalent = {"Si", "P", "S", "Cl", "Ge", "As", "Se", "Br", "Sn", "Sb", "Te", "I"}
+
+# molfile codes -> toolkit values
+_v2000_charges = {1: 3, 2: 2, 3: 1, 5: -1, 6: -2, 7: -3}
+_radical_electrons = {0: 0, 1: 2, 2: 1, 3: 2}  # none, singlet, doublet, triplet
+_v2000_stereo = {1: Indigo.UP, 4: Indigo.EITHER, 6: Indigo.DOWN}
+_v3000_stereo = {1: Indigo.UP, 2: Indigo.EITHER, 3: Indigo.DOWN}
+_isotopes = {"D": "H", "T": "H"}  # symbols the toolkit writes for these
+
+_elements = set("""
+    H He Li Be B C N O F Ne Na Mg Al Si P S Cl Ar K Ca Sc Ti V Cr Mn Fe Co
+    Ni Cu Zn Ga Ge As Se Br Kr Rb Sr Y Zr Nb Mo Tc Ru Rh Pd Ag Cd In Sn Sb
+    Te I Xe Cs Ba La Ce Pr Nd Pm Sm Eu Gd Tb Dy Ho Er Tm Yb Lu Hf Ta W Re
+    Os Ir Pt Au Hg Tl Pb Bi Po At Rn Fr Ra Ac Th Pa U Np Pu Am Cm Bk Cf Es
+    Fm Md No Lr
+    """.split())
+
+# property lines that change the meaning of the atom or bond blocks
+_v2000_supported = {"CHG", "RAD", "ISO", "END"}
+# V3000 blocks; collections only hold stereo groups, which aren't drawn
+_v3000_blocks = {"CTAB", "ATOM", "BOND", "COLLECTION"}
+
+
+class MolfileError(MCFError):
+    """
+    the input can't be read by the Python reader; use the toolkit instead
+    """
+
+    pass
+
+
+def implicit_hydrogens(
+    element: str, charge: int, radical: int, bond_sum: int, valence: int = 0
+) -> int:
+    """
+    number of implicit hydrogens under the MDL valence model
+
+    :param element: element symbol
+    :param charge: charge
+    :param radical: number of radical electrons
+    :param bond_sum: sum of bond orders
+    :param valence: valence from the molfile; 0 means default, -1 none
+    :return: number of hydrogens
+    """
+    if valence < 0:
+        return 0
+    if valence > 0:
+        return max(valence - bond_sum - radical, 0)
+
+    electrons = _valence_electrons.get(element)
+    if electrons is None:
+        if element == "H" and charge == 0:
+            return max(1 - bond_sum - radical, 0)
+        if bond_sum == 0 and radical == 0 and charge == 0:
+            raise MolfileError(f"implicit hydrogens of {element} unknown")
+        return 0  # metals and the like: no implicit hydrogens
+
+    electrons -= charge
+    lowest = electrons if electrons <= 4 else 8 - electrons
+    if lowest < 0:
+        raise MolfileError(f"charge {charge} on {element} not supported")
+
+    candidates = [lowest]
+    if element in _hypervalent:
+        candidates.extend(range(lowest + 2, electrons + 1, 2))
+
+    used = bond_sum + radical
+    for candidate in candidates:
+        if candidate >= used:
+            return candidate - used
+
+    raise MolfileError(f"valence of {element} exceeded")
+
+
+class MolfileAtom:
+    """
+    an atom read from a molfile, with the methods Molecule uses
+    """
+
+    def __init__(
+        self,
+        mol: "MolfileMolecule",
+        idx: int,
+        element: str,
+        x: float,
+        y: float,
+        z: float,
+        charge: int,
+        radical: int,
+        valence: int,
+    ) -> None:
+        self.mol = mol
+        self.idx = idx
+        self.element = element
+        self.coordinates = [x, y, z]
+        self.charge_ = charge
+        self.radical = radical
+        self.valence = valence
+        self.neighbors: List[int] = []
+        self.bond_sum = 0
+        self.hydrogens = 0
+
+    def index(self) -> int:
+        return self.idx
+
+    def symbol(self) -> str:
+        return self.element
+
+    def countImplicitHydrogens(self) -> int:
+        return self.hydrogens
+
+    def charge(self) -> int:
+        return self.charge_
+
+    def radicalElectrons(self) -> int:
+        return self.radical
+
+    def xyz(self) -> List[float]:
+        return self.coordinates
+
+    def iterateNeighbors(self) -> Iterator["MolfileAtom"]:
+        return (self.mol.atoms[idx] for idx in self.neighbors)
+
+
+class MolfileBond:
+    """
+    a bond read from a molfile, with the methods Molecule uses
+    """
+
+    def __init__(
+        self, start: MolfileAtom, end: MolfileAtom, order: int, stereo: int
+    ) -> None:
+        self.start = start
+        self.end = end
+        self.order = order
+        self.stereo = stereo
+
+    def source(self) -> MolfileAtom:
+        return self.start
+
+    def destination(self) -> MolfileAtom:
+        return self.end
+
+    def bondOrder(self) -> int:
+        return self.order
+
+    def bondStereo(self) -> int:
+        return self.stereo
+
+
+class MolfileMolecule:
+    """
+    a molecule read from a molfile. Stands in for the toolkit molecule;
+    ring perception, which only Indigo offers, loads the molfile into
+    Indigo on first use, and only if there are any rings at all.
+    """
+
+    def __init__(self, data: str) -> None:
+        self.data = data
+        self.atoms: List[MolfileAtom] = []
+        self.bonds: List[MolfileBond] = []
+        self._tkmol = None
+
+    def add_atom(self, *args: Any) -> None:
+        """
+        :param args: MolfileAtom arguments after mol and index
+        :return: None
+        """
+        self.atoms.append(MolfileAtom(self, len(self.atoms), *args))
+
+    def add_bond(self, start: int, end: int, order: int, stereo: int) -> None:
+        """
+        :param start: start atom number, counted from 1
+        :param end: end atom number, counted from 1
+        :param order: 1, 2 or 3
+        :param stereo: toolkit stereo value
+        :return: None
+        """
+        if not 0 < start <= len(self.atoms) or not 0 < end <= len(self.atoms):
+            raise MolfileError("bond to missing atom")
+        if start == end:
+            raise MolfileError("invalid bond")
+
+        start_atom = self.atoms[start - 1]
+        end_atom = self.atoms[end - 1]
+
+        self.bonds.append(MolfileBond(start_atom, end_atom, order, stereo))
+        start_atom.neighbors.append(end_atom.idx)
+        end_atom.neighbors.append(start_atom.idx)
+        start_atom.bond_sum += order
+        end_atom.bond_sum += order
+
+    def finish(self) -> None:
+        """
+        work out implicit hydrogens once all bonds are known. Coordinates
+        are rounded to single precision, like the toolkit does.
+
+        :return: None
+        """
+        if not self.hasCoord():
+            raise MolfileError("no coordinates")
+
+        for atom in self.atoms:
+            atom.hydrogens = implicit_hydrogens(
+                atom.element, atom.charge_, atom.radical, atom.bond_sum, atom.valence
+            )
+            atom.coordinates = list(array("f", atom.coordinates))
+
+    def toolkit(self) -> IndigoObject:
+        """
+        the same molecule, loaded by Indigo
+
+        :return: IndigoObject
+        """
+        if self._tkmol is None:
+            self._tkmol = indigo().loadMolecule(self.data)
+        return self._tkmol
+
+    def has_rings(self) -> bool:
+        """
+        :return: whether any fragment contains a ring
+        """
+        parent = list(range(len(self.atoms)))
+
+        def find(idx: int) -> int:
+            while parent[idx] != idx:
+                parent[idx] = parent[parent[idx]]
+                idx = parent[idx]
+            return idx
+
+        for bond in self.bonds:
+            start, end = find(bond.start.idx), find(bond.end.idx)
+            if start == end:
+                return True
+            parent[start] = end
+        return False
+
+    def countAtoms(self) -> int:
+        return len(self.atoms)
+
+    def hasCoord(self) -> bool:
+        return any(x or y or z for x, y, z in (a.coordinates for a in self.atoms))
+
+    def iterateAtoms(self) -> Iterator[MolfileAtom]:
+        return iter(self.atoms)
+
+    def iterateBonds(self) -> Iterator[MolfileBond]:
+        return iter(self.bonds)
+
+    def aromatize(self) -> None:
+        if self.has_rings():
+            self.toolkit().aromatize()
+
+    def iterateSSSR(self) -> Iterator[IndigoObject]:
+        if self.has_rings():
+            return self.toolkit().iterateSSSR()
+        return iter(())
+
+
+def _int(field: str) -> int:
+    """
+    :param field: fixed-width field, possibly blank
+    :return: integer value
+    """
+    field = field.strip()
+    return int(field) if field else 0
+
+
+def _read_v2000(mol: MolfileMolecule, lines: List[str]) -> None:
+    """
+    :param mol: empty molecule
+    :param lines: lines of the molfile
+    :return: None
+    """
+    atom_count = _int(lines[3][0:3])
+    bond_count = _int(lines[3][3:6])
+    atom_lines = lines[4 : 4 + atom_count]
+    bond_lines = lines[4 + atom_count : 4 + atom_count + bond_count]
+    property_lines = lines[4 + atom_count + bond_count :]
+
+    if len(bond_lines) < bond_count:
+        raise MolfileError("molfile is truncated")
+
+    properties: Dict[str, List[Tuple[int, int]]] = {}
+    for line in property_lines:
+        if line.startswith("M  "):
+            kind = line[3:6]
+            if kind not in _v2000_supported:
+                raise MolfileError(f"property {kind} not supported")
+            if kind == "END":
+                break
+            entries = line[9:].split()
+            properties.setdefault(kind, []).extend(
+                (int(entries[i]), int(entries[i + 1]))
+                for i in range(0, len(entries) - 1, 2)
+            )
+        elif line.strip():  # atom aliases, values, group abbreviations
+            raise MolfileError("property block not supported")
+
+    # if any charge or radical properties are given, the atom block's
+    # charge field does not count
+    use_charge_field = "CHG" not in properties and "RAD" not in properties
+
+    for line in atom_lines:
+        element = line[31:34].strip()
+        charge_code = _int(line[36:39])
+        valence = _int(line[48:51])
+
+        if element not in _elements or _int(line[42:45]):
+            raise MolfileError(f"atom {element} not supported")
+
+        charge = radical = 0
+        if use_charge_field:
+            if charge_code == 4:
+                radical = 1
+            else:
+                charge = _v2000_charges.get(charge_code, 0)
+
+        mol.add_atom(
+            element,
+            float(line[0:10]),
+            float(line[10:20]),
+            float(line[20:30]),
+            charge,
+            radical,
+            -1 if valence == 15 else valence,
+        )
+
+    for atom_number, value in properties.get("CHG", []):
+        mol.atoms[atom_number - 1].charge_ = value
+    for atom_number, value in properties.get("RAD", []):
+        mol.atoms[atom_number - 1].radical = _radical_electrons[value]
+
+    for line in bond_lines:
+        order = _int(line[6:9])
+        stereo = _int(line[9:12])
+        if order not in (1, 2, 3):
+            raise MolfileError("query or aromatic bonds not supported")
+        stereo = _v2000_stereo.get(stereo, 0) if order == 1 else 0
+        mol.add_bond(_int(line[0:3]), _int(line[3:6]), order, stereo)
+
+
+def _v3000_fields(fields: List[str]) -> Tuple[List[str], Dict[str, str]]:
+    """
+    :param fields: fields of a V3000 line
+    :return: (positional fields, keyword fields)
+    """
+    positional = [f for f in fields if "=" not in f]
+    keywords = dict(f.split("=", 1) for f in fields if "=" in f)
+    return positional, keywords
+
+
+def _read_v3000(mol: MolfileMolecule, lines: List[str]) -> None:
+    """
+    :param mol: empty molecule
+    :param lines: lines of the molfile
+    :return: None
+    """
+    # join continuation lines and strip prefixes
+    records = []
+    pending = ""
+    for line in lines[4:]:
+        if line.startswith("M  END"):
+            break
+        if not line.startswith("M  V30 "):
+            raise MolfileError("property block not supported")
+        text = pending + line[7:]
+        if text.endswith("-"):
+            pending = text[:-1]
+        else:
+            records.append(text.split())
+            pending = ""
+
+    block = None
+    for fields in records:
+        if fields[0] in ("BEGIN", "END"):
+            block = fields[1] if fields[0] == "BEGIN" else None
+            if fields[0] == "BEGIN" and block not in _v3000_blocks:
+                raise MolfileError(f"{block} block not supported")
+            continue
+
+        if block == "ATOM":
+            positional, keywords = _v3000_fields(fields)
+            element = positional[1]
+            if element not in _elements:
+                raise MolfileError(f"atom {element} not supported")
+            if set(keywords) - {"CHG", "RAD", "VAL", "MASS", "CFG"}:
+                raise MolfileError("atom properties not supported")
+
+            valence = int(keywords.get("VAL", 0))
+            mol.add_atom(
+                element,
+                float(positional[2]),
+                float(positional[3]),
+                float(positional[4]),
+                int(keywords.get("CHG", 0)),
+                _radical_electrons[int(keywords.get("RAD", 0))],
+                valence,
+            )
+
+        elif block == "BOND":
+            positional, keywords = _v3000_fields(fields)
+            order = int(positional[1])
+            if order not in (1, 2, 3):
+                raise MolfileError("query or aromatic bonds not supported")
+            if set(keywords) - {"CFG"}:
+                raise MolfileError("bond properties not supported")
+
+            stereo = _v3000_stereo.get(int(keywords.get("CFG", 0)), 0)
+            mol.add_bond(
+                int(positional[2]),
+                int(positional[3]),
+                order,
+                stereo if order == 1 else 0,
+            )
+
+
+class ExportTable:
+    """
+    what Molecule reads from the atoms and bonds of a toolkit molecule,
+    taken from one molfile export of it instead of a call into the
+    toolkit per value. Coordinates are not: the export rounds them.
+
+    atoms holds (symbol, charge, radical electrons) and bonds (start
+    position, end position, bond order, stereo), with atoms counted by
+    position from 0, in the order the toolkit iterates them.
+    """
+
+    def __init__(self) -> None:
+        self.atoms: List[Tuple[str, int, int]] = []
+        self.bonds: List[Tuple[int, int, int, int]] = []
+
+    def _v3000(self, lines: List[str]) -> None:
+        """
+        :param lines: lines of the molfile
+        :return: None
+        """
+        block = None
+        pending = ""
+        for line in lines[4:]:
+            if line.startswith("M  END"):
+                break
+            text = pending + line[7:]
+            if text.endswith("-"):
+                pending = text[:-1]
+                continue
+            pending = ""
+            fields = text.split()
+            if fields[:1] in (["BEGIN"], ["END"]):
+                block = fields[1] if fields[0] == "BEGIN" else None
+            elif block == "ATOM":
+                positional, keywords = _v3000_fields(fields)
+                self.atoms.append(
+                    (
+                        _isotopes.get(positional[1], positional[1]),
+                        int(keywords.get("CHG", 0)),
+                        _radical_electrons[int(keywords.get("RAD", 0))],
+                    )
+                )
+            elif block == "BOND":
+                positional, keywords = _v3000_fields(fields)
+                order = int(positional[1])
+                stereo = _v3000_stereo.get(int(keywords.get("CFG", 0)), 0)
+                self.bonds.append(
+                    (
+                        int(positional[2]) - 1,
+                        int(positional[3]) - 1,
+                        order,
+                        stereo if order == 1 else 0,
+                    )
+                )
+
+    def _v2000(self, lines: List[str]) -> None:
+        """
+        :param lines: lines of the molfile
+        :return: None
+        """
+        atom_count = _int(lines[3][0:3])
+        bond_count = _int(lines[3][3:6])
+        charges = {}  # position -> (charge, radical) from property lines
+        has_properties = False
+
+        for line in lines[4 + atom_count + bond_count :]:
+            kind = line[3:6] if line.startswith("M  ") else None
+            if kind == "END":
+                break
+            if kind in ("CHG", "RAD"):
+                has_properties = True
+                entries = [int(entry) for entry in line[9:].split()]
+                for number, value in zip(entries[::2], entries[1::2]):
+                    charge, radical = charges.get(number - 1, (0, 0))
+                    if kind == "CHG":
+                        charge = value
+                    else:
+                        radical = _radical_electrons[value]
+                    charges[number - 1] = charge, radical
+
+        for position, line in enumerate(lines[4 : 4 + atom_count]):
+            if has_properties:
+                charge, radical = charges.get(position, (0, 0))
+            else:  # fall back on the atom block's charge field
+                code = _int(line[36:39])
+                charge, radical = (
+                    (0, 2) if code == 4 else (_v2000_charges.get(code, 0), 0)
+                )
+            symbol = line[31:34].strip()
+            self.atoms.append((_isotopes.get(symbol, symbol), charge, radical))
+
+        for line in lines[4 + atom_count : 4 + atom_count + bond_count]:
+            order = _int(line[6:9])
+            stereo = _v2000_stereo.get(_int(line[9:12]), 0)
+            self.bonds.append(
+                (
+                    _int(line[0:3]) - 1,
+                    _int(line[3:6]) - 1,
+                    order,
+                    stereo if order == 1 else 0,
+                )
+            )
+
+    @classmethod
+    def read(cls, data: str) -> "ExportTable":
+        """
+        :param data: molfile text, as written by the toolkit
+        :return: ExportTable
+        """
+        lines = data.splitlines()
+        table = cls()
+        if lines[3][34:39] == "V3000":
+            table._v3000(lines)
+        else:
+            table._v2000(lines)
+        return table
+
+
+def read_molfile(data: str) -> MolfileMolecule:
+    """
+    read a molfile with coordinates
+
+    :param data: molfile text
+    :return: MolfileMolecule
+    """
+    lines = data.splitlines()
+    mol = MolfileMolecule(data)
+
+    try:
+        if lines[3][34:39] == "V3000":
+            _read_v3000(mol, lines)
+        elif lines[3][34:39] == "V2000":
+            _read_v2000(mol, lines)
+        else:
+            raise MolfileError("unknown molfile version")
+
+    except (IndexError, ValueError, KeyError):
+        raise MolfileError("molfile can't be parsed")
+
+    mol.finish()
+    return mol
+
+
+def read_fast(data: str, options: Dict[str, Any]) -> Optional[MolfileMolecule]:
+    """
+    read input with the Python reader if it is a molfile that needs
+    nothing from the toolkit beyond ring perception
+
+    :param data: molecule data
+    :param options: option dict
+    :return: MolfileMolecule, or None if the toolkit should read the input
+    """
+    if "M  END" not in data or options["recalculate_coordinates"]:
+        return None
+
+    hydrogens = options["hydrogens"]
+    if hydrogens in ("add", "place"):
+        return None
+
+    try:
+        mol = read_molfile(data)
+    except MolfileError:
+        return None
+
+    if hydrogens == "delete" and any(a.element == "H" for a in mol.atoms):
+        return None
+
+    return mol
+
+
+def describe(tkmol: Any) -> Tuple[list, list]:
+    """
+    everything Molecule reads from a molecule, for comparing readers
+
+    :param tkmol: toolkit molecule or MolfileMolecule
+    :return: (atoms, bonds)
+    """
+    atoms = [
+        (
+            atom.index(),
+            atom.symbol(),
+            atom.countImplicitHydrogens(),
+            atom.charge(),
+            atom.radicalElectrons(),
+            [neighbor.index() for neighbor in atom.iterateNeighbors()],
+            list(atom.xyz())[:2],
+        )
+        for atom in tkmol.iterateAtoms()
+    ]
+    bonds = [
+        (
+            bond.source().index(),
+            bond.destination().index(),
+            bond.bondOrder(),
+            bond.bondStereo() if bond.bondStereo() in _v2000_stereo.values() else 0,
+        )
+        for bond in tkmol.iterateBonds()
+    ]
+    return atoms, bonds
+
+
+def validate(mol: MolfileMolecule, tkmol: IndigoObject) -> None:
+    """
+    check that the Python reader got the same molecule as the toolkit
+
+    :param mol: MolfileMolecule
+    :param tkmol: the same input read by the toolkit
+    :return: None
+    """
+    atoms, bonds = describe(mol)
+    tk_atoms, tk_bonds = describe(tkmol)
+
+    for atom, tk_atom in zip(atoms, tk_atoms):
+        if atom != tk_atom:
+            raise MCFError(f"molfile reader: atom {atom} differs from {tk_atom}")
+
+    for bond, tk_bond in zip(bonds, tk_bonds):
+        if bond != tk_bond:
+            raise MCFError(f"molfile reader: bond {bond} differs from {tk_bond}")
+
+    if len(atoms) != len(tk_atoms) or len(bonds) != len(tk_bonds):
+        raise MCFError("molfile reader: number of atoms or bonds differs")
@@ -352,6 +352,38 @@ class RangeOption(Option):
         return True, ranges
 
 
+class IntListOption(Option):
+    """
+    accept a string of comma-separated, non-negative ints,
+    such as 150,170,12, and convert it into [150, 170, 12].
+    valid_range, if given, holds the allowed numbers of ints.
+    """
+
+    separator = ","
+    form_tag_template = (
+        r"""<input type="text" name="%(key)s" value="%(value)s" size="8"/>"""
+    )
+
+    def validate_range(self, value: Any) -> bool:
+        """
+        :param value: list of ints
+        :return: Bool, whether there are as many as allowed
+        """
+        return self.valid_range is None or len(value) in self.valid_range
+
+    def _validate(self, raw_value: str) -> Tuple[bool, Union[List[int], str]]:
+        """
+        :param raw_value: string value
+        :return: (bool, ints)
+        """
+        try:
+            values = [int(frag) for frag in raw_value.split(self.separator)]
+        except ValueError:
+            return False, raw_value
+
+        return all(value >= 0 for value in values), values
+
+
 class OptionParser:
     """
     collect and process options. the result will be contained in a dict.
@@ -9,6 +9,7 @@ from .optionparser import (
     StringOption,
     SelectOption,
     RangeOption,
+    IntListOption,
 )
 
 
@@ -166,11 +167,13 @@ def getParser() -> OptionParser:
             "hydrogens",
             "y",
             key="hydrogens",
-            valid_range="keep add delete".split(),
+            valid_range="keep add place delete".split(),
             help_text="""
         How to deal with explicit hydrogen atoms.
-        One of 'keep', 'add' or 'delete'. 
+        One of 'keep', 'add', 'place' or 'delete'. 
         Note that 'add' will also trigger calculation of new coordinates for the entire molecule.
+        Option 'place' adds hydrogens like 'add' but keeps the existing coordinates,
+        placing each hydrogen in the free space around its atom.
         Option 'keep' does nothing.
         """,
         )
@@ -196,6 +199,21 @@ def getParser() -> OptionParser:
         )
     )
 
+    parser.append(
+        IntListOption(
+            "quality-limits",
+            "Q",
+            key="quality_limits",
+            valid_range=range(1, 4),
+            help_text="""
+        Render molecules with more than ATOMS atoms, BONDS bonds or RINGS rings
+        more cheaply, given as ATOMS,BONDS,RINGS: without analysing rings,
+        aromatic circles, fancy bonds or cross bonds. Zero or omitted values
+        set no limit. Example: --quality-limits=150,170,12
+        """,
+        )
+    )
+
     parser.append(
         StringOption(
             "markers",
@@ -317,4 +335,341 @@ def getParser() -> OptionParser:
         )
     )
 
+    parser.append(
+        SelectOption(
+            "layout",
+            "G",
+            key="layout",
+            valid_range="indigo simple".split(),
+            help_text="""
+        How to calculate new coordinates. 'simple' draws chains as zig-zags
+        and single rings as regular polygons, which is faster for small
+        molecules; it falls back to 'indigo' for anything more complex,
+        such as fused rings or stereochemistry.
+        """,
+        )
+    )
+
+    parser.append(
+        SelectOption(
+            "reader",
+            "R",
+            key="reader",
+            valid_range="indigo python validate".split(),
+            help_text="""
+        How to read molfiles that have coordinates. 'python' uses a
+        faster built-in reader where possible and Indigo otherwise;
+        'validate' reads with both and reports any difference as an error.
+        """,
+        )
+    )
+
+    parser.append(
+        BoolOption(
+            "count-calls",
+            "C",
+            key="count_calls",
+            default=False,
+            help_text="""
+        Count the calls made to the toolkit while converting, and report
+        them on stderr.
+        """,
+        )
+    )
+
+    parser.append(
+        StringOption(
+            "layout-cache",
+            "L",
+            key="layout_cache",
+            help_text="""
+        Keep molecules that needed new coordinates in this cache file,
+        so that converting them again skips parsing and layout.
+        Use ':memory:' to cache only within one run. Not available
+        to web and rpc clients.
+        """,
+        )
+    )
+
+    parser.append(
+        StringOption(
+            "error-cache",
+            "E",
+            key="error_cache",
+            help_text="""
+        Keep inputs that could not be converted in this cache file, so that
+        they are rejected at once, with the same message, when they come
+        again. Use ':memory:' to cache only within one run. Not available
+        to web and rpc clients.
+        """,
+        )
+    )
+
+    return parser
+
+
+def _appendJobOptions(parser: OptionParser) -> None:
+    """
+    options for how files are converted in bulk, shared by batch mode
+    and tree conversion
+
+    :param parser: OptionParser object
+    :return: None
+    """
+    parser.append(
+        BoolOption(
+            "traceback",
+            "T",
+            key="traceback",
+            default=False,
+            help_text="""
+        Report failed records with a full traceback rather than just the
+        error message.
+        """,
+        )
+    )
+
+    parser.append(
+        IntOption(
+            "jobs",
+            "J",
+            key="jobs",
+            default=1,
+            help_text="""
+        Convert this many records at a time, in separate processes, while
+        the input is read and the results are written.
+        """,
+        )
+    )
+
+    parser.append(
+        IntOption(
+            "max-tasks",
+            "N",
+            key="max_tasks",
+            help_text="""
+        Replace each worker process with a fresh one after it has converted
+        this many records, to return the memory it has gathered.
+        """,
+        )
+    )
+
+    parser.append(
+        IntOption(
+            "max-rss",
+            "M",
+            key="max_rss",
+            help_text="""
+        Replace a worker process with a fresh one once its resident memory
+        exceeds this many megabytes.
+        """,
+        )
+    )
+
+    parser.append(
+        IntOption(
+            "memory-limit",
+            "A",
+            key="memory_limit",
+            help_text="""
+        Limit the address space of each worker process to this many
+        megabytes, where the system allows. A record that runs out of
+        memory is tried once more in a fresh process.
+        """,
+        )
+    )
+
+    parser.append(
+        SelectOption(
+            "pool",
+            "P",
+            key="pool",
+            valid_range="process thread".split(),
+            help_text="""
+        What the jobs run in. 'process' starts a worker process for each job.
+        'thread' runs them as threads in one process, which saves memory and
+        start-up time but only runs in parallel where Indigo releases the
+        interpreter lock, or on free-threaded Python.
+        """,
+        )
+    )
+
+    parser.append(
+        FloatOption(
+            "timeout",
+            "W",
+            key="timeout",
+            help_text="""
+        Give up on a record after this many seconds. Records are then
+        converted in a separate process, which is replaced if it times out
+        or crashes; such records are reported as failed.
+        """,
+        )
+    )
+
+
+def getBatchParser() -> OptionParser:
+    """
+    the options for batch mode: all regular options, which
+    apply to every molecule, plus some that control the batch
+
+    :return: OptionParser object
+    """
+    parser = getParser()
+
+    parser.append(
+        SelectOption(
+            "dedup",
+            "D",
+            key="dedup",
+            valid_range="exact structure none".split(),
+            help_text="""
+        How to find duplicate molecules, which are converted only once.
+        With 'exact', only identical input records are duplicates.
+        With 'structure', molecules are compared by canonical SMILES, unless their
+        coordinates or atom numbers matter for the output, and drawn from these.
+        With 'none', every record is converted.
+        """,
+        )
+    )
+
+    _appendJobOptions(parser)
+
+    parser.append(
+        BoolOption(
+            "unordered",
+            "U",
+            key="unordered",
+            default=False,
+            help_text="""
+        With several jobs, write each result as soon as it is ready
+        instead of in input order, so a slow record doesn't hold back
+        those after it. The record numbers tell which result is which.
+        """,
+        )
+    )
+
+    parser.append(
+        SelectOption(
+            "schedule",
+            "S",
+            key="schedule",
+            valid_range="input cost".split(),
+            help_text="""
+        Order in which records are converted. 'input' takes them as they
+        come. 'cost' estimates the size of each molecule from its text,
+        starts the largest first, bundles small ones into one task for a
+        worker, and gives each task a time limit in proportion to its
+        size, learnt from earlier ones. The output stays in input order
+        unless --unordered is given.
+        """,
+        )
+    )
+
+    parser.append(
+        StringOption(
+            "output",
+            "O",
+            key="output",
+            help_text="""
+        Write the results to this file rather than to standard output, and
+        keep a checkpoint of the progress next to it, in the same name with
+        '.checkpoint' added, until the run is complete.
+        """,
+        )
+    )
+
+    parser.append(
+        BoolOption(
+            "resume",
+            "K",
+            key="resume",
+            default=False,
+            help_text="""
+        Continue an interrupted run with --output from its last checkpoint.
+        Results written after the checkpoint are discarded and converted
+        again, so that no record is missing or written twice. Input files
+        and options must be the same as before.
+        """,
+        )
+    )
+
+    parser.append(
+        IntOption(
+            "checkpoint",
+            "Y",
+            key="checkpoint",
+            default=1000,
+            help_text="""
+        Save a checkpoint after writing this many records with --output.
+        """,
+        )
+    )
+
+    parser.append(
+        StringOption(
+            "shard",
+            "H",
+            key="shard",
+            help_text="""
+        Convert only every N-th record, starting with the I-th, given as I/N,
+        e.g., 2/4 for records 2, 6, 10,... This splits a batch among N
+        machines, each of which reads all input but converts only its share;
+        the merge command puts their outputs back in order.
+        """,
+        )
+    )
+
+    parser.append(
+        RangeOption(
+            "records",
+            "X",
+            key="records",
+            help_text="""
+        Convert only the records with these numbers, e.g., 100-200 or
+        1-10,50-50. Files indexed with the index command are not read
+        in full, but just where the records are.
+        """,
+        )
+    )
+
+    parser.append(
+        StringOption(
+            "id",
+            "I",
+            key="id",
+            help_text="""
+        Convert only the records with these titles, e.g., CHEMBL25 or
+        CHEMBL25,CHEMBL192: the first line of a molfile, or the name after
+        a SMILES string. Indexed files are looked up in their index.
+        """,
+        )
+    )
+
+    return parser
+
+
+def getTreeParser() -> OptionParser:
+    """
+    the options for tree conversion: all regular options, plus those
+    that control the conversion of many files
+
+    :return: OptionParser object
+    """
+    parser = getParser()
+    _appendJobOptions(parser)
+
+    parser.append(
+        BoolOption(
+            "force",
+            "F",
+            key="force",
+            default=False,
+            help_text="""
+        Convert all files, including those that haven't changed since
+        the last run.
+        """,
+        )
+    )
+
     return parser
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""
+a staged pipeline for large jobs: a reader thread, a pool of worker
+processes, each driven by a thread, or just a pool of threads, and the
+caller as writer. Bounded queues between the stages keep memory flat
+however long the input.
+"""
+
+import queue
+import threading
+from typing import Optional, Tuple, Dict, Any, Callable, Iterable, Iterator
+from .worker import Worker
+
+PIPELINE_DEPTH = 4  # items in flight per worker, between reader and writer
+
+_done = object()  # end of a stage's output
+
+
+def run_pipeline(
+    items: Iterable[Any],
+    convert: Callable[[Any, Optional[Worker]], Any],
+    jobs: int,
+    new_worker: Optional[Callable[[], Worker]] = None,
+    ordered: bool = True,
+    depth: int = PIPELINE_DEPTH,
+    counts: Optional[Dict[str, int]] = None,
+) -> Iterator[Tuple[Any, Any]]:
+    """
+    convert items in parallel. Each of the jobs threads owns a Worker,
+    made by new_worker, which convert may use to do the actual work;
+    without new_worker, the threads do the work themselves. At most
+    jobs * depth items are read ahead of the caller; if the output is
+    ordered, this includes those held back for a slow predecessor.
+    Exceptions raised in reading the items or by convert end the
+    pipeline and are raised again to the caller.
+
+    :param items: input, read in a separate thread
+    :param convert: function of an item and a worker, or None if
+                    there are no processes, called in a thread
+    :param jobs: number of workers
+    :param new_worker: makes a Worker, e.g., the Worker class
+    :param ordered: whether to yield in input order, or as items are done
+    :param depth: items in flight per worker
+    :param counts: if given, the Worker.counts of all workers are
+                   added up here when they are done
+    :return: iterator over (item, result)
+    """
+    todo = queue.Queue(maxsize=jobs * depth)
+    done = queue.Queue()
+    window = threading.Semaphore(jobs * depth)  # items read but not yielded
+    stop = threading.Event()
+
+    def read() -> None:
+        try:
+            for index, item in enumerate(items):
+                window.acquire()
+                if stop.is_set():
+                    break
+                todo.put((index, item))
+        except Exception as error:  # hand input errors to the caller
+            done.put((-1, None, error))
+        finally:
+            for _ in range(jobs):
+                todo.put(None)
+
+    def work(worker: Optional[Worker]) -> None:
+        try:
+            while True:
+                task = todo.get()
+                if task is None:
+                    break
+                if stop.is_set():
+                    continue
+                index, item = task
+                try:
+                    done.put((index, item, convert(item, worker)))
+                except Exception as error:  # hand it to the caller, and stop
+                    stop.set()
+                    done.put((-1, item, error))
+        finally:
+            if worker is not None:
+                worker.close()
+                if counts is not None:
+                    with counts_lock:
+                        for name, count in worker.counts().items():
+                            counts[name] = counts.get(name, 0) + count
+            done.put(_done)
+
+    # start worker processes before any other thread runs
+    counts_lock = threading.Lock()
+    workers = [new_worker and new_worker() for _ in range(jobs)]
+    for worker in workers:
+        if worker is not None:
+            worker.start()
+
+    threads = [threading.Thread(target=read, daemon=True)]
+    threads.extend(
+        threading.Thread(target=work, args=(worker,), daemon=True) for worker in workers
+    )
+    for thread in threads:
+        thread.start()
+
+    pending = {}  # index -> (item, result), waiting for predecessors
+    next_index = 0
+    running = jobs
+
+    try:
+        while running:
+            task = done.get()
+            if task is _done:
+                running -= 1
+                continue
+
+            index, item, result = task
+            if index < 0:  # error in reading or converting
+                raise result
+
+            if not ordered:
+                yield item, result
+                window.release()
+                continue
+
+            pending[index] = item, result
+            while next_index in pending:
+                yield pending.pop(next_index)
+                window.release()
+                next_index += 1
+
+    finally:
+        if running:  # the caller stopped early, or input failed
+            stop.set()
+            for _ in range(jobs * depth):
+                window.release()
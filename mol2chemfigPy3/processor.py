@@ -3,12 +3,18 @@
 accept input from command line or through the web and
 return the result.
 """
+import math
 import os.path
-import traceback
+from collections import defaultdict
 from urllib import request
+from urllib.error import HTTPError
 from typing import Union, Tuple, List, Dict, Any, Optional
-from indigo import Indigo, IndigoException, IndigoObject
-from . import common, options, molecule
+from indigo import IndigoException, IndigoObject
+from . import common, options, molecule, cache, layout, molfile
+
+# options that name files on the machine that runs the conversion, which
+# web and rpc clients must not be able to create or write
+_local_options = dict(layout_cache="layout-cache", error_cache="error-cache")
 
 
 class HelpError(common.MCFError):
@@ -19,6 +25,16 @@ class HelpError(common.MCFError):
         return self.text
 
 
+class KnownFailure(common.MCFError):
+    """
+    an input rejected by the error cache, since it failed before
+    """
+
+    def __init__(self, result: common.ErrorResult) -> None:
+        super().__init__(result.message)
+        self.result = result
+
+
 class Processor:
     """
     parses input and invokes backend, returns result
@@ -51,6 +67,9 @@ class Processor:
         # data obtained from the proper source go here
         self.data_string = None
 
+        # stage of processing, for error reports
+        self.stage = "options"
+
     def version_text(self) -> str:
         """
         print the program version
@@ -93,6 +112,7 @@ class Processor:
 
         # if we get here, we have parsed options and a possibly empty data list
         self.options.update(parsed_options)
+        self.stage = "input"
 
         # before we go on to check on the data, we will satisfy help requests,
         # which we treat like an error
@@ -116,9 +136,9 @@ class Processor:
 
         if not self.rpc and self.options["input"] == "file":
             try:
-                with open(data, mode="r", encoding="utf-8") as fh:
+                with common.open_text(data) as fh:
                     data = fh.read()
-            except IOError:
+            except common.read_errors:
                 raise common.MCFError(f"Can't read file {data}")
 
         self.data_string = data
@@ -138,8 +158,21 @@ class Processor:
 
         # no warnings ...
         self.options.update(parsed_options)
+        self.stage = "input"
         self.data_string = self.data
 
+    def checkRemoteOptions(self) -> None:
+        """
+        refuse options that only local users may give
+
+        :return: None
+        """
+        for key, name in _local_options.items():
+            if self.options.get(key):
+                raise common.MCFError(
+                    f"Option --{name} is only available on the command line"
+                )
+
     def process(self) -> molecule.Molecule:
         """
         process input from both web form and CLI
@@ -150,10 +183,24 @@ class Processor:
             self.parseInputCli()
         else:
             self.parseInputWeb()
+        if self.web_form or self.rpc:
+            self.checkRemoteOptions()
         # let toolkit parse the molecule, and process it
-        tk_mol = self.parseMolecule()
+        self.stage = "load"
+        known = known_failure(self.data_string, self.options)
+        if known is not None:
+            self.stage = known.stage
+            raise KnownFailure(known)
+
+        try:
+            tk_mol = self.parseMolecule()
 
-        mol = molecule.Molecule(self.options, tk_mol)
+            self.stage = "render"
+            mol = molecule.Molecule(self.options, tk_mol)
+
+        except common.MCFError as error:
+            remember_failure(self.data_string, self.options, self.stage, error)
+            raise
 
         return mol
 
@@ -167,40 +214,215 @@ class Processor:
 
         :return: IndigoObject
         """
-        raw_input = self.data_string
+        return load_molecule(self.data_string, self.options)
 
-        try:
-            pubchem_id = int(raw_input)
-        except ValueError:
-            pubchem_id = None
 
-        if pubchem_id is not None:
-            try:
-                url = common.pubchem_url % pubchem_id
-                pubchem_content = request.urlopen(url).read()
-            except IOError:
-                raise common.MCFError("No connection to PubChem")
+def load_molecule(
+    data: str, options: Dict[str, Any]
+) -> Union[IndigoObject, molfile.MolfileMolecule]:
+    """
+    turn the input into a toolkit molecule according to user settings;
+    backend for Processor.parseMolecule
 
-            self.data_string = pubchem_content.decode()
+    :param data: molecule data, or PubChem index
+    :param options: option dict
+    :return: IndigoObject, or MolfileMolecule if read by the Python reader
+    """
+    try:
+        pubchem_id = int(data)
+    except ValueError:
+        pubchem_id = None
 
+    if pubchem_id is not None:
         try:
-            tkmol = Indigo().loadMolecule(self.data_string)
-        except IndigoException:
-            raise common.MCFError("Invalid input data")
+            url = common.pubchem_url % pubchem_id
+            pubchem_content = request.urlopen(url).read()
+        except HTTPError as error:
+            if 400 <= error.code < 500:  # PubChem answered, but won't serve it
+                raise common.MCFError(f"PubChem has no compound {pubchem_id}")
+            raise common.TransientError("No connection to PubChem")
+        except IOError:
+            raise common.TransientError("No connection to PubChem")
+
+        data = pubchem_content.decode()
+
+    # molfiles with coordinates may be read without the toolkit
+    reader = options["reader"]
+    fast_mol = molfile.read_fast(data, options) if reader != "indigo" else None
+
+    if fast_mol is not None and reader == "python":
+        return fast_mol
+
+    tkmol = toolkit_molecule(data, options)
+
+    if fast_mol is not None:  # validate
+        molfile.validate(fast_mol, tkmol)
+
+    return tkmol
+
 
-        hydrogens = self.options["hydrogens"]
+def toolkit_molecule(data: str, options: Dict[str, Any]) -> IndigoObject:
+    """
+    read molecule data with the toolkit, and apply hydrogen
+    and layout options
+
+    :param data: molecule data
+    :param options: option dict
+    :return: IndigoObject
+    """
+    # a molecule laid out before can be restored without parsing
+    # and layout, if the user keeps a layout cache
+    layout_cache = cache.layout_cache(options)
+    if layout_cache is not None:
+        cache_key = layout_cache.key(data, options)
+        tkmol = layout_cache.get(cache_key)
+        if tkmol is not None:
+            return tkmol
+
+    try:
+        tkmol = common.indigo().loadMolecule(data)
+    except IndigoException:
+        raise common.MCFError("Invalid input data")
+
+    hydrogens = options["hydrogens"]
+    laid_out = not tkmol.hasCoord() or options["recalculate_coordinates"]
+
+    if hydrogens in ("add", "place"):
+        count = tkmol.countAtoms()
+        tkmol.unfoldHydrogens()
 
         if hydrogens == "add":
-            tkmol.unfoldHydrogens()
-            tkmol.layout()  # needed to give coordinates to added Hs
+            laid_out = True  # needed to give coordinates to added Hs
+        elif not laid_out:
+            place_hydrogens(tkmol, count)
 
-        elif hydrogens == "delete":
-            tkmol.foldHydrogens()
+    elif hydrogens == "delete":
+        tkmol.foldHydrogens()
 
-        if not tkmol.hasCoord() or self.options["recalculate_coordinates"]:
+    if laid_out:
+        if options["layout"] != "simple" or not layout.simple_layout(tkmol):
             tkmol.layout()
 
-        return tkmol
+    if laid_out and layout_cache is not None:
+        layout_cache.put(cache_key, tkmol)
+
+    return tkmol
+
+
+def free_angles(angles: List[float], count: int) -> List[float]:
+    """
+    directions for new bonds at an atom. Each one goes into the free
+    sector between existing bonds that leaves the widest angle.
+
+    :param angles: sorted angles of existing bonds, in degrees
+    :param count: number of new bonds
+    :return: angles of new bonds
+    """
+    if not angles:
+        return [360.0 * i / count for i in range(count)]
+
+    # [start, width, number of new bonds]
+    sectors = [
+        [angle, (angles[(i + 1) % len(angles)] - angle) % 360 or 360, 0]
+        for i, angle in enumerate(angles)
+    ]
+
+    for _ in range(count):
+        sector = max(sectors, key=lambda sector: sector[1] / (sector[2] + 1))
+        sector[2] += 1
+
+    return [
+        start + width * (i + 1) / (n + 1)
+        for start, width, n in sectors
+        for i in range(n)
+    ]
+
+
+def place_hydrogens(tkmol: IndigoObject, count: int) -> None:
+    """
+    give coordinates to the hydrogen atoms added by unfoldHydrogens,
+    leaving all other atoms where they are
+
+    :param tkmol: molecule with unfolded hydrogens
+    :param count: number of atoms before unfolding; atoms
+                  with this index or higher are the new hydrogens
+    :return: None
+    """
+    xyz = [atom.xyz() for atom in tkmol.iterateAtoms()]
+
+    lengths = []
+    for bond in tkmol.iterateBonds():
+        source, destination = bond.source().index(), bond.destination().index()
+        if source < count and destination < count:
+            dx, dy, dz = (a - b for a, b in zip(xyz[source], xyz[destination]))
+            lengths.append(math.sqrt(dx * dx + dy * dy + dz * dz))
+    length = sum(lengths) / len(lengths) if lengths else 1.0
+
+    added = defaultdict(list)  # parent atom index -> new hydrogens
+    for idx in range(count, len(xyz)):
+        atom = tkmol.getAtom(idx)
+        added[next(atom.iterateNeighbors()).index()].append(atom)
+
+    for parent, hydrogens in added.items():
+        x, y, z = xyz[parent]
+        neighbors = [
+            neighbor.index()
+            for neighbor in tkmol.getAtom(parent).iterateNeighbors()
+            if neighbor.index() < count
+        ]
+        angles = sorted(
+            math.degrees(math.atan2(xyz[idx][1] - y, xyz[idx][0] - x)) % 360
+            for idx in neighbors
+        )
+
+        for atom, angle in zip(hydrogens, free_angles(angles, len(hydrogens))):
+            angle = math.radians(angle)
+            atom.setXYZ(x + length * math.cos(angle), y + length * math.sin(angle), z)
+
+
+def known_failure(data: str, options: Dict[str, Any]) -> Optional[common.ErrorResult]:
+    """
+    look up an input in the error cache, if the user keeps one
+
+    :param data: molecule data, or PubChem index
+    :param options: option dict
+    :return: the earlier failure, or None
+    """
+    error_cache = cache.error_cache(options)
+    if error_cache is None:
+        return None
+    return error_cache.get(error_cache.key(data, options))
+
+
+def remember_failure(
+    data: str, options: Dict[str, Any], stage: str, error: common.MCFError
+) -> None:
+    """
+    put a failed input into the error cache, if the user keeps one,
+    unless the error may not recur
+
+    :param data: molecule data, or PubChem index
+    :param options: option dict
+    :param stage: stage the conversion failed in
+    :param error: the error
+    :return: None
+    """
+    error_cache = cache.error_cache(options)
+    if error_cache is not None and not isinstance(error, common.TransientError):
+        result = common.ErrorResult.from_exception(error, stage)
+        error_cache.put(error_cache.key(data, options), result)
+
+
+def convert(data: str, options: Dict[str, Any]) -> molecule.Molecule:
+    """
+    convert molecule data with parsed options, bypassing
+    argument parsing. Used by batch mode.
+
+    :param data: molecule data, or PubChem index
+    :param options: option dict
+    :return: a molecule
+    """
+    return molecule.Molecule(options, load_molecule(data, options))
 
 
 def process(
@@ -211,7 +433,8 @@ def process(
     web_form: bool = False,
     rpc: bool = False,
     inline: bool = False,
-) -> Tuple[bool, Union[str, molecule.Molecule]]:
+    structured: bool = False,
+) -> Tuple[bool, Union[str, molecule.Molecule, common.ErrorResult]]:
     """
     process is a convenience wrapper for external callers
 
@@ -222,23 +445,58 @@ def process(
     :param web_form: whether is web form
     :param rpc: rpc
     :param inline: inline mode: if true return the raw result else the decorated result
-    :return: (bool, molecule)
+    :param structured: return errors as ErrorResult, without traceback,
+                       rather than as message or traceback text
+    :return: (bool, molecule or error)
     """
     p = Processor(raw_args, data, form_fields, program_name, web_form, rpc)
 
     try:
         mol = p.process()
 
-    except HelpError as msg:
-        return False, str(msg)
+    except Exception as error:
+        anticipated = isinstance(error, common.MCFError)
+        if isinstance(error, KnownFailure):
+            result = error.result
+        else:
+            result = common.ErrorResult.from_exception(
+                error, p.stage, with_trace=not (anticipated or structured)
+            )
+
+        if structured:
+            return False, result
+        if isinstance(error, HelpError):
+            return False, result.message
+        if anticipated:  # brief message enough
+            return False, result.message if inline else f"\033[0;31m{result}\033[0m"
+        return False, result.trace  # unexpected error - full traceback
 
-    except common.MCFError:  # anticipated error - brief message enough
-        msg = traceback.format_exc().splitlines()[-1]
-        msg = msg.split(": ")[-1]
-        return False, msg if inline else f"\033[0;31m{msg}\033[0m"
+    return True, mol
 
-    except Exception:  # unexpected error - get full traceback
-        tb = traceback.format_exc()
-        return False, tb
 
-    return True, mol
+def try_convert(
+    data: str, options: Dict[str, Any], with_trace: bool = False
+) -> Tuple[bool, Union[molecule.Molecule, common.ErrorResult]]:
+    """
+    like convert, but errors are returned rather than raised
+
+    :param data: molecule data, or PubChem index
+    :param options: option dict
+    :param with_trace: whether to keep tracebacks of errors
+    :return: (bool, molecule or error)
+    """
+    known = known_failure(data, options)
+    if known is not None:
+        return False, known
+
+    stage = "load"
+
+    try:
+        tkmol = load_molecule(data, options)
+        stage = "render"
+        return True, molecule.Molecule(options, tkmol)
+
+    except Exception as error:
+        if isinstance(error, common.MCFError):
+            remember_failure(data, options, stage, error)
+        return False, common.ErrorResult.from_exception(error, stage, with_trace)
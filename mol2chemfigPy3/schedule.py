@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""
+cost-aware scheduling for batch mode: a cheap estimate of how long a
+record will take, from its text alone, drives the order in which
+records are handed out, how many go into one task, and how long a task
+may take before it is given up on.
+"""
+import re
+import threading
+from typing import List, Any, Iterable, Iterator
+
+SCHEDULE_LOOKAHEAD = 100  # records sorted at a time, per job
+RING_COST = 5.0  # a ring costs as much as this many atoms or bonds
+DEFAULT_COST = 40.0  # cost of records that give nothing away, e.g. PubChem indices
+CHUNK_COST = 400.0  # records up to this total cost go into one task
+SECONDS_PER_COST = 2e-4  # starting guess for the rate, until timings come in
+TIMEOUT_FACTOR = 20.0  # give a task this many times its predicted time ...
+MIN_TIMEOUT = 10.0  # ... but at least this many seconds
+HISTORY_WEIGHT = 0.1  # weight of each new timing in the running rate
+
+_smiles_atom = re.compile(r"\[[^]]*]|Cl|Br|[BCNOPSFI]|[bcnops]")
+_smiles_ring = re.compile(r"%\d\d|\d")
+_smiles_bracket = re.compile(r"\[[^]]*]")
+_v3000_counts = re.compile(r"M  V30 COUNTS (\d+) (\d+)")
+
+
+def estimate_cost(data: str) -> float:
+    """
+    estimate the effort of converting a record from the number of its
+    atoms, bonds and rings. Molfiles state the first two in their counts
+    line; for SMILES, they are counted roughly, without parsing.
+
+    :param data: molecule data
+    :return: cost, in units of about one atom
+    """
+    lines = data.strip().splitlines()
+
+    if len(lines) > 3:  # molfile
+        match = _v3000_counts.search(data)
+        try:
+            if match is not None:
+                atoms, bonds = int(match.group(1)), int(match.group(2))
+            else:
+                atoms, bonds = int(lines[3][0:3]), int(lines[3][3:6])
+        except ValueError:
+            return DEFAULT_COST
+        rings = max(0, bonds - atoms + 1)
+
+    elif lines and not lines[0].isdigit() and not lines[0].startswith("InChI="):
+        smiles = lines[0].split()[0]
+        atoms = len(_smiles_atom.findall(smiles))
+        rings = len(_smiles_ring.findall(_smiles_bracket.sub("", smiles))) // 2
+        bonds = max(0, atoms - 1) + rings
+
+    else:
+        return DEFAULT_COST
+
+    return atoms + bonds + RING_COST * rings
+
+
+class CostModel:
+    """
+    turns costs into predicted seconds, using a running average of the
+    seconds per unit of cost observed so far, and from these derives
+    time limits for tasks. Safe to share between threads.
+    """
+
+    def __init__(self, seconds_per_cost: float = SECONDS_PER_COST) -> None:
+        self.seconds_per_cost = seconds_per_cost
+        self._lock = threading.Lock()
+
+    def predict(self, cost: float) -> float:
+        """
+        :param cost: estimated cost
+        :return: predicted seconds
+        """
+        return cost * self.seconds_per_cost
+
+    def timeout(self, cost: float) -> float:
+        """
+        :param cost: estimated cost
+        :return: seconds to allow
+        """
+        return max(MIN_TIMEOUT, TIMEOUT_FACTOR * self.predict(cost))
+
+    def update(self, cost: float, seconds: float) -> None:
+        """
+        learn from a timing
+
+        :param cost: estimated cost of the task
+        :param seconds: time it took
+        :return: None
+        """
+        if cost <= 0:
+            return
+        with self._lock:
+            self.seconds_per_cost += HISTORY_WEIGHT * (
+                seconds / cost - self.seconds_per_cost
+            )
+
+
+class Chunk:
+    """
+    records converted in one task
+    """
+
+    def __init__(self) -> None:
+        self.records: List[Any] = []
+        self.costs: List[float] = []
+
+    @property
+    def cost(self) -> float:
+        """
+        :return: total estimated cost
+        """
+        return sum(self.costs)
+
+    def add(self, record: Any, cost: float) -> None:
+        """
+        :param record: record
+        :param cost: its estimated cost
+        :return: None
+        """
+        self.records.append(record)
+        self.costs.append(cost)
+
+
+def schedule(
+    records: Iterable[Any], lookahead: int, chunk_cost: float = CHUNK_COST
+) -> Iterator[Chunk]:
+    """
+    hand out records longest first, in chunks. Up to lookahead records
+    are read ahead and sorted by descending cost, so that big molecules
+    start early rather than hold up the end of a run. Each big molecule
+    is a chunk of its own, while small ones are packed together until
+    they reach chunk_cost, to save on overhead.
+
+    :param records: records, such as batch.Record, with data
+    :param lookahead: number of records to sort at a time
+    :param chunk_cost: cost of a full chunk
+    :return: iterator over chunks
+    """
+    buffer = []
+
+    def flush() -> Iterator[Chunk]:
+        buffer.sort(key=lambda pair: -pair[1])
+        chunk = Chunk()
+        for record, cost in buffer:
+            if chunk.records and chunk.cost + cost > chunk_cost:
+                yield chunk
+                chunk = Chunk()
+            chunk.add(record, cost)
+        if chunk.records:
+            yield chunk
+        buffer.clear()
+
+    for record in records:
+        buffer.append((record, estimate_cost(record.data)))
+        if len(buffer) >= lookahead:
+            yield from flush()
+
+    yield from flush()
@@ -0,0 +1,322 @@
+# -*- coding: utf-8 -*-
+"""
+tree conversion: convert all molecule files below a directory into a
+mirrored tree of .tex files, in one process. A manifest of what was
+converted lets the next run skip files that haven't changed.
+"""
+
+import glob
+import hashlib
+import json
+import os
+import re
+from typing import Union, Optional, Tuple, List, Dict, Any, TextIO
+from . import common, options
+from .processor import HelpError
+from .worker import Worker
+from .pipeline import run_pipeline
+from .batch import convert_record, new_worker, _worker_keys, _count_labels
+
+MANIFEST_NAME = ".mol2chemfig-manifest.json"
+MANIFEST_VERSION = 1
+
+_glob_magic = re.compile(r"[*?[]")
+
+
+class Source:
+    """
+    one input file and where its output goes
+    """
+
+    def __init__(self, path: str, name: str, target: str) -> None:
+        self.path = path
+        self.name = name  # relative to the top of the tree, as in the manifest
+        self.target = target
+
+
+def find_sources(source: str, destination: str) -> List[Source]:
+    """
+    the supported files below a directory, or those matching a glob
+    pattern, where '**' matches any number of directories. The output
+    tree mirrors the directory, or the part of the pattern before the
+    first wildcard.
+
+    :param source: directory or pattern
+    :param destination: top of the output tree
+    :return: sources, sorted by name
+    """
+    if os.path.isdir(source):
+        top = source
+        paths = [
+            os.path.join(folder, file_name)
+            for folder, _, file_names in os.walk(source)
+            for file_name in file_names
+        ]
+    else:
+        top = source[: _glob_magic.search(source + "*").start()]
+        top = top if top.endswith(os.sep) else os.path.dirname(top)
+        paths = glob.glob(source, recursive=True)
+
+    suffixes = tuple(common.supported_files.split())
+    sources, targets = [], {}
+    for path in sorted(paths):
+        if not path.lower().endswith(suffixes) or not os.path.isfile(path):
+            continue
+        name = os.path.relpath(path, top or os.curdir)
+        stem = name
+        if common.compression(stem, detect=False) is not None:
+            stem = os.path.splitext(stem)[0]
+        target = os.path.join(destination, os.path.splitext(stem)[0] + ".tex")
+
+        if target in targets:
+            raise common.MCFError(
+                f"Both {targets[target]} and {name} would be converted to {target}"
+            )
+        targets[target] = name
+        sources.append(Source(path, name, target))
+
+    return sources
+
+
+def source_key(data: bytes, opts: Dict[str, Any]) -> str:
+    """
+    a key of a file and of everything else that decides its output
+
+    :param data: file contents
+    :param opts: option dict
+    :return: hex digest
+    """
+    settings = repr(
+        (common.options_key(opts), common.program_version, common.indigo().version())
+    )
+    digest = hashlib.sha256(settings.encode("utf-8"))
+    digest.update(data)
+    return digest.hexdigest()
+
+
+def load_manifest(destination: str) -> Dict[str, str]:
+    """
+    :param destination: top of the output tree
+    :return: {input name: key from source_key} of the last run
+    """
+    try:
+        with open(os.path.join(destination, MANIFEST_NAME), encoding="utf-8") as fh:
+            manifest = json.load(fh)
+    except (OSError, ValueError):
+        return {}  # it's only a cache; without it, all files are converted
+    if manifest.get("version") != MANIFEST_VERSION:
+        return {}
+    return manifest["files"]
+
+
+def save_manifest(destination: str, files: Dict[str, str]) -> None:
+    """
+    :param destination: top of the output tree
+    :param files: {input name: key from source_key}
+    :return: None
+    """
+    path = os.path.join(destination, MANIFEST_NAME)
+    manifest = dict(version=MANIFEST_VERSION, files=dict(sorted(files.items())))
+    try:
+        os.makedirs(destination, exist_ok=True)
+        with open(path + ".tmp", mode="w", encoding="utf-8") as fh:
+            json.dump(manifest, fh, indent=0)
+        os.replace(path + ".tmp", path)
+    except OSError:
+        raise common.MCFError(f"Can't write file {path}")
+
+
+def write_if_changed(target: str, text: str) -> bool:
+    """
+    write a file, unless it already has this content, so that its time
+    stamp tells build tools like latexmk that nothing changed
+
+    :param target: file name
+    :param text: content
+    :return: whether the file was written
+    """
+    data = text.encode("utf-8")
+    try:
+        with open(target, mode="rb") as fh:
+            if fh.read() == data:
+                return False
+    except OSError:
+        pass
+
+    try:
+        os.makedirs(os.path.dirname(target) or os.curdir, exist_ok=True)
+        with open(target + ".tmp", mode="wb") as fh:
+            fh.write(data)
+        os.replace(target + ".tmp", target)
+    except OSError:
+        raise common.MCFError(f"Can't write file {target}")
+    return True
+
+
+def convert_source(
+    source: Source,
+    opts: Dict[str, Any],
+    manifest: Dict[str, str],
+    worker: Optional[Worker] = None,
+) -> Tuple[str, Union[str, common.ErrorResult, None]]:
+    """
+    convert one file, unless it is unchanged since the last run
+
+    :param source: Source
+    :param opts: option dict
+    :param manifest: result of load_manifest
+    :param worker: if given, convert in this worker process
+    :return: ('skipped', key), ('written', key), ('kept', key) if the
+             output didn't change, or ('failed', error)
+    """
+    try:
+        with open(source.path, mode="rb") as fh:
+            key = source_key(fh.read(), opts)
+    except OSError:
+        error = common.MCFError(f"Can't read file {source.path}")
+        return "failed", common.ErrorResult.from_exception(error, "input")
+
+    if (
+        not opts["force"]
+        and manifest.get(source.name) == key
+        and os.path.exists(source.target)
+    ):
+        return "skipped", key
+
+    try:
+        with common.open_text(source.path) as fh:
+            data = fh.read()
+    except common.read_errors:
+        error = common.MCFError(f"Can't read file {source.path}")
+        return "failed", common.ErrorResult.from_exception(error, "input")
+
+    success, result, _ = convert_record(data, opts, None, worker)
+    if not success:
+        return "failed", result
+
+    try:
+        written = write_if_changed(source.target, result + "\n")
+    except common.MCFError as error:
+        return "failed", common.ErrorResult.from_exception(error, "output")
+    return ("written" if written else "kept"), key
+
+
+def parse_args(
+    raw_args: Union[List[str], str, None], program_name: str
+) -> Tuple[Dict[str, Any], str, str]:
+    """
+    parse tree-conversion arguments
+
+    :param raw_args: arguments
+    :param program_name: program name
+    :return: (option dict, source, destination)
+    """
+    program_name = os.path.split(program_name)[-1]
+
+    if not raw_args:
+        raise HelpError(common.tree_help_text(program_name=program_name))
+
+    try:
+        parsed_options, paths = options.getTreeParser().process_cli(raw_args)
+    except Exception as msg:
+        if str(msg).endswith("not recognized"):  # get opt error
+            msg = (
+                f"{str(msg)}. Try {program_name} convert-tree "
+                "--help to see a list of available options."
+            )
+        raise HelpError(msg)
+
+    opts = dict(common.settings)
+    opts.update(parsed_options)
+
+    if opts["help"]:
+        raise HelpError(common.tree_help_text(program_name=program_name))
+    if opts["version"]:
+        raise HelpError(common.version_text(program_name=program_name))
+    if len(paths) != 2:
+        raise common.MCFError("Please give a source directory or pattern and a target")
+    if opts["pool"] == "thread" and any(opts[key] for key in _worker_keys):
+        raise common.MCFError(
+            "Threads can't be stopped or recycled; use --pool=process with "
+            "--timeout, --max-tasks, --max-rss or --memory-limit"
+        )
+
+    return opts, paths[0], paths[1]
+
+
+def process_tree(
+    raw_args: Union[List[str], str, None],
+    out: TextIO,
+    program_name: str = "mol2chemfigPy3",
+) -> Tuple[bool, str]:
+    """
+    convert all files of a tree, see find_sources, and write the
+    failures to out
+
+    :param raw_args: arguments
+    :param out: text sink for failures
+    :param program_name: program name
+    :return: (bool, summary or error message)
+    """
+    try:
+        opts, source, destination = parse_args(raw_args, program_name)
+        sources = find_sources(source, destination)
+        manifest = load_manifest(destination)
+        files = {s.name: manifest[s.name] for s in sources if s.name in manifest}
+        counts = {}  # restarts, recycles and requeued files of workers
+
+        def convert(item: Source, worker: Optional[Worker]) -> Tuple:
+            return convert_source(item, opts, manifest, worker)
+
+        worker = None
+        if opts["jobs"] > 1:
+            results = run_pipeline(
+                sources,
+                convert,
+                opts["jobs"],
+                (lambda: new_worker(opts)) if opts["pool"] == "process" else None,
+                ordered=False,
+                counts=counts,
+            )
+        else:
+            if any(opts[key] for key in _worker_keys):
+                worker = new_worker(opts)
+            results = ((item, convert(item, worker)) for item in sources)
+
+        done = {}  # 'written', 'kept', 'skipped' -> count
+        failures = {}  # 'kind in stage' -> count
+        try:
+            for item, (status, result) in results:
+                if status == "failed":
+                    key = f"{result.kind} in {result.stage}"
+                    failures[key] = failures.get(key, 0) + 1
+                    message = str(result).strip().splitlines() or [""]
+                    out.write(f"{item.name}: failed: {key}: {message[-1]}\n")
+                    files.pop(item.name, None)
+                else:
+                    done[status] = done.get(status, 0) + 1
+                    files[item.name] = result
+        finally:
+            if worker is not None:
+                worker.close()
+                counts = worker.counts()
+            save_manifest(destination, files)
+
+    except HelpError as msg:
+        return False, str(msg)
+
+    except common.MCFError as msg:
+        return False, f"\033[0;31m{msg}\033[0m"
+
+    converted = done.get("written", 0) + done.get("kept", 0)
+    summary = f"{converted} files converted, {sum(failures.values())} failed"
+    if failures:
+        summary += " (" + ", ".join(f"{n} {key}" for key, n in failures.items()) + ")"
+    if done.get("skipped"):
+        summary += f", {done['skipped']} skipped as unchanged"
+    if done.get("kept"):
+        summary += f", {done['kept']} outputs unchanged"
+    for name, label in _count_labels:
+        if counts.get(name):
+            summary += f", {counts[name]} {label}"
+    return True, summary
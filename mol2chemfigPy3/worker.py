@@ -0,0 +1,302 @@
+# -*- coding: utf-8 -*-
+"""
+conversions in a supervised child process, which can be killed and
+replaced if a conversion takes too long or brings the process down,
+and is recycled before it grows too large.
+"""
+
+import multiprocessing
+import os
+import sys
+from multiprocessing.connection import Connection
+from typing import Union, Optional, Tuple, List, Dict, Any, Callable
+from . import common
+from .processor import process
+
+try:
+    import resource
+except ImportError:  # not on Windows; without it, memory limits are off
+    resource = None
+
+
+# worker processes are started from a single-threaded server where there
+# is one, rather than forked from a process that may be running threads,
+# so anything sent to them must be importable by name
+if "forkserver" in multiprocessing.get_all_start_methods():
+    _context = multiprocessing.get_context("forkserver")
+    _context.set_forkserver_preload([__name__])
+else:
+    _context = multiprocessing.get_context("spawn")
+
+
+class WorkerError(common.MCFError):
+    """
+    the worker process died while converting
+    """
+
+
+class WorkerTimeout(WorkerError):
+    """
+    a conversion took longer than allowed, and the worker was killed
+    """
+
+
+def rss() -> int:
+    """
+    resident memory of this process. Where the current size can't be
+    read, as outside Linux, the peak size is used instead.
+
+    :return: size in bytes
+    """
+    try:
+        with open("/proc/self/statm", mode="r") as fh:
+            return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+
+    if resource is None:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024  # bytes, or KiB
+
+
+def _serve(
+    conn: Connection,
+    max_tasks: Optional[int] = None,
+    max_rss: Optional[int] = None,
+    memory_limit: Optional[int] = None,
+) -> None:
+    """
+    main loop of the worker process: run the tasks received through
+    conn and send back (True, result, retire) or (False, exception,
+    retire), until told to stop with None. With retire set, the worker
+    has ended after this task, as it ran max_tasks of them, grew beyond
+    max_rss bytes or ran out of memory.
+
+    :param conn: connection to the supervisor
+    :param max_tasks: number of tasks to run before retiring
+    :param max_rss: resident memory in bytes to retire at
+    :param memory_limit: address space in bytes the process may use
+    :return: None
+    """
+    if memory_limit and resource is not None:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+
+    tasks = 0
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:  # supervisor gone
+            return
+
+        if task is None:
+            return
+
+        function, args = task
+        try:
+            success, result = True, function(*args)
+        except Exception as error:
+            success, result = False, error
+
+        tasks += 1
+        retire = (
+            isinstance(result, MemoryError)
+            or (max_tasks and tasks >= max_tasks)
+            or (max_rss and rss() > max_rss)
+        )
+        conn.send((success, result, bool(retire)))
+
+        if retire:
+            return
+
+
+class Worker:
+    """
+    runs functions in a child process, started on first use. If a call
+    takes longer than timeout seconds, the process is killed; the next
+    call starts a new one. Arguments and results must be picklable, and
+    functions defined at module level of an importable module.
+
+    Native memory that Indigo doesn't give back accumulates over many
+    calls, so the process can be recycled after max_tasks calls, or
+    once its resident memory exceeds max_rss bytes. memory_limit caps
+    its address space, where the platform allows. A call that the
+    process dies on, or runs out of memory in, is tried once more in a
+    new process; one that times out is not.
+    """
+
+    def __init__(
+        self,
+        timeout: Optional[float] = None,
+        max_tasks: Optional[int] = None,
+        max_rss: Optional[int] = None,
+        memory_limit: Optional[int] = None,
+    ) -> None:
+        self.timeout = timeout
+        self.max_tasks = max_tasks
+        self.max_rss = max_rss
+        self.memory_limit = memory_limit
+        self.restarts = 0  # number of processes killed or died
+        self.recycles = 0  # number of processes retired in good order
+        self.requeued = 0  # number of calls tried again
+        self._process = None
+        self._conn = None
+
+    def start(self) -> None:
+        """
+        :return: None
+        """
+        self._conn, child_conn = _context.Pipe()
+        self._process = _context.Process(
+            target=_serve,
+            args=(child_conn, self.max_tasks, self.max_rss, self.memory_limit),
+            daemon=True,
+        )
+        self._process.start()
+        child_conn.close()
+
+    def _retire(self) -> None:
+        """
+        wait for a worker process that ends by itself
+
+        :return: None
+        """
+        self._process.join()
+        self._conn.close()
+        self._process = self._conn = None
+        self.recycles += 1
+
+    def kill(self) -> Optional[int]:
+        """
+        end the worker process at once
+
+        :return: its exit code
+        """
+        self._process.kill()
+        self._process.join()
+        self._conn.close()
+        code = self._process.exitcode
+        self._process = self._conn = None
+        self.restarts += 1
+        return code
+
+    def run(
+        self, function: Callable, *args: Any, timeout: Optional[float] = None
+    ) -> Any:
+        """
+        run function(*args) in the worker process
+
+        :param function: module-level function
+        :param args: arguments
+        :param timeout: time limit for this call, instead of self.timeout
+        :return: its result; exceptions are raised again here
+        """
+        try:
+            return self._call(function, args, timeout)
+        except WorkerTimeout:
+            raise
+        except (WorkerError, MemoryError):
+            self.requeued += 1
+            return self._call(function, args, timeout)
+
+    def _call(
+        self, function: Callable, args: Tuple, timeout: Optional[float] = None
+    ) -> Any:
+        """
+        run function(*args) once, see run
+
+        :param function: module-level function
+        :param args: arguments
+        :param timeout: time limit for this call, instead of self.timeout
+        :return: its result
+        """
+        if timeout is None:
+            timeout = self.timeout
+
+        if self._process is None:
+            self.start()
+
+        try:
+            self._conn.send((function, args))
+        except OSError:  # died while idle, e.g., killed for lack of memory
+            raise WorkerError(f"Worker process died with exit code {self.kill()}")
+
+        # poll also returns if the process died, and recv then fails
+        if timeout is not None and not self._conn.poll(timeout):
+            self.kill()
+            raise WorkerTimeout(f"Conversion took longer than {timeout:g} s")
+
+        try:
+            success, result, retire = self._conn.recv()
+        except EOFError:
+            raise WorkerError(f"Worker process died with exit code {self.kill()}")
+
+        if retire:
+            self._retire()
+
+        if not success:
+            raise result
+        return result
+
+    def counts(self) -> Dict[str, int]:
+        """
+        :return: {'restarts': n, 'recycles': n, 'requeued': n}
+        """
+        return dict(
+            restarts=self.restarts, recycles=self.recycles, requeued=self.requeued
+        )
+
+    def close(self) -> None:
+        """
+        stop the worker process
+
+        :return: None
+        """
+        if self._process is not None:
+            try:
+                self._conn.send(None)
+            except OSError:  # already gone
+                pass
+            self._process.join()
+            self._conn.close()
+            self._process = self._conn = None
+
+    def __enter__(self) -> "Worker":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+
+def render(
+    raw_args: Union[List[str], str], data: Optional[str] = None
+) -> Tuple[bool, Union[str, common.ErrorResult]]:
+    """
+    convert like processor.process, but return the code rather than
+    the molecule, which can't be sent between processes. For use with
+    Worker.run, e.g., in a service.
+
+    :param raw_args: arguments
+    :param data: data
+    :return: (bool, code or error)
+    """
+    success, result = process(raw_args, data, inline=True, structured=True)
+    return success, result.render_user() if success else result
+
+
+def try_render(
+    worker: Worker, raw_args: Union[List[str], str], data: Optional[str] = None
+) -> Tuple[bool, Union[str, common.ErrorResult]]:
+    """
+    like render, but in the worker; a timeout or a crash of the
+    worker is returned as error in stage 'convert'
+
+    :param worker: Worker
+    :param raw_args: arguments
+    :param data: data
+    :return: (bool, code or error)
+    """
+    try:
+        return worker.run(render, raw_args, data)
+    except WorkerError as error:
+        return False, common.ErrorResult.from_exception(error, "convert")
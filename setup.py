@@ -36,6 +36,7 @@ setup(
     packages=find_packages(),
     python_requires=">=3.7",
     install_requires=["epam.indigo", "colorama;platform_system=='Windows'"],
+    extras_require={"numpy": ["numpy"]},
     project_urls={"Source": "https://github.com/Augus1999/mol2chemfigPy3"},
     classifiers=[
         "Development Status :: 5 - Production/Stable",
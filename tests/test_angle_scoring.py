@@ -0,0 +1,69 @@
+import random
+import pytest
+from mol2chemfigPy3 import atom
+from mol2chemfigPy3.atom import Atom
+from mol2chemfigPy3.processor import process
+
+np = pytest.importorskip("numpy")
+
+angle_sets = [
+    [],
+    [0],
+    [90, 270],  # east and west tie
+    [0, 180],
+    [45, 135, 225, 315],  # all quadrants tie
+    [0, 60, 120, 180, 240, 300],
+    [15, 165, 90, 270, 345, 195],  # all charge positions taken
+    [0, 45, 90, 135, 180, 225, 270, 315],
+    [359.5, 180.25, 89.75],
+]
+random.seed(0)
+angle_sets += [
+    [
+        random.choice([random.uniform(0, 360), 30 * random.randrange(12)])
+        for _ in range(n)
+    ]
+    for n in range(1, 9)
+    for _ in range(10)
+]
+
+smiles = [
+    "C[N+](C)(C)C",
+    "FS(F)(F)(F)(F)F",
+    "CC(C)(C)C(C)(C)C",
+    "[NH3+]CC([O-])=O",
+    "OC(=O)C(Cl)(Br)C([O-])[CH2]",
+    "[Na+].[Cl-]",
+]
+
+
+def positions(atoms):
+    return [(a.first_quadrant, a.second_quadrant, a.charge_angle) for a in atoms]
+
+
+def make_atoms():
+    atoms = []
+    for idx, angles in enumerate(angle_sets):
+        new = Atom({}, idx, 0, 0, "O" if idx % 2 else "C", 1, 1, 0, [])
+        new.bond_angles = list(angles)
+        atoms.append(new)
+    return atoms
+
+
+def test_rank_angles():
+    scored = make_atoms()
+    Atom.score_all_angles(scored)
+    expected = make_atoms()
+    for each in expected:
+        each.score_angles()
+    assert positions(scored) == positions(expected)
+
+
+@pytest.mark.parametrize("data", smiles)
+def test_molecules(monkeypatch, data):
+    args = f"-zwi direct {data}"
+    vectorised = process(args)[1]
+    monkeypatch.setattr(atom, "np", None)
+    fallback = process(args)[1]
+    assert positions(vectorised.atoms.values()) == positions(fallback.atoms.values())
+    assert vectorised.render_user() == fallback.render_user()
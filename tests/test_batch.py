@@ -0,0 +1,107 @@
+import io
+import pytest
+from mol2chemfigPy3.batch import process_batch, process_merge
+
+smiles = """C1=CC=C(C=C1)O phenol
+Oc1ccccc1 phenol again
+xyz
+CCO
+# comment
+CCO ethanol
+"""
+target = r"""% 1: phenol
+\chemfig{OH-[:180,,1]=_[:240]-[:180]=_[:120]-[:60]=_(-[:300])}
+
+% 2: phenol again
+\chemfig{HO-[,,2]-[:300,,,,mcfwavy]-[,,,,mcfwavy]-[:60,,,,mcfwavy]%
+-[:120,,,,mcfwavy]-[:180,,,,mcfwavy](-[:240,,,,mcfwavy])}
+
+% 3
+% failed: MCFError in load
+% Invalid input data
+
+% 4
+\chemfig{-[:330]-[:30,,,1]OH}
+
+% 5: ethanol
+\chemfig{-[:330]-[:30,,,1]OH}
+
+"""
+
+
+def test(tmp_path):
+    with open(tmp_path / "mol.smi", "w") as f:
+        f.write(smiles)
+    out = io.StringIO()
+    success, summary = process_batch(["-zw", str(tmp_path / "mol.smi")], out)
+    assert success
+    assert summary == "5 records converted, 1 failed (1 MCFError in load)"
+    assert out.getvalue() == target
+
+
+def test_structure(tmp_path):
+    codes = []
+    for lines in (smiles.splitlines(), smiles.splitlines()[::-1]):
+        with open(tmp_path / "mol.smi", "w") as f:
+            f.write("\n".join(lines))
+        out = io.StringIO()
+        process_batch(["-zwD", "structure", str(tmp_path / "mol.smi")], out)
+        records = [record.split("\n", 1) for record in out.getvalue().split("\n\n")]
+        codes.append({r[0].split(": ")[-1]: r[1] for r in records if "phenol" in r[0]})
+    # the same drawing for all duplicates, whichever comes first
+    assert codes[0] == codes[1]
+    assert codes[0]["phenol"] == codes[0]["phenol again"]
+    assert codes[0]["phenol"] == (
+        r"\chemfig{HO-[,,2]-[:300]=^-[:60]=^[:120]-[:180](=^[:240])}"
+    )
+
+
+@pytest.mark.parametrize("shards", [1, 2, 3, 7])
+def test_shards(tmp_path, shards):
+    with open(tmp_path / "mol.smi", "w") as f:
+        f.write(smiles)
+    args = ["-zwD", "exact", str(tmp_path / "mol.smi")]
+    whole = io.StringIO()
+    process_batch(args, whole)
+
+    outputs = []
+    for shard in range(1, shards + 1):
+        outputs.append(str(tmp_path / f"shard-{shard}.tex"))
+        with open(outputs[-1], "w") as out:
+            process_batch(["-H", f"{shard}/{shards}"] + args, out)
+    out = io.StringIO()
+    success, summary = process_merge(outputs, out)
+    assert summary == f"5 records merged from {shards} files"
+    assert out.getvalue() == whole.getvalue()
+
+
+@pytest.mark.parametrize("ext", [".gz", ".bz2", ".xz"])
+def test_merge_compressed(tmp_path, ext):
+    with open(tmp_path / "mol.smi", "w") as f:
+        f.write(smiles)
+    args = ["-zw", str(tmp_path / "mol.smi")]
+    whole = io.StringIO()
+    process_batch(args, whole)
+
+    outputs = [str(tmp_path / f"shard-{shard}.tex{ext}") for shard in (1, 2)]
+    for shard, output in enumerate(outputs, 1):
+        process_batch(["-H", f"{shard}/2", "-O", output] + args, io.StringIO())
+    out = io.StringIO()
+    success, summary = process_merge(outputs, out)
+    assert summary == "5 records merged from 2 files"
+    assert out.getvalue() == whole.getvalue()
+
+    with open(outputs[0], "r+b") as f:
+        f.truncate(30)
+    success, summary = process_merge(outputs, io.StringIO())
+    assert not success and "Can't read file" in summary
+
+
+def test_shard_errors(tmp_path):
+    success, summary = process_batch(["-H", "3/2", "mol.smi"], io.StringIO())
+    assert "--shard must be I/N with 1 <= I <= N, not 3/2" in summary
+
+    with open(tmp_path / "unordered.tex", "w") as f:
+        f.write(target.replace("% 1: phenol", "% 6: phenol"))
+    success, summary = process_merge([str(tmp_path / "unordered.tex")], io.StringIO())
+    assert "is not in record order" in summary
@@ -0,0 +1,32 @@
+import pytest
+from mol2chemfigPy3 import mol2chemfig
+
+target1 = r"""\chemfig{@{b1}-[@{b1-2}:347,,,,dlhe]@{b2}-[@{b2-3}::60]@{b3}%
+-[@{b3-4}::300,,,,dlh]@{b4}-[@{b4-5}::60]@{b5}-[@{b5-6}::300,,,,drhs]@{b6}}"""
+target2 = r"""\chemfig{@{b1}-[@{b1-2}:17,,,,trpl={0}{0}]@{b2}-[@{b2-3}::0]@{b3}(%
+-[@{b3-4}::300]@{b4})-[@{b3-5}::60,,,1]@{b5}OH}"""
+target3 = r"""\chemfig{-[:3.4,,,,draw=none]-[:88.8,0.978]-[:147.8,1.039]-[:185.4,0.918]%
+-[:320.2,0.973](-[:271.8,0.882])-[:25.1,1.887](-[:224.2,0.925])(%
+-[:225,2.379,,,draw=none]-[:3.4,,,,mcfx={10}{10}])}"""
+
+
+@pytest.mark.parametrize(
+    "input_value,arg,rotate_,marker_,relative_angle_,expected",
+    [
+        ("C=CC=CC=C", "-f", 17, "b", True, target1),
+        ("C#CC(C)O", "-f", 17, "b", True, target2),
+        ("C1CC2CCC1C2", "-k 1-2", 0, None, False, target3),
+    ],
+)
+def test(input_value, arg, rotate_, marker_, relative_angle_, expected):
+    assert (
+        mol2chemfig(
+            input_value,
+            arg,
+            rotate=rotate_,
+            marker=marker_,
+            relative_angle=relative_angle_,
+            inline=True,
+        )
+        == expected
+    )
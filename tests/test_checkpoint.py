@@ -0,0 +1,86 @@
+import io
+import os
+import pytest
+from mol2chemfigPy3 import batch
+from mol2chemfigPy3.batch import process_batch
+from mol2chemfigPy3.checkpoint import Checkpoint
+
+smiles = """c1ccccc1O phenol
+xyz
+CCO
+CCO ethanol
+OC(=O)c1ccccc1 benzoic acid
+CCN
+"""
+
+summary = "6 records converted, 1 failed (1 MCFError in load)"
+
+
+def test_ranges(tmp_path):
+    checkpoint = Checkpoint(str(tmp_path / "out.tex"), "job")
+    for index in (5, 1, 3, 2, 9, 4, 10):
+        checkpoint._add(index)
+    assert checkpoint.done == [[1, 5], [9, 10]]
+    assert [i for i in range(12) if i in checkpoint] == [1, 2, 3, 4, 5, 9, 10]
+
+
+class Interrupt(Exception):
+    pass
+
+
+def interrupted_format(record, *args):
+    if record.index == 4:
+        raise Interrupt
+    return format_result(record, *args)
+
+
+format_result = batch.format_result
+
+
+@pytest.mark.parametrize("extra", [[], ["-J", "2", "-U"], ["-S", "cost"]])
+def test_resume(tmp_path, monkeypatch, extra):
+    with open(tmp_path / "mol.smi", "w") as f:
+        f.write(smiles)
+    out_file = str(tmp_path / "out.tex")
+    args = ["-zwD", "exact", "-Y", "2", "-O", out_file, str(tmp_path / "mol.smi")]
+
+    success, result = process_batch(args, io.StringIO())
+    assert result == summary
+    assert not os.path.exists(out_file + ".checkpoint")
+    with open(out_file) as f:
+        complete = f.read()
+
+    monkeypatch.setattr(batch, "format_result", interrupted_format)
+    with pytest.raises(Interrupt):
+        process_batch(extra + args, io.StringIO())
+    assert os.path.exists(out_file + ".checkpoint")
+    with open(out_file, "a") as f:
+        f.write("% 7: half-written")  # as if the run was killed
+    monkeypatch.undo()
+
+    success, result = process_batch(extra + ["-K"] + args, io.StringIO())
+    assert result == summary
+    with open(out_file) as f:
+        resumed = f.read()
+    if extra:
+        assert sorted(resumed.split("\n\n")) == sorted(complete.split("\n\n"))
+    else:
+        assert resumed == complete
+
+
+def test_resume_errors(tmp_path, monkeypatch):
+    with open(tmp_path / "mol.smi", "w") as f:
+        f.write(smiles)
+    out_file = str(tmp_path / "out.tex")
+    args = ["-zw", "-Y", "1", "-O", out_file, str(tmp_path / "mol.smi")]
+
+    monkeypatch.setattr(batch, "format_result", interrupted_format)
+    with pytest.raises(Interrupt):
+        process_batch(args, io.StringIO())
+    monkeypatch.undo()
+
+    success, result = process_batch(["-K", "-c"] + args, io.StringIO())
+    assert "belongs to a run with other input files or options" in result
+
+    success, result = process_batch(["-K", str(tmp_path / "mol.smi")], io.StringIO())
+    assert "Only runs with --output can be resumed" in result
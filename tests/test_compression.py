@@ -0,0 +1,89 @@
+import bz2
+import gzip
+import io
+import lzma
+import pytest
+from mol2chemfigPy3 import batch
+from mol2chemfigPy3.batch import process_batch, process_index, record_format
+from mol2chemfigPy3.processor import process
+
+smiles = """c1ccccc1O phenol
+xyz
+CCO
+CCO ethanol
+OC(=O)c1ccccc1 benzoic acid
+CCN
+"""
+
+modules = {".gz": gzip, ".bz2": bz2, ".xz": lzma}
+
+
+class Interrupt(Exception):
+    pass
+
+
+format_result = batch.format_result
+
+
+def interrupted_format(record, *args):
+    if record.index == 5:
+        raise Interrupt
+    return format_result(record, *args)
+
+
+@pytest.mark.parametrize("ext", list(modules))
+def test_batch(tmp_path, monkeypatch, ext):
+    module = modules[ext]
+    with open(tmp_path / "mol.smi", "w") as f:
+        f.write(smiles)
+    with module.open(tmp_path / f"mol.smi{ext}", "wt") as f:
+        f.write(smiles)
+    assert record_format(f"mol.smi{ext}") == "smi"
+
+    plain = io.StringIO()
+    process_batch(["-zw", str(tmp_path / "mol.smi")], plain)
+
+    out_file = str(tmp_path / f"out.tex{ext}")
+    args = ["-zwY", "2", "-O", out_file, str(tmp_path / f"mol.smi{ext}")]
+    success, summary = process_batch(args, io.StringIO())
+    assert summary == "6 records converted, 1 failed (1 MCFError in load)"
+    with module.open(out_file, "rt") as f:
+        assert f.read() == plain.getvalue()
+
+    monkeypatch.setattr(batch, "format_result", interrupted_format)
+    with pytest.raises(Interrupt):
+        process_batch(args, io.StringIO())
+    monkeypatch.undo()
+    with open(out_file, "ab") as f:
+        f.write(b"\x00 half-written")
+
+    success, summary = process_batch(["-K"] + args, io.StringIO())
+    assert summary == "6 records converted, 1 failed (1 MCFError in load)"
+    with module.open(out_file, "rt") as f:
+        assert f.read() == plain.getvalue()
+
+
+@pytest.mark.parametrize("ext", list(modules))
+def test_single(tmp_path, ext):
+    with modules[ext].open(tmp_path / f"mol.smi{ext}", "wt") as f:
+        f.write("c1ccccc1O")
+    success, mol = process(f"-zw {tmp_path / f'mol.smi{ext}'}")
+    assert success
+    assert mol.render_user() == process("-zwi direct c1ccccc1O")[1].render_user()
+
+
+def test_broken(tmp_path):
+    with open(tmp_path / "mol.smi.gz", "wb") as f:
+        f.write(gzip.compress(smiles.encode())[:30])
+    success, summary = process_batch([str(tmp_path / "mol.smi.gz")], io.StringIO())
+    assert "Can't read file" in summary
+
+
+def test_not_utf8(tmp_path):
+    file_name = str(tmp_path / "mol.smi")
+    with open(file_name, "wb") as f:
+        f.write(b"CCO\nC\xff\n")
+    for args in (["-w"], ["-wX", "1-2"]):
+        success, summary = process_batch(args + [file_name], io.StringIO())
+        assert not success and "Can't read file" in summary
+        process_index([file_name], io.StringIO())  # then read through the index
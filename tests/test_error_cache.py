@@ -0,0 +1,55 @@
+import os
+import pytest
+from mol2chemfigPy3.processor import process
+from mol2chemfigPy3.cache import ErrorCache, BloomFilter
+from mol2chemfigPy3.options import getParser
+from mol2chemfigPy3 import common
+
+
+@pytest.mark.parametrize("args", ["-wi direct C1CC", "-wi direct -k 1-9 CCO"])
+def test(tmp_path, args):
+    cache_file = str(tmp_path / "errors.db")
+    _, fresh = process(args, structured=True)
+    for _ in range(2):  # fill the cache, then use it
+        _, cached = process(f"-E {cache_file} {args}", structured=True)
+        assert cached.as_dict() == fresh.as_dict()
+
+    success, _ = process(f"-wi direct -E {cache_file} CCO")
+    assert success
+
+    cache = ErrorCache(cache_file)  # a new session reads the stored failures
+    key = cache.key(args.split()[-1], cached_options(cache_file, args))
+    assert cache.get(key).message == fresh.message
+    cache.clear()
+    assert cache.get(key) is None
+
+
+def cached_options(cache_file, args):
+    options = dict(common.settings)
+    options.update(getParser().process_cli(f"-E {cache_file} {args}")[0])
+    return options
+
+
+def test_bloom_filter():
+    keys = [ErrorCache.key(str(i), {}) for i in range(300)]
+    bloom = BloomFilter(100, 0.01)
+    for key in keys[:100]:
+        bloom.add(key)
+    assert all(key in bloom for key in keys[:100])
+    assert sum(key in bloom for key in keys[100:]) < 10
+
+
+def test_remote(tmp_path):
+    cache_file = str(tmp_path / "errors.db")
+    success, error = process(
+        data="C1CC",
+        form_fields=dict(input="direct", error_cache=cache_file),
+        web_form=True,
+        structured=True,
+    )
+    assert not success and "--error-cache" in error.message
+    success, error = process(
+        f"-wi direct -E {cache_file} C1CC", rpc=True, structured=True
+    )
+    assert not success and "--error-cache" in error.message
+    assert not os.path.exists(cache_file)
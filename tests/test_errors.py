@@ -0,0 +1,26 @@
+import pytest
+from mol2chemfigPy3.processor import process
+
+
+@pytest.mark.parametrize(
+    "args,kind,stage,message",
+    [
+        ("-i direct xyz", "MCFError", "load", "Invalid input data"),
+        (
+            "-i file no_such_file.mol",
+            "MCFError",
+            "input",
+            "Can't read file no_such_file.mol",
+        ),
+        ("-i direct -k 1-9 CCO", "MCFError", "render", "bond 1-9 doesn't exist"),
+        ("--no-such-option CCO", "HelpError", "options", None),
+    ],
+)
+def test_structured(args, kind, stage, message):
+    success, error = process(args, structured=True)
+    assert not success
+    assert (error.kind, error.stage, error.anticipated) == (kind, stage, True)
+    assert error.trace is None
+    if message is not None:
+        assert error.message == message
+        assert process(args, inline=True) == (False, message)
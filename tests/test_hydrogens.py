@@ -0,0 +1,31 @@
+from indigo import Indigo
+from mol2chemfigPy3.processor import process, free_angles
+
+target = r"""\chemfig{H-[:270](-[:180]H)(-[:270]H)-N(-[:300]H)-[:60]H}"""
+
+
+def test_free_angles():
+    assert free_angles([], 2) == [0.0, 180.0]
+    assert free_angles([30.0], 3) == [120.0, 210.0, 300.0]
+    assert free_angles([30.0, 150.0], 1) == [270.0]
+
+
+def test_place(tmp_path):
+    tkmol = Indigo().loadMolecule("CN")
+    tkmol.layout()
+    with open(tmp_path / "mol.mol", "w") as f:
+        f.write(tkmol.molfile())
+    success, mol = process(f"-zw -y place {tmp_path / 'mol.mol'}")
+    assert success
+    assert mol.render_user() == target
+
+
+def test_delete(tmp_path):
+    tkmol = Indigo().loadMolecule("CN")
+    tkmol.unfoldHydrogens()
+    tkmol.layout()
+    with open(tmp_path / "mol.mol", "w") as f:
+        f.write(tkmol.molfile())
+    success, mol = process(f"-zw -y delete {tmp_path / 'mol.mol'}")
+    assert success
+    assert len(mol.atoms) == 2
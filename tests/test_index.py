@@ -0,0 +1,86 @@
+import io
+import pytest
+from mol2chemfigPy3.batch import (
+    iter_input,
+    read_part,
+    process_batch,
+    process_index,
+)
+from mol2chemfigPy3.common import indigo
+from mol2chemfigPy3.index import RecordIndex
+
+smiles = ["c1ccccc1O", "CCO", "CC(=O)O", "CC(C)C", "CCN", "OCC(O)CO", "C1CC1"]
+
+
+@pytest.fixture
+def sdf(tmp_path):
+    file_name = str(tmp_path / "library.sdf")
+    with open(file_name, "w") as f:
+        for n, data in enumerate(smiles * 3):
+            mol = indigo().loadMolecule(data)
+            mol.setName(f"CHEMBL{n + 1}")
+            f.write(mol.molfile() + "> <smiles>\n" + data + "\n\n$$$$\n")
+    return file_name
+
+
+@pytest.fixture
+def smi(tmp_path):
+    file_name = str(tmp_path / "library.smi")
+    with open(file_name, "w") as f:
+        f.write("# header\n")
+        for n, data in enumerate(smiles * 3):
+            f.write(f"{data} ID{n + 1}\r\n\n")
+    return file_name
+
+
+@pytest.mark.parametrize("fixture", ["sdf", "smi"])
+def test_index(request, fixture):
+    file_name = request.getfixturevalue(fixture)
+    out = io.StringIO()
+    success, summary = process_index([file_name], out)
+    assert summary == "21 records indexed in 1 files"
+    assert out.getvalue() == f"{file_name}.idx: 21 records\n"
+
+    records = list(iter_input([file_name]))
+    index = RecordIndex.load(file_name)
+    assert index.titles == [record.title for record in records]
+
+    for parts in (1, 2, 5, 30):
+        read = [
+            record
+            for part in index.split(parts)
+            for record in read_part(file_name, index.fmt, part)
+        ]
+        assert [(r.index, r.data, r.title) for r in read] == [
+            (r.index, r.data, r.title) for r in records
+        ]
+
+
+@pytest.mark.parametrize("fixture", ["sdf", "smi"])
+def test_select(request, fixture):
+    file_name = request.getfixturevalue(fixture)
+    title = "CHEMBL9" if fixture == "sdf" else "ID9"
+    args = ["-zwD", "exact", "-X", "2-4,19-30", "-I", title, file_name]
+
+    scanned = io.StringIO()
+    success, summary = process_batch(args, scanned)
+    assert summary == "7 records converted, 0 failed"
+
+    process_index([file_name], io.StringIO())
+    indexed = io.StringIO()
+    process_batch(args, indexed)
+    assert indexed.getvalue() == scanned.getvalue()
+    headers = [line for line in indexed.getvalue().splitlines() if line[:2] == "% "]
+    assert [header.split(":")[0] for header in headers] == [
+        f"% {n}" for n in (2, 3, 4, 9, 19, 20, 21)
+    ]
+
+
+def test_stale(smi):
+    process_index([smi], io.StringIO())
+    assert RecordIndex.load(smi) is not None
+    with open(smi, "a") as f:
+        f.write("CCCC ID22\n")
+    assert RecordIndex.load(smi) is None
+    records = list(iter_input([smi], ids={"ID22"}))
+    assert [record.index for record in records] == [22]
@@ -0,0 +1,33 @@
+import pytest
+from indigo import Indigo
+from mol2chemfigPy3.layout import simple_layout
+from mol2chemfigPy3.processor import process
+
+
+@pytest.mark.parametrize(
+    "smiles,expected",
+    [
+        ("CCCC(=O)O", r"\chemfig{-[:330]-[:30]-[:330](=[:30]O)-[:270,,,1]OH}"),
+        ("CC#CC", r"\chemfig{-[:330]~[:330]-[:330]}"),
+    ],
+)
+def test_simple(smiles, expected):
+    success, mol = process(f"-zw -G simple -i direct {smiles}")
+    assert success
+    assert mol.render_user() == expected
+
+
+@pytest.mark.parametrize(
+    "smiles,simple",
+    [
+        ("Oc1ccccc1.[Na+]", True),
+        ("c1ccc2ccccc2c1", False),  # fused rings
+        ("C1CC12CC2", False),  # spiro
+        ("F/C=C/F", False),  # cis/trans
+        ("C[C@H](N)O", False),  # stereocenter
+    ],
+)
+def test_fallback(smiles, simple):
+    tkmol = Indigo().loadMolecule(smiles)
+    assert simple_layout(tkmol) == simple
+    assert tkmol.hasCoord() == simple
@@ -0,0 +1,36 @@
+import os
+from mol2chemfigPy3.processor import process
+from mol2chemfigPy3.cache import LayoutCache
+
+smiles = "Oc1ccccc1.[Na+]"
+layout_options = {
+    "hydrogens": "keep",
+    "recalculate_coordinates": False,
+    "layout": "indigo",
+}
+
+
+def test(tmp_path):
+    cache_file = str(tmp_path / "layouts.db")
+    _, fresh = process(f"-zwi direct {smiles}")
+    for _ in range(2):  # fill the cache, then use it
+        _, cached = process(f"-zwi direct -L {cache_file} {smiles}")
+        assert cached.render_user() == fresh.render_user()
+    cache = LayoutCache(cache_file)
+    assert cache.get(cache.key(smiles, layout_options)) is not None
+
+
+def test_remote(tmp_path):
+    cache_file = str(tmp_path / "layouts.db")
+    success, error = process(
+        data=smiles,
+        form_fields=dict(input="direct", layout_cache=cache_file),
+        web_form=True,
+        structured=True,
+    )
+    assert not success and "--layout-cache" in error.message
+    success, error = process(
+        f"-zwi direct -L {cache_file} {smiles}", rpc=True, structured=True
+    )
+    assert not success and "--layout-cache" in error.message
+    assert not os.path.exists(cache_file)
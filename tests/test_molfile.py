@@ -0,0 +1,50 @@
+import pytest
+from indigo import Indigo
+from mol2chemfigPy3 import molfile
+from mol2chemfigPy3.processor import process
+
+smiles = ["CC(=O)[O-].[Na+]", "C[N+](C)(C)C", "[CH2]CS(=O)(=O)O", "OC1=CC=CC=C1"]
+
+
+@pytest.mark.parametrize("version", ["2000", "3000"])
+@pytest.mark.parametrize("input_value", smiles)
+def test_validate(tmp_path, version, input_value):
+    indigo = Indigo()
+    indigo.setOption("molfile-saving-mode", version)
+    tkmol = indigo.loadMolecule(input_value)
+    tkmol.layout()
+    data = tkmol.molfile()
+
+    mol = molfile.read_molfile(data)
+    molfile.validate(mol, indigo.loadMolecule(data))
+
+    with open(tmp_path / "mol.mol", "w") as f:
+        f.write(data)
+    results = [
+        process(f"-zw -R {reader} {tmp_path / 'mol.mol'}")[1].render_user()
+        for reader in ("indigo", "python")
+    ]
+    assert results[0] == results[1]
+
+
+def test_declined():
+    tkmol = Indigo().loadMolecule("c1ccccc1")
+    tkmol.layout()
+    options = {"recalculate_coordinates": False, "hydrogens": "keep"}
+    assert molfile.read_fast(tkmol.molfile(), options) is None  # aromatic bonds
+    assert molfile.read_fast("CCO", options) is None
+
+
+@pytest.mark.parametrize(
+    "args,expected",
+    [
+        (("C", 0, 0, 2), 2),
+        (("N", 1, 0, 3), 1),
+        (("O", -1, 0, 1), 0),
+        (("S", 0, 0, 3), 1),
+        (("C", 0, 1, 3), 0),
+        (("Na", 1, 0, 0), 0),
+    ],
+)
+def test_implicit_hydrogens(args, expected):
+    assert molfile.implicit_hydrogens(*args) == expected
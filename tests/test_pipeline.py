@@ -0,0 +1,86 @@
+import io
+import threading
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from mol2chemfigPy3.batch import process_batch
+from mol2chemfigPy3.pipeline import run_pipeline
+from mol2chemfigPy3.worker import Worker, render
+
+smiles = """c1ccccc1O phenol
+xyz
+CCO
+CCO ethanol
+OC(=O)c1ccccc1 benzoic acid
+"""
+
+
+def square(item, worker):
+    return worker.run(pow, item, 2) if worker else item**2
+
+
+def failing_square(item, worker):
+    if item == 5:
+        raise OSError("can't write")
+    return square(item, worker)
+
+
+def failing_input():
+    yield 1
+    raise ValueError("broken input")
+
+
+@pytest.mark.parametrize("ordered", [True, False])
+def test_run_pipeline(ordered):
+    held = threading.Event()  # holds back the first item
+
+    def convert(item, worker):
+        if item == 0:
+            assert held.wait(30)
+        return square(item, worker)
+
+    if ordered:  # nothing comes out before the first item
+        threading.Timer(0.3, held.set).start()
+    results = []
+    for result in run_pipeline(range(20), convert, 3, Worker, ordered, depth=2):
+        results.append(result)
+        if len(results) == 3:
+            held.set()
+    assert sorted(results) == [(i, i * i) for i in range(20)]
+    assert (results[0] == (0, 0)) == ordered
+
+
+def test_input_error():
+    with pytest.raises(ValueError, match="broken input"):
+        list(run_pipeline(failing_input(), square, 2, Worker))
+
+
+@pytest.mark.parametrize("new_worker", [Worker, None])
+@pytest.mark.parametrize("ordered", [True, False])
+def test_convert_error(new_worker, ordered):
+    results = []
+    with pytest.raises(OSError, match="can't write"):
+        for result in run_pipeline(
+            range(20), failing_square, 2, new_worker, ordered, depth=2
+        ):
+            results.append(result)
+    assert (5, 25) not in results
+
+
+def test_batch(tmp_path):
+    with open(tmp_path / "mol.smi", "w") as f:
+        f.write(smiles)
+    outputs = []
+    for args in ([], ["-J", "2"], ["-J", "2", "-U"], ["-J", "3", "-P", "thread"]):
+        out = io.StringIO()
+        success, summary = process_batch(args + ["-zw", str(tmp_path / "mol.smi")], out)
+        assert summary == "5 records converted, 1 failed (1 MCFError in load)"
+        outputs.append(out.getvalue())
+    assert outputs[1] == outputs[3] == outputs[0]
+    assert sorted(outputs[2].split("\n\n")) == sorted(outputs[0].split("\n\n"))
+
+
+def test_threads():
+    args = [f"-zwofi direct {line.split()[0]}" for line in smiles.splitlines()] * 10
+    serial = [str(render(arg)[1]) for arg in args]
+    with ThreadPoolExecutor(4) as pool:
+        assert [str(result[1]) for result in pool.map(render, args)] == serial
@@ -0,0 +1,41 @@
+import io
+import pytest
+from mol2chemfigPy3.processor import process
+from mol2chemfigPy3.batch import process_batch
+from mol2chemfigPy3.molecule import count_rings
+
+smiles = "c1ccc2ccccc2c1C=CC#N"
+
+
+@pytest.mark.parametrize(
+    "limits,degraded",
+    [
+        ("", []),
+        ("-Q 20", []),
+        ("-Q 12", ["ring analysis", "aromatic circles", "fancy bonds"]),
+        ("-Q 0,14", ["ring analysis", "aromatic circles", "fancy bonds"]),
+        ("-Q 0,0,1", ["ring analysis", "aromatic circles", "fancy bonds"]),
+        ("-Q 0,0,2", []),
+    ],
+)
+def test(limits, degraded):
+    success, mol = process(f"-wofi direct {limits} {smiles}")
+    assert success
+    assert mol.degraded == degraded
+    if degraded:
+        assert "mcfcringle" not in mol.render_user()
+        assert not mol.options["fancy_bonds"]
+
+
+def test_count_rings():
+    _, mol = process(f"-wi direct {smiles}.C1CC1")
+    assert count_rings(mol.tk_bonds) == 3
+
+
+def test_batch(tmp_path):
+    with open(tmp_path / "mol.smi", "w") as f:
+        f.write("CCO\nc1ccccc1 benzene\n")
+    out = io.StringIO()
+    success, summary = process_batch(["-w", "-Q", "5", str(tmp_path / "mol.smi")], out)
+    assert summary == "2 records converted, 0 failed, 1 with reduced quality"
+    assert "% 2: benzene\n% reduced quality: skipped ring analysis\n" in out.getvalue()
@@ -0,0 +1,97 @@
+import io
+import time
+import pytest
+from mol2chemfigPy3 import batch
+from mol2chemfigPy3.batch import Record, convert_codes, process_batch
+from mol2chemfigPy3.schedule import (
+    DEFAULT_COST,
+    MIN_TIMEOUT,
+    CostModel,
+    estimate_cost,
+    schedule,
+)
+
+molfile = """benzene
+  -INDIGO-
+
+  6  6  0  0  0  0  0  0  0  0999 V2000
+"""
+
+smiles = """c1ccccc1O phenol
+xyz
+CCO
+CCO ethanol
+OC(=O)c1ccccc1 benzoic acid
+"""
+
+
+@pytest.mark.parametrize(
+    "data, cost",
+    [
+        ("CCO", 3 + 2),
+        ("c1ccccc1 benzene", 6 + 6 + 5),
+        ("[NH4+]Cl", 2 + 1),
+        (molfile, 6 + 6 + 5),
+        ("2244", DEFAULT_COST),
+        ("InChI=1S/H2O/h1H2", DEFAULT_COST),
+    ],
+)
+def test_estimate_cost(data, cost):
+    assert estimate_cost(data) == cost
+
+
+def test_schedule():
+    records = [Record(i, "C" * i) for i in range(1, 9)]
+    chunks = list(schedule(records, 4, chunk_cost=10))
+    assert [[r.index for r in chunk.records] for chunk in chunks] == [
+        [4],
+        [3, 2, 1],
+        [8],
+        [7],
+        [6],
+        [5],
+    ]
+    assert chunks[1].cost == 5 + 3 + 1
+
+
+def test_cost_model():
+    model = CostModel(seconds_per_cost=1.0)
+    assert model.timeout(0) == MIN_TIMEOUT
+    for _ in range(100):
+        model.update(10, 1.0)
+    assert model.predict(10) == pytest.approx(1.0, rel=1e-3)
+
+
+def test_batch(tmp_path):
+    with open(tmp_path / "mol.smi", "w") as f:
+        f.write(smiles * 3)
+    outputs = []
+    for args in ([], ["-S", "cost"], ["-S", "cost", "-J", "2", "-P", "thread"]):
+        out = io.StringIO()
+        success, summary = process_batch(args + ["-zw", str(tmp_path / "mol.smi")], out)
+        assert summary == "15 records converted, 3 failed (3 MCFError in load)"
+        outputs.append(out.getvalue())
+    assert outputs[0] == outputs[1] == outputs[2]
+
+
+def slow_codes(datas, opts):
+    if "slow" in datas:
+        time.sleep(5)
+    return convert_codes(datas, opts)
+
+
+def test_batch_timeout(tmp_path, monkeypatch):
+    # sent to the worker by name, which imports it from this module
+    monkeypatch.setattr(batch, "convert_codes", slow_codes)
+    with open(tmp_path / "mol.smi", "w") as f:
+        f.write("CCO\nslow\nCCC\n")
+    out = io.StringIO()
+    success, summary = process_batch(
+        ["-zwW", "0.5", "-S", "cost", str(tmp_path / "mol.smi")], out
+    )
+    # the chunk times out first, then the slow record on its own
+    assert summary == (
+        "3 records converted, 1 failed (1 WorkerTimeout in convert), "
+        "2 worker restarts"
+    )
+    assert "% 2\n% failed: WorkerTimeout in convert\n" in out.getvalue()
@@ -0,0 +1,57 @@
+import pytest
+from indigo import Indigo
+from mol2chemfigPy3.molfile import ExportTable
+from mol2chemfigPy3.processor import process
+
+smiles = "[CH2]C[NH3+].[O-]C(=O)C"
+
+# per-atom and per-bond reads that the molfile export replaces
+exported = ["symbol", "charge", "radicalElectrons", "iterateNeighbors"]
+exported += ["iterateBonds", "source", "destination", "bondOrder", "bondStereo"]
+
+
+def test_count_calls():
+    _, plain = process(f"-zwi direct {smiles}")
+    _, counted = process(f"-zwCi direct {smiles}")
+    assert plain.toolkit_calls is None
+    assert counted.render_user() == plain.render_user()
+    assert counted.toolkit_calls["molfile"] == 1
+    assert not set(exported) & set(counted.toolkit_calls)
+
+
+@pytest.mark.parametrize("version", ["2000", "3000"])
+@pytest.mark.parametrize(
+    "data",
+    [
+        smiles,
+        "[H]N([H])CO",
+        "[2H]OC([3H])C",
+        "C[C@H](N)c1ccccc1",
+        "F/C=C/F",
+        "[Fe+3].[C-]#N",
+    ],
+)
+def test_export_table(version, data):
+    indigo = Indigo()
+    indigo.setOption("molfile-saving-mode", version)
+    tkmol = indigo.loadMolecule(data)
+    tkmol.layout()  # adds wedges
+    tkmol.foldHydrogens()  # leaves gaps in the atom indices
+    position = {atom.index(): n for n, atom in enumerate(tkmol.iterateAtoms())}
+    stereo = (Indigo.UP, Indigo.DOWN, Indigo.EITHER)
+
+    table = ExportTable.read(tkmol.molfile())
+    assert table.atoms == [
+        (atom.symbol(), atom.charge(), atom.radicalElectrons())
+        for atom in tkmol.iterateAtoms()
+    ]
+    assert table.bonds == [
+        (
+            position[bond.source().index()],
+            position[bond.destination().index()],
+            bond.bondOrder(),
+            bond.bondStereo() if bond.bondStereo() in stereo else 0,
+        )
+        for bond in tkmol.iterateBonds()
+    ]
+    assert any(bond[3] for bond in table.bonds) == ("@" in data)
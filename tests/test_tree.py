@@ -0,0 +1,115 @@
+import gzip
+import io
+import os
+import pytest
+from mol2chemfigPy3.common import indigo
+from mol2chemfigPy3.tree import process_tree, MANIFEST_NAME
+from mol2chemfigPy3.processor import process
+
+molecules = {
+    "a/phenol.smi": "c1ccccc1O",
+    "a/b/ethanol.smi": "CCO",
+    "acid.mol": "OC(=O)c1ccccc1",
+    "broken.smi": "xyz",
+}
+
+
+@pytest.fixture
+def tree(tmp_path):
+    src = tmp_path / "src"
+    for name, data in molecules.items():
+        path = src / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if name.endswith(".mol"):
+            mol = indigo().loadMolecule(data)
+            mol.layout()
+            data = mol.molfile()
+        path.write_text(data)
+    with gzip.open(src / "a" / "amine.smi.gz", "wt") as f:
+        f.write("CCN")
+    (src / "notes.md").write_text("not a molecule")
+    return src
+
+
+def tex(data):
+    return process(f"-zwi direct {data}")[1].render_user() + "\n"
+
+
+def convert(src, dst, *args):
+    out = io.StringIO()
+    success, summary = process_tree(["-zw", *args, str(src), str(dst)], out)
+    assert success
+    return summary, out.getvalue()
+
+
+def test_tree(tree, tmp_path):
+    dst = tmp_path / "dst"
+    summary, failures = convert(tree, dst)
+    assert summary == "4 files converted, 1 failed (1 MCFError in load)"
+    assert failures.startswith("broken.smi: failed: MCFError in load: ")
+    assert (dst / MANIFEST_NAME).exists()
+    assert (dst / "a" / "phenol.tex").read_text() == tex("c1ccccc1O")
+    assert (dst / "a" / "b" / "ethanol.tex").read_text() == tex("CCO")
+    assert (dst / "a" / "amine.tex").read_text() == tex("CCN")
+    assert (dst / "acid.tex").exists()
+    assert not (dst / "broken.tex").exists()
+    assert not (dst / "notes.tex").exists()
+
+    outputs = sorted(dst.rglob("*.tex"))
+    times = [os.stat(path).st_mtime_ns for path in outputs]
+    summary, failures = convert(tree, dst)
+    assert summary == (
+        "0 files converted, 1 failed (1 MCFError in load), 4 skipped as unchanged"
+    )
+    assert [os.stat(path).st_mtime_ns for path in outputs] == times
+
+    # same output, so the file is left alone
+    (tree / "a" / "phenol.smi").write_text("c1ccccc1O\n")
+    summary, failures = convert(tree, dst)
+    assert summary.endswith("3 skipped as unchanged, 1 outputs unchanged")
+    assert [os.stat(path).st_mtime_ns for path in outputs] == times
+
+    (tree / "a" / "phenol.smi").write_text("c1ccccc1N")
+    summary, failures = convert(tree, dst)
+    assert summary.endswith("3 skipped as unchanged")
+    assert (dst / "a" / "phenol.tex").read_text() == tex("c1ccccc1N")
+
+    # other options change the key of every file
+    summary, failures = convert(tree, dst, "-o")
+    assert summary.startswith("4 files converted, 1 failed")
+    assert "skipped" not in summary
+
+
+@pytest.mark.parametrize("extra", [[], ["-J", "2"]])
+def test_glob(tree, tmp_path, extra):
+    dst = tmp_path / "dst"
+    summary, failures = convert(str(tree / "a" / "**" / "*.smi"), dst, *extra)
+    assert summary == "2 files converted, 0 failed"
+    assert sorted(str(path.relative_to(dst)) for path in dst.rglob("*.tex")) == [
+        os.path.join("b", "ethanol.tex"),
+        "phenol.tex",
+    ]
+
+
+@pytest.mark.parametrize("extra", [[], ["-J", "2"]])
+def test_write_error(tree, tmp_path, extra):
+    dst = tmp_path / "dst"
+    dst.mkdir()
+    (dst / "a").write_text("a file in the way")
+    summary, failures = convert(tree, dst, *extra)
+    assert summary.startswith("1 files converted, 4 failed (")
+    assert "3 MCFError in output" in summary and "1 MCFError in load" in summary
+    assert "a/phenol.smi: failed: MCFError in output: Can't write file" in failures
+
+    (dst / "a").unlink()
+    summary, failures = convert(tree, dst, *extra)
+    assert summary == (
+        "3 files converted, 1 failed (1 MCFError in load), 1 skipped as unchanged"
+    )
+
+
+def test_collision(tree, tmp_path):
+    (tree / "acid.smi").write_text("OC(=O)c1ccccc1")
+    success, message = process_tree([str(tree), str(tmp_path / "dst")], io.StringIO())
+    assert not success
+    assert "would be converted to" in message
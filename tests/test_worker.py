@@ -0,0 +1,99 @@
+import io
+import os
+import time
+import pytest
+from mol2chemfigPy3 import batch, worker
+from mol2chemfigPy3.batch import convert_code, process_batch
+from mol2chemfigPy3.worker import Worker, WorkerError, WorkerTimeout, try_render
+
+
+def test_timeout_and_crash():
+    with Worker(timeout=0.5) as worker:
+        with pytest.raises(WorkerTimeout):
+            worker.run(time.sleep, 5)
+        with pytest.raises(WorkerError, match="exit code 3"):
+            worker.run(os._exit, 3)
+        assert worker.run(divmod, 7, 2) == (3, 1)  # replaced
+        with pytest.raises(ZeroDivisionError):
+            worker.run(divmod, 7, 0)
+        assert worker.counts() == dict(restarts=3, recycles=0, requeued=1)
+
+
+def test_died_idle():
+    with Worker() as worker:
+        worker.run(os.getpid)
+        worker._process.kill()  # as by the OOM killer
+        worker._process.join()
+        assert worker.run(pow, 2, 4) == 16
+        assert worker.counts() == dict(restarts=1, recycles=0, requeued=1)
+        worker._process.kill()
+        worker._process.join()
+
+
+def test_recycle():
+    with Worker(max_tasks=3) as worker:
+        pids = [worker.run(os.getpid) for _ in range(7)]
+        assert len(set(pids)) == 3
+        assert worker.counts() == dict(restarts=0, recycles=2, requeued=0)
+    with Worker(max_rss=1) as worker:  # any process is larger
+        assert worker.run(os.getpid) != worker.run(os.getpid)
+
+
+@pytest.mark.skipif(worker.resource is None, reason="no memory limits here")
+def test_memory_limit():
+    with Worker(memory_limit=400 * 2**20) as limited:
+        with pytest.raises(MemoryError):
+            limited.run(bytearray, 800 * 2**20)
+        assert limited.run(bytearray, 10) == bytearray(10)
+        assert limited.counts() == dict(restarts=0, recycles=2, requeued=1)
+
+
+def test_render():
+    with Worker(timeout=30) as worker:
+        assert try_render(worker, "-zwi direct CCO") == (
+            True,
+            r"\chemfig{-[:330]-[:30,,,1]OH}",
+        )
+        success, error = try_render(worker, "-wi direct xyz")
+        assert not success and error.message == "Invalid input data"
+
+
+def test_batch(tmp_path):
+    with open(tmp_path / "mol.smi", "w") as f:
+        f.write("c1ccccc1O phenol\nxyz\nCCO\n")
+    outputs = []
+    for args in ([], ["-W", "30"], ["-N", "1"], ["-J", "2", "-N", "1"]):
+        out = io.StringIO()
+        success, summary = process_batch(args + ["-zw", str(tmp_path / "mol.smi")], out)
+        assert summary.startswith("3 records converted, 1 failed (1 MCFError in load)")
+        outputs.append(out.getvalue())
+    assert outputs[0] == outputs[1]
+
+
+def slow_code(data, opts):
+    if data == "slow":
+        time.sleep(5)
+    return convert_code(data, opts)
+
+
+def test_batch_timeout(tmp_path, monkeypatch):
+    # sent to the worker by name, which imports it from this module
+    monkeypatch.setattr(batch, "convert_code", slow_code)
+    with open(tmp_path / "mol.smi", "w") as f:
+        f.write("CCO\nslow\nCCO\n")
+    out = io.StringIO()
+    success, summary = process_batch(["-zwW", "0.5", str(tmp_path / "mol.smi")], out)
+    assert summary == (
+        "3 records converted, 1 failed (1 WorkerTimeout in convert), "
+        "1 worker restarts"
+    )
+    assert "% 2\n% failed: WorkerTimeout in convert\n" in out.getvalue()
+
+
+def test_batch_recycle(tmp_path):
+    with open(tmp_path / "mol.smi", "w") as f:
+        f.write("C\nCC\nCCC\nCCCC\nCCCCC\n")
+    success, summary = process_batch(
+        ["-zwN", "2", str(tmp_path / "mol.smi")], io.StringIO()
+    )
+    assert summary == "5 records converted, 0 failed, 2 worker recycles"
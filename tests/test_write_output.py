@@ -0,0 +1,19 @@
+import io
+import pytest
+from mol2chemfigPy3.processor import process
+
+
+@pytest.mark.parametrize(
+    "args",
+    [
+        ["-i", "direct", "CN1C=NC2=C1C(=O)N(C(=O)N2C)C"],
+        ["-zw", "-i", "direct", "CN1C=NC2=C1C(=O)N(C(=O)N2C)C"],
+        ["-fo", "-d", "2", "-l", "caffeine", "-i", "direct", "C1=CC=C(C=C1)O"],
+    ],
+)
+def test(args):
+    success, mol = process(raw_args=args, inline=True)
+    assert success
+    sink = io.StringIO()
+    mol.write_user(sink)
+    assert sink.getvalue() == mol.render_user()